@@ -1,4 +1,3 @@
-import os
 from flask import Flask
 from .extensions import db, migrate, login_manager
 
@@ -11,17 +10,58 @@ def create_app():
     )
     app.config.from_object("config.Config")
 
-    # Ensure uploads folder exists
-    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
-
     # init extensions
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"
 
+    # хранилище файлов (local/S3); для local создаёт UPLOAD_FOLDER
+    from .storage import init_storage, storage_cli
+    init_storage(app)
+    app.cli.add_command(storage_cli)
+
+    from .file_gc import files_cli
+    app.cli.add_command(files_cli)
+
+    # статика: manifest с хэшированными именами + immutable-кэширование
+    from .assets import init_assets
+    init_assets(app)
+
+    from .materials_index import materials_cli
+    app.cli.add_command(materials_cli)
+
+    from .schedule import schedule_cli
+    app.cli.add_command(schedule_cli)
+
+    from .certificates import certificates_cli
+    app.cli.add_command(certificates_cli)
+
+    from .ratelimit import ratelimit_cli
+    app.cli.add_command(ratelimit_cli)
+
+    from .analytics import analytics_cli
+    app.cli.add_command(analytics_cli)
+
+    from .ratings import ratings_cli
+    app.cli.add_command(ratings_cli)
+
+    # превью длинных текстов, пересчитываются при записи
+    from .excerpts import excerpts_cli
+    app.cli.add_command(excerpts_cli)
+
+    # просмотры уроков: буфер процесса, пакетная запись в progress
+    from .view_tracking import init_view_tracking
+    init_view_tracking(app)
+
+    # исходящая почта: outbox + фоновый диспетчер
+    from .mailer import init_mailer
+    init_mailer(app)
+
     # импорт моделей
     from app import models  # noqa
+    # события File -> счётчики storage_usage
+    from app import storage_quota  # noqa
 
     # Блюпринты
     from app.dashboard import dashboard_bp
@@ -1,25 +1,34 @@
 # app/admin.py (исправленный, blueprint-based)
+import hashlib
+import tempfile
 from io import BytesIO
 from flask import Blueprint, render_template, request, url_for, redirect, flash, send_file
 from flask_login import login_required, current_user
-from sqlalchemy import func
-from .models import User, Role, Profile
+from sqlalchemy import func, select
+from .models import User, Role, Profile, user_roles
 from app.extensions import db
 from app.utils import roles_required, make_breadcrumbs
 from app.decorators import admin_required
-from app.export_utils import (
-    generate_certificate_docx, make_filename, save_bytes_to_uploads,
-    generate_progress_xlsx, generate_stats_xlsx
-)
+from app.export_utils import make_filename, generate_progress_xlsx, generate_stats_xlsx, stream_zip, \
+    stream_csv, stream_xlsx
+from app.certificate_registry import issue_certificate
+from app.certificates import certificate_values, iter_rendered
+from app.storage import get_storage
+from app.analytics import get_course_stats, latest_snapshots
+from app.mailer import enqueue_mail, notify_report_ready
 from app.forms import AdminUserForm, CourseForm
 from app.models import (
-    Contact, File, Course, User, Lesson, Progress, Enrollment, Report, Role
+    Contact, File, Course, User, Lesson, Progress, Enrollment, Report, Role, StorageUsage, OutboxMessage
 )
-from flask import abort, current_app
-import os
+from flask import abort, current_app, stream_with_context
+from sqlalchemy.orm import load_only, undefer
+from werkzeug.utils import secure_filename
 
 admin_bp = Blueprint("admin", __name__, template_folder="templates", url_prefix="/admin")
 
+# архив сертификатов до этого размера собирается в памяти, больше — во временном файле
+ZIP_SPOOL_BYTES = 16 * 1024 * 1024
+
 
 # ---------- Contacts ----------
 @admin_bp.route("/contacts")
@@ -28,8 +37,11 @@ admin_bp = Blueprint("admin", __name__, template_folder="templates", url_prefix=
 def contacts_list():
     page = request.args.get("page", 1, type=int)
     per_page = 20
-    pagination = Contact.query.order_by(Contact.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    pagination = (
+        Contact.query.options(load_only(Contact.id, Contact.name, Contact.email, Contact.subject,
+                                        Contact.excerpt, Contact.is_read, Contact.created_at))
+        .order_by(Contact.created_at.desc())
+        .paginate(page=page, per_page=per_page, error_out=False)
     )
 
     # pagination args for template (preserve query params except page)
@@ -48,8 +60,17 @@ def contacts_list():
 @login_required
 @roles_required("admin")
 def contact_detail(contact_id):
-    contact = Contact.query.get_or_404(contact_id)
-    return render_template("admin/contact_detail.html", contact=contact)
+    contact = Contact.query.options(undefer(Contact.message)).get_or_404(contact_id)
+    replies = (
+        OutboxMessage.query.options(load_only(
+            OutboxMessage.id, OutboxMessage.status, OutboxMessage.attempts, OutboxMessage.last_error,
+            OutboxMessage.created_at, OutboxMessage.sent_at,
+        ))
+        .filter_by(contact_id=contact.id)
+        .order_by(OutboxMessage.created_at.desc())
+        .all()
+    )
+    return render_template("admin/contact_detail.html", contact=contact, replies=replies)
 
 
 
@@ -142,16 +163,53 @@ def files_list():
 @roles_required("admin")
 def delete_file(file_id):
     file = File.query.get_or_404(file_id)
-    file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], file.path)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    path, original_name = file.path, file.original_name
 
+    # сначала строка (счётчики storage_usage уменьшаются в той же транзакции), потом объект:
+    # если удаление объекта не удастся, останется сирота для `flask files reconcile`
     db.session.delete(file)
     db.session.commit()
-    flash(f"Файл {file.original_name} удалён.", "success")
+    get_storage().delete(path)
+    flash(f"Файл {original_name} удалён.", "success")
     return redirect(url_for("admin.files_list"))
 
 
+@admin_bp.route("/storage")
+@login_required
+@roles_required("admin")
+def storage_usage():
+    # только счётчики storage_usage, без агрегации по таблице files
+    top_users = (
+        db.session.query(StorageUsage, User)
+        .join(User, User.id == StorageUsage.owner_id)
+        .filter(StorageUsage.scope == "user")
+        .order_by(StorageUsage.bytes_used.desc())
+        .limit(50)
+        .all()
+    )
+    top_courses = (
+        db.session.query(StorageUsage, Course)
+        .join(Course, Course.id == StorageUsage.owner_id)
+        .filter(StorageUsage.scope == "course")
+        .order_by(StorageUsage.bytes_used.desc())
+        .limit(20)
+        .all()
+    )
+    total_bytes, total_files = db.session.query(
+        func.coalesce(func.sum(StorageUsage.bytes_used), 0),
+        func.coalesce(func.sum(StorageUsage.files_count), 0),
+    ).filter(StorageUsage.scope == "user").one()
+
+    breadcrumbs = make_breadcrumbs(("Панель", "admin.dashboard", None), ("Хранилище", None, None))
+    return render_template("admin/storage_usage.html",
+                           top_users=top_users,
+                           top_courses=top_courses,
+                           total_bytes=total_bytes,
+                           total_files=total_files,
+                           quota_bytes=current_app.config["STORAGE_QUOTA_USER_BYTES"],
+                           breadcrumbs=breadcrumbs)
+
+
 
 
 # ---------- Export (certificate / progress / stats) ----------
@@ -161,35 +219,91 @@ def delete_file(file_id):
 def export_certificate(user_id, course_id):
     user = User.query.get_or_404(user_id)
     course = Course.query.get_or_404(course_id)
-    doc_bytes = generate_certificate_docx(user, course)
-    filename = make_filename(f"certificate-{user.username}-{course.slug}", "docx")
-
-    # save to uploads + record
-    stored_name, size = save_bytes_to_uploads(doc_bytes, filename)
-    new_file = File(
-        owner_user_id=None,
-        original_name=filename,
-        path=stored_name,
-        content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        size_bytes=size,
-        visibility="private"
-    )
-    db.session.add(new_file)
+    cert_file, created = issue_certificate(user, course)
+
+    # отчёт пишем только при фактическом выпуске файла, повторное скачивание — просто lookup
+    if created:
+        new_report = Report(
+            user_id=user.id,
+            course_id=course.id,
+            type="docx",
+            status="ready",
+            file_id=cert_file.id
+        )
+        db.session.add(new_report)
+        db.session.commit()
+    # redirect to main download endpoint (or return send_file directly)
+    return redirect(url_for("main.download_file", file_id=cert_file.id))
+
+
+@admin_bp.route("/export/certificates/course/<int:course_id>", methods=["GET"])
+@login_required
+@roles_required("admin", "teacher")
+def export_course_certificates(course_id):
+    course = Course.query.get_or_404(course_id)
+    students = db.session.query(User.id, User.username, User.email).join(
+        Enrollment, Enrollment.user_id == User.id
+    ).filter(Enrollment.course_id == course_id, Enrollment.status == "completed").order_by(User.id).all()
+    if not students:
+        flash("На курсе нет студентов, завершивших обучение.", "info")
+        return redirect(url_for("admin.courses_list"))
+
+    # один отчёт на весь пакет
+    owner_id = current_user.id
+    report = Report(user_id=owner_id, course_id=course.id, type="zip", status="generating")
+    db.session.add(report)
     db.session.commit()
+    report_id = report.id
+    download_name = secure_filename(f"certificates-{course.slug}.zip")
+
+    # id в имени: secure_filename выкидывает кириллицу, и без него имена в архиве совпадали бы
+    def arcname(user_id, username):
+        parts = ["certificate", str(user_id), secure_filename(username), course.slug]
+        return secure_filename("-".join(part for part in parts if part) + ".docx")
 
-    from app.models import Report
-    # ...
-    new_report = Report(
-        user_id=user.id if user else None,
-        course_id=course.id,
-        type="docx",  # или "pdf"/"xlsx" в зависимости от формата
-        status="ready",
-        file_id=new_file.id
+    jobs = (
+        (arcname(user_id, username), certificate_values(username, email, course.title))
+        for user_id, username, email in students
+    )
+    workers = current_app.config["CERTIFICATE_BATCH_WORKERS"]
+
+    def generate():
+        # архив отдаётся потоком и одновременно пишется во временный файл: после
+        # последнего байта он сохраняется в хранилище, и отчёт можно скачать ещё раз
+        values = {"status": "failed"}
+        digest = hashlib.sha256()
+        key = None
+        try:
+            with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES) as spool:
+                for chunk in stream_zip(iter_rendered(jobs, workers)):
+                    spool.write(chunk)
+                    digest.update(chunk)
+                    yield chunk
+                spool.seek(0)
+                key = make_filename(f"certificates-{course_id}", "zip")
+                size = get_storage().save(key, spool, "application/zip")
+            file = File(owner_user_id=owner_id, course_id=course_id, original_name=download_name, path=key,
+                        content_type="application/zip", size_bytes=size, sha256=digest.hexdigest(),
+                        visibility="private", kind="export")
+            db.session.add(file)
+            db.session.flush()
+            values = {"status": "ready", "file_id": file.id}
+        except Exception:
+            db.session.rollback()
+            if key is not None:
+                get_storage().delete(key)
+            raise
+        finally:
+            Report.query.filter_by(id=report_id).update(values)
+            if values["status"] == "ready":
+                notify_report_ready(report_id)
+            db.session.commit()
+
+    return current_app.response_class(
+        stream_with_context(generate()),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={download_name}"},
     )
-    db.session.add(new_report)
-    db.session.commit()
-    # redirect to main download endpoint (or return send_file directly)
-    return redirect(url_for("main.download_file", file_id=new_file.id))
 
 
 @admin_bp.route("/export/progress/course/<int:course_id>", methods=["GET"])
@@ -215,11 +329,15 @@ def export_course_progress(course_id):
 @login_required
 @roles_required("admin", "teacher")
 def export_course_stats(course_id):
+    Course.query.get_or_404(course_id)
     total_enrolled = db.session.query(func.count(Enrollment.id)).filter(Enrollment.course_id == course_id).scalar() or 0
     completed = db.session.query(func.count(Enrollment.id)).filter(Enrollment.course_id == course_id, Enrollment.status == 'completed').scalar() or 0
     avg_score = db.session.query(func.avg(Progress.score)).join(Lesson, Progress.lesson_id == Lesson.id).filter(Lesson.course_id == course_id).scalar() or 0
 
     completion_rate = f"{(completed / total_enrolled * 100) if total_enrolled else 0:.2f}%"
+    stats = get_course_stats(course_id).data
+    scores = stats["scores"]
+    ttc = stats["time_to_complete_days"]
 
     rows = [
         ("ID курса", course_id),
@@ -227,8 +345,20 @@ def export_course_stats(course_id):
         ("Завершенные", completed),
         ("Коэффициент завершенных работ", completion_rate),
         ("Средний балл", round(float(avg_score), 2) if avg_score else 0),
+        ("Прошли все уроки", stats["finishers"]),
+        ("Прошли все уроки, %", stats["completion_rate"]),
+        ("Не начинали", stats["not_started"]),
     ]
-    xlsx_bytes = generate_stats_xlsx(rows, title=f"course-{course_id}-stats")
+    rows += [(f"Балл, {name}", value) for name, value in scores["percentiles"].items()]
+    rows += [(f"Дней до завершения, {name}", value) for name, value in ttc["percentiles"].items()]
+    sheets = [
+        ("Воронка", ["Урок", "Начали", "Завершили", "Завершили, %", "Средний балл", "Остановились перед уроком"],
+         [(l["title"], l["started"], l["completed"], l["completed_pct"], l["avg_score"], l["dropoff"])
+          for l in stats["lessons"]]),
+        ("Баллы", ["От", "До", "Количество"],
+         [(b["from"], b["to"], b["count"]) for b in scores["histogram"]]),
+    ]
+    xlsx_bytes = generate_stats_xlsx(rows, title=f"course-{course_id}-stats", sheets=sheets)
     filename = make_filename(f"course-{course_id}-stats", "xlsx")
     return send_file(BytesIO(xlsx_bytes),
                      as_attachment=True,
@@ -245,11 +375,25 @@ def dashboard():
     courses_count = db.session.query(func.count(Course.id)).scalar()
     files_count = db.session.query(func.count(File.id)).scalar()
     contacts_count = db.session.query(func.count(Contact.id)).scalar()
+    # сводка по курсам — из последних снимков аналитики, без пересчёта
+    course_stats = latest_snapshots()
     return render_template("admin/dashboard.html",
                            users_count=users_count,
                            courses_count=courses_count,
                            files_count=files_count,
-                           contacts_count=contacts_count)
+                           contacts_count=contacts_count,
+                           course_stats=course_stats)
+
+
+@admin_bp.route("/courses/<int:course_id>/analytics")
+@login_required
+@roles_required("admin", "teacher")
+def course_analytics(course_id):
+    course = Course.query.get_or_404(course_id)
+    snapshot = get_course_stats(course_id, refresh=request.args.get("refresh") == "1")
+    breadcrumbs = make_breadcrumbs(("Панель", "admin.dashboard", None), ("Курсы", "admin.courses_list", None), (f"Аналитика: {course.title}", None, None))
+    return render_template("admin/course_analytics.html", course=course, snapshot=snapshot,
+                           stats=snapshot.data, breadcrumbs=breadcrumbs)
 
 
 # ---------- User edit ----------
@@ -319,7 +463,11 @@ def user_delete(user_id):
 @roles_required("admin", "teacher")
 def courses_list():
     page = request.args.get("page", 1, type=int)
-    pagination = Course.query.order_by(Course.created_at.desc()).paginate(page=page, per_page=20, error_out=False)
+    pagination = (
+        Course.query.options(load_only(Course.id, Course.title, Course.slug, Course.level, Course.is_published))
+        .order_by(Course.created_at.desc())
+        .paginate(page=page, per_page=20, error_out=False)
+    )
     pagination_args = request.args.to_dict()
     pagination_args.pop("page", None)
 
@@ -356,7 +504,7 @@ def course_create():
 @login_required
 @roles_required("admin", "teacher")
 def course_edit(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = Course.query.options(undefer(Course.description)).get_or_404(course_id)
     form = CourseForm(obj=course)
     if form.validate_on_submit():
         course.title = form.title.data.strip()
@@ -400,16 +548,72 @@ def reports_list():
 def users_list():
     page = request.args.get("page", 1, type=int)
     q = request.args.get("q", "")
-    qs = User.query
-    if q:
-        qs = qs.filter((User.username.ilike(f"%{q}%")) | (User.email.ilike(f"%{q}%")))
+    qs = User.query.filter(_users_filter(q))
     pagination = qs.order_by(User.created_at.desc()).paginate(page=page, per_page=20, error_out=False)
 
     breadcrumbs = make_breadcrumbs(
         ("Панель", "admin.dashboard", None),
         ("Пользователи", None, None)
     )
-    return render_template("admin/users_list.html", pagination=pagination, q=q, breadcrumbs=breadcrumbs)
+    pagination_args = request.args.to_dict()
+    pagination_args.pop("page", None)
+    return render_template("admin/users_list.html", pagination=pagination, q=q, breadcrumbs=breadcrumbs,
+                           pagination_args=pagination_args)
+
+def _users_filter(q):
+    """Условие поиска списка пользователей (и его выгрузки) по q."""
+    if not q:
+        return db.true()
+    return (User.username.ilike(f"%{q}%")) | (User.email.ilike(f"%{q}%"))
+
+
+USERS_EXPORT_HEADERS = ["#", "Логин", "Email", "Фамилия", "Имя", "Отчество", "Организация", "Телефон",
+                        "Роли", "Активен", "Зарегистрирован", "Последний вход"]
+
+
+def _users_export_rows(q):
+    """
+    Строки выгрузки пользователей — потоково (yield_per, на PostgreSQL серверный курсор).
+    Роли — коррелированным подзапросом, а не GROUP BY по всей выборке: первые строки
+    приходят сразу, без сортировки/группировки всей таблицы.
+    """
+    roles = (
+        select(func.aggregate_strings(Role.name, ", "))
+        .join(user_roles, user_roles.c.role_id == Role.id)
+        .where(user_roles.c.user_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(User.id, User.username, User.email, Profile.last_name, Profile.first_name, Profile.patronymic,
+               Profile.organization, Profile.phone, roles, User.is_active, User.created_at, User.last_login_at)
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .where(_users_filter(q))
+        .order_by(User.created_at.desc(), User.id.desc())
+        .execution_options(yield_per=1000)
+    )
+    yield from db.session.execute(stmt)
+
+
+@admin_bp.route("/users/export")
+@login_required
+@roles_required("admin")
+def users_export():
+    q = request.args.get("q", "")
+    fmt = request.args.get("format", "csv")
+    if fmt == "xlsx":
+        body = stream_xlsx(USERS_EXPORT_HEADERS, _users_export_rows(q), title="Пользователи")
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        fmt = "csv"
+        body = stream_csv(USERS_EXPORT_HEADERS, _users_export_rows(q))
+        mimetype = "text/csv"
+    return current_app.response_class(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={make_filename('users', fmt)}"},
+    )
+
 
 @admin_bp.route("/reports/<int:report_id>/download")
 @login_required
@@ -420,14 +624,13 @@ def download_report(report_id):
         abort(404, "У отчёта нет файла")
 
     file = File.query.get_or_404(report.file_id)
-    file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], file.path)
+    storage = get_storage()
 
-    if not os.path.exists(file_path):
-        abort(404, "Файл не найден на диске")
+    if not storage.exists(file.path):
+        abort(404, "Файл не найден в хранилище")
 
-    return send_file(
-        file_path,
-        as_attachment=True,
+    return storage.download_response(
+        file.path,
         download_name=file.original_name or f"report-{report.id}.{report.type}",
         mimetype=file.content_type or "application/octet-stream"
     )
@@ -436,10 +639,24 @@ def download_report(report_id):
 @login_required
 @admin_required
 def reply_contact(contact_id):
+    contact = Contact.query.options(undefer(Contact.message)).get_or_404(contact_id)
     reply_text = request.form.get("reply_text", "").strip()
-
-    # Пока просто заглушка
-    flash("Функция отправки ответа будет реализована в будущей версии.", "info")
+    if not reply_text:
+        flash("Введите текст ответа.", "warning")
+        return redirect(url_for("admin.contact_detail", contact_id=contact_id))
+
+    # письмо уходит через outbox: запрос не ждёт SMTP
+    quoted = "\n".join(f"> {line}" for line in contact.message.splitlines())
+    enqueue_mail(
+        contact.email,
+        f"Re: {contact.subject or 'Ваше сообщение'}",
+        f"{reply_text}\n\n{contact.name}, {contact.created_at:%d.%m.%Y %H:%M}:\n{quoted}\n",
+        kind="contact_reply",
+        contact_id=contact.id,
+    )
+    contact.is_read = True
+    db.session.commit()
+    flash("Ответ поставлен в очередь на отправку.", "success")
 
     return redirect(url_for("admin.contact_detail", contact_id=contact_id))
 
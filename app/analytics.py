@@ -0,0 +1,337 @@
+# app/analytics.py
+# Аналитика курса: воронка прохождения по урокам, точки ухода, распределение
+# баллов и время прохождения курса.
+# Строки progress курса читаются потоком в колонки (студент, урок, статус, балл,
+# completed_at); метрики считаются проходами по колонкам — через NumPy, если он
+# установлен, иначе на array из stdlib. Результат сохраняется снимком в
+# course_stats_snapshots: страница и XLSX читают снимок, а не пересчитывают.
+import math
+from array import array
+from datetime import datetime, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.models import Course, CourseStatsSnapshot, Enrollment, Lesson, Progress
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+analytics_cli = AppGroup("analytics", help="Аналитика курсов")
+
+STATUS_CODES = {"not_started": 1, "in_progress": 2, "completed": 3}
+COMPLETED = STATUS_CODES["completed"]
+PERCENTILES = (10, 25, 50, 75, 90)
+SCORE_BIN_WIDTH = 10
+SCORE_MAX = 100
+NAN = float("nan")
+
+
+def _timestamp(value):
+    return value.timestamp() if value is not None else NAN
+
+
+class ProgressColumns:
+    """Колонки progress одного курса; студенты и уроки заданы позициями 0..n-1."""
+
+    def __init__(self, lessons, enrolled_ts):
+        self.lessons = lessons  # [(lesson_id, title)] в порядке курса
+        self.enrolled_ts = enrolled_ts  # array('d'): время записи студента i
+        self.student = array("l")
+        self.lesson = array("l")
+        self.status = array("b")
+        self.score = array("d")
+        self.completed_ts = array("d")
+
+    @property
+    def n_students(self):
+        return len(self.enrolled_ts)
+
+    @property
+    def n_lessons(self):
+        return len(self.lessons)
+
+    def append(self, i, j, status, score, completed_at):
+        self.student.append(i)
+        self.lesson.append(j)
+        self.status.append(STATUS_CODES.get(status, 0))
+        self.score.append(float(score) if score is not None else NAN)
+        self.completed_ts.append(_timestamp(completed_at))
+
+
+def load_columns(course_id, batch_size=5000):
+    lessons = db.session.execute(
+        select(Lesson.id, Lesson.title).where(Lesson.course_id == course_id).order_by(Lesson.order_index, Lesson.id)
+    ).all()
+    enrollments = db.session.execute(
+        select(Enrollment.user_id, Enrollment.enrolled_at)
+        .where(Enrollment.course_id == course_id)
+        .order_by(Enrollment.user_id)
+    ).all()
+    row_of = {user_id: i for i, (user_id, _) in enumerate(enrollments)}
+    col_of = {lesson_id: j for j, (lesson_id, _) in enumerate(lessons)}
+    cols = ProgressColumns(
+        [tuple(lesson) for lesson in lessons],
+        array("d", (_timestamp(enrolled_at) for _, enrolled_at in enrollments)),
+    )
+
+    stmt = (
+        select(Progress.user_id, Progress.lesson_id, Progress.status, Progress.score, Progress.completed_at)
+        .join(Lesson, Lesson.id == Progress.lesson_id)
+        .where(Lesson.course_id == course_id)
+        .order_by(Progress.user_id, Progress.lesson_id)
+        .execution_options(yield_per=batch_size)
+    )
+    for user_id, lesson_id, status, score, completed_at in db.session.execute(stmt):
+        i = row_of.get(user_id)
+        if i is not None:
+            cols.append(i, col_of[lesson_id], status, score, completed_at)
+    return cols
+
+
+# ---------- вычисления: NumPy ----------
+def _np_metrics(cols):
+    n_s, n_l = cols.n_students, cols.n_lessons
+    student = np.frombuffer(cols.student, dtype=f"i{cols.student.itemsize}")
+    lesson = np.frombuffer(cols.lesson, dtype=f"i{cols.lesson.itemsize}")
+    status = np.frombuffer(cols.status, dtype=np.int8)
+    score = np.frombuffer(cols.score, dtype=np.float64)
+    completed_ts = np.frombuffer(cols.completed_ts, dtype=np.float64)
+    enrolled_ts = np.frombuffer(cols.enrolled_ts, dtype=np.float64)
+
+    done = status == COMPLETED
+    started = status >= STATUS_CODES["in_progress"]
+    has_score = ~np.isnan(score)
+
+    completed_per_lesson = np.bincount(lesson[done], minlength=n_l)
+    started_per_lesson = np.bincount(lesson[started], minlength=n_l)
+    score_sum = np.bincount(lesson[has_score], weights=score[has_score], minlength=n_l)
+    score_cnt = np.bincount(lesson[has_score], minlength=n_l)
+
+    completed_per_student = np.bincount(student[done], minlength=n_s)
+    active_students = np.bincount(student, minlength=n_s) > 0
+    last_done = np.full(n_s, -1, dtype=np.int64)
+    np.maximum.at(last_done, student[done], lesson[done])
+    finishers = (completed_per_student == n_l) if n_l else np.zeros(n_s, dtype=bool)
+    stop_at = np.bincount(last_done[~finishers] + 1, minlength=n_l + 1)
+
+    finished_at = np.full(n_s, -np.inf)
+    done_ts = done & ~np.isnan(completed_ts)
+    np.maximum.at(finished_at, student[done_ts], completed_ts[done_ts])
+    ttc = (finished_at - enrolled_ts)[finishers & np.isfinite(finished_at) & ~np.isnan(enrolled_ts)] / 86400.0
+
+    return {
+        "completed_per_lesson": completed_per_lesson.tolist(),
+        "started_per_lesson": started_per_lesson.tolist(),
+        "score_sum": score_sum.tolist(),
+        "score_cnt": score_cnt.tolist(),
+        "finishers": int(finishers.sum()),
+        "not_started": int(n_s - active_students.sum()),
+        "stop_at": stop_at.tolist(),
+        "scores": np.sort(score[has_score]),
+        "ttc": np.sort(ttc),
+    }
+
+
+# ---------- вычисления: stdlib ----------
+def _py_metrics(cols):
+    n_s, n_l = cols.n_students, cols.n_lessons
+    completed_per_lesson = [0] * n_l
+    started_per_lesson = [0] * n_l
+    score_sum = [0.0] * n_l
+    score_cnt = [0] * n_l
+    completed_per_student = [0] * n_s
+    active = [False] * n_s
+    last_done = [-1] * n_s
+    finished_at = [-math.inf] * n_s
+    scores = []
+
+    for i, j, st, sc, ts in zip(cols.student, cols.lesson, cols.status, cols.score, cols.completed_ts):
+        active[i] = True
+        if st >= STATUS_CODES["in_progress"]:
+            started_per_lesson[j] += 1
+        if st == COMPLETED:
+            completed_per_lesson[j] += 1
+            completed_per_student[i] += 1
+            if j > last_done[i]:
+                last_done[i] = j
+            if ts == ts and ts > finished_at[i]:
+                finished_at[i] = ts
+        if sc == sc:  # не NaN
+            score_sum[j] += sc
+            score_cnt[j] += 1
+            scores.append(sc)
+
+    finishers = 0
+    stop_at = [0] * (n_l + 1)
+    ttc = []
+    for i in range(n_s):
+        if n_l and completed_per_student[i] == n_l:
+            finishers += 1
+            enrolled = cols.enrolled_ts[i]
+            if finished_at[i] != -math.inf and enrolled == enrolled:
+                ttc.append((finished_at[i] - enrolled) / 86400.0)
+        else:
+            stop_at[last_done[i] + 1] += 1
+
+    return {
+        "completed_per_lesson": completed_per_lesson,
+        "started_per_lesson": started_per_lesson,
+        "score_sum": score_sum,
+        "score_cnt": score_cnt,
+        "finishers": finishers,
+        "not_started": n_s - sum(active),
+        "stop_at": stop_at,
+        "scores": sorted(scores),
+        "ttc": sorted(ttc),
+    }
+
+
+def _percentile(sorted_values, q):
+    """Линейная интерполяция, как numpy.percentile по умолчанию."""
+    n = len(sorted_values)
+    if n == 0:
+        return None
+    pos = (n - 1) * q / 100.0
+    lo = math.floor(pos)
+    hi = min(lo + 1, n - 1)
+    return float(sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo))
+
+
+def _distribution(sorted_values):
+    n = len(sorted_values)
+    if np is not None and isinstance(sorted_values, np.ndarray):
+        values = np.percentile(sorted_values, PERCENTILES).tolist() if n else [None] * len(PERCENTILES)
+        mean = float(sorted_values.mean()) if n else None
+    else:
+        values = [_percentile(sorted_values, q) for q in PERCENTILES]
+        mean = sum(sorted_values) / n if n else None
+    return {
+        "count": n,
+        "mean": round(mean, 2) if mean is not None else None,
+        "percentiles": {f"p{q}": (round(v, 2) if v is not None else None) for q, v in zip(PERCENTILES, values)},
+    }
+
+
+def _histogram(sorted_values):
+    n_bins = SCORE_MAX // SCORE_BIN_WIDTH
+    if np is not None and isinstance(sorted_values, np.ndarray):
+        # значения вне [0, SCORE_MAX] попадают в крайние корзины
+        idx = np.clip((sorted_values // SCORE_BIN_WIDTH).astype(np.int64), 0, n_bins - 1)
+        bins = np.bincount(idx, minlength=n_bins).tolist()
+    else:
+        bins = [0] * n_bins
+        for v in sorted_values:
+            bins[min(max(int(v // SCORE_BIN_WIDTH), 0), n_bins - 1)] += 1
+    return [{"from": k * SCORE_BIN_WIDTH, "to": (k + 1) * SCORE_BIN_WIDTH, "count": c} for k, c in enumerate(bins)]
+
+
+def compute_course_stats(course_id):
+    """Считает метрики курса; возвращает JSON-совместимый dict."""
+    cols = load_columns(course_id)
+    raw = _np_metrics(cols) if np is not None else _py_metrics(cols)
+    n_s, n_l = cols.n_students, cols.n_lessons
+
+    lessons = []
+    for j, (lesson_id, title) in enumerate(cols.lessons):
+        completed = int(raw["completed_per_lesson"][j])
+        cnt = int(raw["score_cnt"][j])
+        lessons.append({
+            "id": lesson_id,
+            "title": title,
+            "started": int(raw["started_per_lesson"][j]),
+            "completed": completed,
+            "completed_pct": round(completed * 100.0 / n_s, 1) if n_s else 0.0,
+            "avg_score": round(raw["score_sum"][j] / cnt, 2) if cnt else None,
+            # сколько студентов (не прошедших курс) остановились перед этим уроком
+            "dropoff": int(raw["stop_at"][j]),
+        })
+
+    scores = raw["scores"]
+    stats = {
+        "students": n_s,
+        "lessons_count": n_l,
+        "finishers": raw["finishers"],
+        "completion_rate": round(raw["finishers"] * 100.0 / n_s, 1) if n_s else 0.0,
+        "not_started": raw["not_started"],
+        # прошли последний урок, но пропустили какие-то из предыдущих
+        "dropoff_with_gaps": int(raw["stop_at"][n_l]) if n_l else 0,
+        "lessons": lessons,
+        "scores": dict(_distribution(scores), histogram=_histogram(scores)),
+        "time_to_complete_days": _distribution(raw["ttc"]),
+        "backend": "numpy" if np is not None else "array",
+    }
+    return stats
+
+
+# ---------- снимки ----------
+def store_snapshot(course_id, stats):
+    snapshot = CourseStatsSnapshot(course_id=course_id, students=stats["students"], data=stats)
+    db.session.add(snapshot)
+    db.session.flush()
+    # история: оставляем последние ANALYTICS_SNAPSHOTS_KEEP снимков курса
+    keep = current_app.config["ANALYTICS_SNAPSHOTS_KEEP"]
+    stale_ids = db.session.scalars(
+        select(CourseStatsSnapshot.id)
+        .where(CourseStatsSnapshot.course_id == course_id)
+        .order_by(CourseStatsSnapshot.computed_at.desc(), CourseStatsSnapshot.id.desc())
+        .offset(keep)
+    ).all()
+    if stale_ids:
+        CourseStatsSnapshot.query.filter(CourseStatsSnapshot.id.in_(stale_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return snapshot
+
+
+def latest_snapshot(course_id):
+    return (
+        CourseStatsSnapshot.query.filter_by(course_id=course_id)
+        .order_by(CourseStatsSnapshot.computed_at.desc(), CourseStatsSnapshot.id.desc())
+        .first()
+    )
+
+
+def _age_seconds(moment):
+    now = datetime.now(timezone.utc) if moment.tzinfo else datetime.utcnow()
+    return (now - moment).total_seconds()
+
+
+def get_course_stats(course_id, refresh=False):
+    """Снимок не старше ANALYTICS_SNAPSHOT_MAX_AGE секунд; иначе пересчёт и новый снимок."""
+    snapshot = None if refresh else latest_snapshot(course_id)
+    max_age = current_app.config["ANALYTICS_SNAPSHOT_MAX_AGE"]
+    if snapshot is None or _age_seconds(snapshot.computed_at) > max_age:
+        snapshot = store_snapshot(course_id, compute_course_stats(course_id))
+    return snapshot
+
+
+def latest_snapshots():
+    """Последний снимок каждого курса (для сводки в админке)."""
+    latest = (
+        select(CourseStatsSnapshot.course_id, func.max(CourseStatsSnapshot.id).label("id"))
+        .group_by(CourseStatsSnapshot.course_id)
+        .subquery()
+    )
+    return (
+        db.session.query(CourseStatsSnapshot, Course)
+        .join(latest, latest.c.id == CourseStatsSnapshot.id)
+        .join(Course, Course.id == CourseStatsSnapshot.course_id)
+        .order_by(CourseStatsSnapshot.students.desc())
+        .all()
+    )
+
+
+@analytics_cli.command("snapshot")
+@click.option("--course-id", type=int, default=None, help="Только этот курс (по умолчанию — все).")
+def snapshot_command(course_id):
+    """Пересчитать аналитику и сохранить снимки (для cron)."""
+    course_ids = [course_id] if course_id else db.session.scalars(select(Course.id).order_by(Course.id)).all()
+    for cid in course_ids:
+        snapshot = store_snapshot(cid, compute_course_stats(cid))
+        click.echo(f"Курс {cid}: студентов {snapshot.students}, "
+                   f"завершили {snapshot.data['completion_rate']}% ({snapshot.data['backend']})")
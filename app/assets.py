@@ -0,0 +1,180 @@
+# app/assets.py
+# Сборка статики: копии с хэшем содержимого в имени, .gz-варианты и manifest.json.
+# url_for('static', ...) подменяет имя на хэшированное, а такие файлы отдаются
+# с Cache-Control: immutable и, если клиент умеет, в сжатом виде.
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+# расширения, которые имеет смысл сжимать (картинки уже сжаты)
+COMPRESSIBLE_EXTENSIONS = {"css", "js", "csv", "ipynb", "json", "svg", "txt", "html", "xml"}
+
+# год — максимум, который имеет смысл указывать в max-age
+IMMUTABLE_MAX_AGE = 31536000
+
+assets_cli = AppGroup("assets", help="Сборка статических файлов")
+
+
+def file_digest(path, length=8):
+    """Короткий sha256 содержимого файла (читаем блоками)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()[:length]
+
+
+def hashed_name(rel_path, digest):
+    """'img/a.png' + 'abc123' -> 'img/a.abc123.png'"""
+    base, ext = os.path.splitext(rel_path)
+    return f"{base}.{digest}{ext}"
+
+
+def iter_static_files(static_root, exclude_dirs):
+    """Относительные пути (через '/') всех файлов статики, кроме исключённых папок."""
+    for dirpath, dirnames, filenames in os.walk(static_root):
+        rel_dir = os.path.relpath(dirpath, static_root)
+        if rel_dir == ".":
+            # исключаем только папки верхнего уровня (dist, materials, schedules)
+            dirnames[:] = [d for d in dirnames if d not in exclude_dirs]
+            rel_dir = ""
+        dirnames.sort()
+        for fname in sorted(filenames):
+            yield os.path.join(rel_dir, fname).replace(os.sep, "/")
+
+
+def build_assets(static_root, dist_dir, exclude_dirs=()):
+    """
+    Пишет в static/<dist_dir>/ копии файлов с хэшем в имени и .gz-варианты,
+    устаревшие копии прошлых сборок удаляет.
+    Возвращает manifest: {логический путь: путь хэшированной копии относительно static}.
+    """
+    out_root = os.path.join(static_root, dist_dir)
+    exclude = set(exclude_dirs) | {dist_dir}
+    manifest = {}
+
+    for rel_path in iter_static_files(static_root, exclude):
+        src = os.path.join(static_root, rel_path)
+        target_rel = f"{dist_dir}/{hashed_name(rel_path, file_digest(src))}"
+        target = os.path.join(static_root, target_rel)
+        manifest[rel_path] = target_rel
+
+        # одинаковое содержимое -> одинаковое имя, повторно не пишем
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(src, target)
+
+        ext = rel_path.rsplit(".", 1)[-1].lower()
+        gz_target = target + ".gz"
+        if ext in COMPRESSIBLE_EXTENSIONS and not os.path.exists(gz_target):
+            with open(src, "rb") as fh:
+                raw = fh.read()
+            # mtime=0 — чтобы сборка была воспроизводимой
+            compressed = gzip.compress(raw, compresslevel=9, mtime=0)
+            if len(compressed) < len(raw):
+                with open(gz_target, "wb") as fh:
+                    fh.write(compressed)
+
+    os.makedirs(out_root, exist_ok=True)
+    prune_dist(static_root, dist_dir, manifest)
+    manifest_path = os.path.join(out_root, "manifest.json")
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def prune_dist(static_root, dist_dir, manifest):
+    """Удаляет из static/<dist_dir>/ копии, на которые manifest больше не ссылается. Возвращает их число."""
+    out_root = os.path.join(static_root, dist_dir)
+    keep = {os.path.normpath(os.path.join(static_root, rel)) for rel in manifest.values()}
+    keep |= {path + ".gz" for path in keep}
+    keep.add(os.path.normpath(os.path.join(out_root, "manifest.json")))
+    removed = 0
+    for dirpath, dirnames, filenames in os.walk(out_root, topdown=False):
+        for fname in filenames:
+            path = os.path.normpath(os.path.join(dirpath, fname))
+            if path not in keep:
+                os.remove(path)
+                removed += 1
+        if dirpath != out_root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return removed
+
+
+def load_manifest(static_root, dist_dir):
+    path = os.path.join(static_root, dist_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _accepts_gzip():
+    # с учётом q-значений: "gzip;q=0" — отказ от gzip
+    return request.accept_encodings["gzip"] > 0
+
+
+def init_assets(app):
+    """Подключает manifest, подмену url_for('static') и отдачу хэшированных файлов."""
+    dist_dir = app.config["STATIC_DIST_DIR"]
+    manifest = load_manifest(app.static_folder, dist_dir) if app.config["STATIC_USE_MANIFEST"] else {}
+    hashed_files = set(manifest.values())
+    app.extensions["asset_manifest"] = manifest
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        # url_for('static', filename='style.css') -> /static/dist/style.<hash>.css
+        if endpoint == "static" and manifest:
+            filename = values.get("filename")
+            if filename in manifest:
+                values["filename"] = manifest[filename]
+
+    default_static_view = app.view_functions.get("static")
+
+    def static(filename):
+        if filename not in hashed_files:
+            return default_static_view(filename=filename)
+
+        static_root = current_app.static_folder
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        gz_name = filename + ".gz"
+        use_gzip = _accepts_gzip() and os.path.exists(os.path.join(static_root, gz_name))
+
+        response = send_from_directory(
+            static_root, gz_name if use_gzip else filename,
+            mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE, conditional=True,
+        )
+        if use_gzip:
+            response.headers["Content-Encoding"] = "gzip"
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        return response
+
+    if default_static_view is not None:
+        app.view_functions["static"] = static
+
+    app.cli.add_command(assets_cli)
+
+
+@assets_cli.command("build")
+def build_command():
+    """Собрать хэшированные копии статики, .gz-варианты и manifest.json."""
+    app = current_app
+    manifest = build_assets(
+        app.static_folder,
+        app.config["STATIC_DIST_DIR"],
+        exclude_dirs=app.config["STATIC_BUILD_EXCLUDE"],
+    )
+    click.echo(f"Собрано файлов: {len(manifest)}")
@@ -4,6 +4,8 @@ from flask_login import login_user, logout_user, login_required
 from .extensions import db, login_manager
 from .models import User, Role
 from .forms import RegisterForm, LoginForm
+from .passwords import verify_password
+from .ratelimit import rate_limit
 from flask import request
 
 
@@ -15,6 +17,7 @@ def load_user(user_id):
     return User.query.get(int(user_id))
 
 @auth_bp.route("/register", methods=["GET", "POST"])
+@rate_limit("register")
 def register():
     form = RegisterForm()
     if form.validate_on_submit():
@@ -44,11 +47,15 @@ def register():
     return render_template("register.html", form=form)
 
 @auth_bp.route("/login", methods=["GET", "POST"])
+@rate_limit("login")
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and user.check_password(form.password.data):
+        if user and verify_password(user, form.password.data):
+            # хэш мог быть пересчитан с новыми параметрами
+            if user in db.session.dirty:
+                db.session.commit()
             login_user(user)
             flash("✅ Успешный вход", "success")
             next_page = request.args.get('next')
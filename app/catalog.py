@@ -0,0 +1,230 @@
+# app/catalog.py
+# Каталог курсов: фильтры (уровень, статус публикации, сроки, рейтинг), сортировка и счётчики фасетов.
+# Страница курсов — обычный SQL-запрос по составным индексам courses (is_published, ...).
+# Счётчики фасетов не считаются GROUP BY на каждый запрос: в памяти процесса держится
+# компактный индекс — по кортежу (уровень, опубликован, срок, средняя оценка) на курс —
+# и пересобирается, только когда меняется версия (courses, rating_summaries, текущая дата).
+import threading
+from dataclasses import dataclass, replace
+from datetime import date
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import load_only
+
+from app.extensions import db
+from app.models import Course, RatingSummary
+
+LEVELS = {
+    "beginner": "Начальный",
+    "intermediate": "Средний",
+    "advanced": "Продвинутый",
+}
+STATUSES = {
+    "published": "Опубликованные",
+    "draft": "Черновики",
+    "all": "Все",
+}
+STARTS = {
+    "upcoming": "Скоро начнутся",
+    "ongoing": "Идут сейчас",
+    "finished": "Завершились",
+    "undated": "Без даты",
+}
+MIN_RATINGS = (4, 3)
+SORTS = {
+    "new": "Сначала новые",
+    "start": "По дате начала",
+    "rating": "По рейтингу",
+    "title": "По названию",
+}
+DEFAULT_SORT = "new"
+
+_index = None
+_index_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class CatalogFilters:
+    level: str = None
+    status: str = "published"
+    start: str = None
+    min_rating: int = None
+    sort: str = DEFAULT_SORT
+
+    @classmethod
+    def from_args(cls, args, staff=False):
+        """Фильтры из query string; неизвестные значения игнорируются. Черновики видит только staff."""
+        level = args.get("level")
+        status = args.get("status") if staff else None
+        start = args.get("start")
+        min_rating = args.get("rating", type=int)
+        sort = args.get("sort")
+        return cls(
+            level=level if level in LEVELS else None,
+            status=status if status in STATUSES else "published",
+            start=start if start in STARTS else None,
+            min_rating=min_rating if min_rating in MIN_RATINGS else None,
+            sort=sort if sort in SORTS else DEFAULT_SORT,
+        )
+
+    def to_args(self, **changes):
+        """Параметры для url_for: только отличные от значений по умолчанию."""
+        current = replace(self, **changes)
+        args = {
+            "level": current.level,
+            "status": current.status if current.status != "published" else None,
+            "start": current.start,
+            "rating": current.min_rating,
+            "sort": current.sort if current.sort != DEFAULT_SORT else None,
+        }
+        return {k: v for k, v in args.items() if v is not None}
+
+
+def start_bucket(start_date, end_date, today):
+    if start_date is None:
+        return "undated"
+    if start_date > today:
+        return "upcoming"
+    if end_date is not None and end_date < today:
+        return "finished"
+    return "ongoing"
+
+
+def _start_condition(bucket, today):
+    if bucket == "undated":
+        return Course.start_date.is_(None)
+    if bucket == "upcoming":
+        return Course.start_date > today
+    if bucket == "finished":
+        return and_(Course.start_date <= today, Course.end_date < today)
+    return and_(Course.start_date <= today, or_(Course.end_date.is_(None), Course.end_date >= today))
+
+
+class FacetIndex:
+    """Курсы в виде кортежей (level, is_published, start_bucket, avg_rating) для подсчёта фасетов."""
+
+    __slots__ = ("version", "rows")
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+
+    @staticmethod
+    def _matches(row, filters, skip):
+        level, published, start, rating = row
+        if skip != "status" and filters.status != "all" and published != (filters.status == "published"):
+            return False
+        if skip != "level" and filters.level and level != filters.level:
+            return False
+        if skip != "start" and filters.start and start != filters.start:
+            return False
+        if skip != "rating" and filters.min_rating and (rating is None or rating < filters.min_rating):
+            return False
+        return True
+
+    def counts(self, filters):
+        """
+        Счётчики для каждого значения фасета при остальных выбранных фильтрах
+        (выбор уровня не обнуляет счётчики других уровней).
+        """
+        result = {
+            "level": dict.fromkeys(LEVELS, 0),
+            "status": dict.fromkeys(STATUSES, 0),
+            "start": dict.fromkeys(STARTS, 0),
+            "rating": dict.fromkeys(MIN_RATINGS, 0),
+            "total": 0,
+        }
+        for row in self.rows:
+            level, published, start, rating = row
+            if self._matches(row, filters, None):
+                result["total"] += 1
+            if self._matches(row, filters, "level") and level in LEVELS:
+                result["level"][level] += 1
+            if self._matches(row, filters, "status"):
+                result["status"]["all"] += 1
+                result["status"]["published" if published else "draft"] += 1
+            if self._matches(row, filters, "start"):
+                result["start"][start] += 1
+            if self._matches(row, filters, "rating") and rating is not None:
+                for threshold in MIN_RATINGS:
+                    if rating >= threshold:
+                        result["rating"][threshold] += 1
+        return result
+
+
+def _iso(value):
+    return value.isoformat() if value else ""
+
+
+def catalog_version(today=None):
+    """Версия каталога: курсы (count, max(updated_at)), сводки оценок курсов и дата (сроки зависят от неё)."""
+    ratings_updated = (
+        select(func.max(RatingSummary.updated_at))
+        .where(RatingSummary.target_type == "course")
+        .scalar_subquery()
+    )
+    count, last_update, last_rating = db.session.execute(
+        select(func.count(Course.id), func.max(Course.updated_at), ratings_updated)
+    ).one()
+    return f"{count}:{_iso(last_update)}:{_iso(last_rating)}:{(today or date.today()).isoformat()}"
+
+
+def build_index(version, today=None):
+    today = today or date.today()
+    stmt = (
+        select(Course.level, Course.is_published, Course.start_date, Course.end_date,
+               RatingSummary.ratings_sum, RatingSummary.ratings_count)
+        .outerjoin(RatingSummary, and_(RatingSummary.target_type == "course", RatingSummary.target_id == Course.id))
+    )
+    rows = [
+        (level, bool(published), start_bucket(start, end, today), (r_sum / r_count) if r_count else None)
+        for level, published, start, end, r_sum, r_count in db.session.execute(stmt)
+    ]
+    return FacetIndex(version, rows)
+
+
+def get_facet_index():
+    global _index
+    version = catalog_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    index = build_index(version)
+    with _index_lock:
+        _index = index
+    return index
+
+
+def catalog_query(filters, today=None):
+    """Запрос страницы каталога (Course с колонками карточки) по фильтрам и сортировке."""
+    today = today or date.today()
+    query = Course.query.options(load_only(
+        Course.id, Course.title, Course.excerpt, Course.level, Course.is_published, Course.start_date, Course.end_date,
+    ))
+    if filters.status != "all":
+        # "= true", а не "IS true": так условие использует индексы ix_courses_published_*
+        query = query.filter(Course.is_published == (filters.status == "published"))
+    if filters.level:
+        query = query.filter(Course.level == filters.level)
+    if filters.start:
+        query = query.filter(_start_condition(filters.start, today))
+
+    if filters.min_rating or filters.sort == "rating":
+        query = query.outerjoin(
+            RatingSummary, and_(RatingSummary.target_type == "course", RatingSummary.target_id == Course.id)
+        )
+    if filters.min_rating:
+        # avg >= N без деления: sum >= N * count
+        query = query.filter(RatingSummary.ratings_count > 0,
+                             RatingSummary.ratings_sum >= filters.min_rating * RatingSummary.ratings_count)
+
+    if filters.sort == "start":
+        order = [Course.start_date.asc().nulls_last(), Course.id.asc()]
+    elif filters.sort == "rating":
+        average = RatingSummary.ratings_sum * 1.0 / func.nullif(RatingSummary.ratings_count, 0)
+        order = [average.desc().nulls_last(), RatingSummary.ratings_count.desc().nulls_last(), Course.id.desc()]
+    elif filters.sort == "title":
+        order = [Course.title.asc(), Course.id.asc()]
+    else:
+        order = [Course.created_at.desc(), Course.id.desc()]
+    return query.order_by(*order)
@@ -0,0 +1,108 @@
+# app/certificate_registry.py
+# Реестр выданных сертификатов: один файл на (user, course). Повторный запрос
+# отдаёт уже сохранённый File, новый рендер — только если поменялись имя, email,
+# название курса или версия шаблона. Двойной клик не создаёт два файла.
+import hashlib
+import threading
+
+from sqlalchemy.exc import IntegrityError
+
+from app.certificates import get_certificate_template, render_certificate
+from app.export_utils import make_filename, save_bytes_to_uploads
+from app.extensions import db
+from app.models import Certificate, File
+from app.storage import get_storage
+
+DOCX_MIMETYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# блокировки внутри процесса (gthread-воркеры), по хэшу (user, course)
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def _lock_for(user_id, course_id):
+    return _locks[hash((user_id, course_id)) % len(_locks)]
+
+
+def certificate_fingerprint(user, course, template_version):
+    raw = "\x1f".join([template_version, user.username, user.email, course.title])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _blob_exists(file):
+    return file is not None and get_storage().exists(file.path)
+
+
+def _remove_blob(path):
+    get_storage().delete(path)
+
+
+def _render_and_store(user, course, template):
+    doc_bytes = render_certificate(user, course, template=template)
+    filename = make_filename(f"certificate-{user.username}-{course.slug}", "docx")
+    stored_name, size = save_bytes_to_uploads(doc_bytes, filename, DOCX_MIMETYPE)
+    return filename, stored_name, size, hashlib.sha256(doc_bytes).hexdigest()
+
+
+def issue_certificate(user, course):
+    """
+    Возвращает (File, created). created=False — отдали уже выпущенный файл без рендера.
+    Между воркерами гонку разруливает уникальный ключ (user_id, course_id)
+    и SELECT ... FOR UPDATE по строке реестра.
+    """
+    template = get_certificate_template()
+    fingerprint = certificate_fingerprint(user, course, template.version)
+
+    with _lock_for(user.id, course.id):
+        cert = (
+            Certificate.query
+            .filter_by(user_id=user.id, course_id=course.id)
+            .with_for_update()
+            .first()
+        )
+        if cert is not None and cert.fingerprint == fingerprint and _blob_exists(cert.file):
+            file = cert.file
+            db.session.commit()  # снимаем FOR UPDATE
+            return file, False
+
+        filename, stored_name, size, sha256 = _render_and_store(user, course, template)
+
+        if cert is None:
+            file = File(owner_user_id=user.id, course_id=course.id, original_name=filename, path=stored_name,
+                        content_type=DOCX_MIMETYPE, size_bytes=size, sha256=sha256, visibility="private",
+                        kind="certificate")
+            db.session.add(file)
+            db.session.flush()
+            db.session.add(Certificate(user_id=user.id, course_id=course.id, file_id=file.id,
+                                       template_version=template.version, fingerprint=fingerprint))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # другой воркер успел выпустить сертификат первым — отдаём его
+                db.session.rollback()
+                _remove_blob(stored_name)
+                cert = Certificate.query.filter_by(user_id=user.id, course_id=course.id).one()
+                return cert.file, False
+            return file, True
+
+        # перевыпуск: та же запись File (ссылки из Report остаются валидными), новый blob
+        old_path = None
+        file = cert.file
+        if file is None:
+            file = File(owner_user_id=user.id, course_id=course.id, visibility="private", kind="certificate")
+            db.session.add(file)
+        else:
+            old_path = file.path
+        file.course_id = course.id
+        file.original_name = filename
+        file.path = stored_name
+        file.content_type = DOCX_MIMETYPE
+        file.size_bytes = size
+        file.sha256 = sha256
+        db.session.flush()
+        cert.file_id = file.id
+        cert.template_version = template.version
+        cert.fingerprint = fingerprint
+        db.session.commit()
+        if old_path and old_path != stored_name:
+            _remove_blob(old_path)
+        return file, True
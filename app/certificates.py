@@ -0,0 +1,265 @@
+# app/certificates.py
+# Сертификаты по .docx-шаблону: шаблон читается один раз на процесс, XML-части
+# с плейсхолдерами ({{name}}, {{email}}, {{course}}, {{date}}, {{issuer}})
+# заранее разбиваются на куски, а остальные члены zip держатся в памяти как есть.
+# Рендер = склейка строк + запись zip, без python-docx.
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+certificates_cli = AppGroup("certificates", help="Шаблон сертификатов")
+
+PLACEHOLDERS = ("name", "email", "course", "date", "issuer")
+
+DEFAULT_ISSUER = "Московский университет"
+
+# {{ key }}, даже если Word разрезал плейсхолдер на несколько <w:r>/<w:t>
+_TAG = r"(?:<[^>]*>)*"
+_PLACEHOLDER_RE = re.compile(r"\{" + _TAG + r"\{((?:<[^>]*>|[^<{}])*?)\}" + _TAG + r"\}")
+_XML_TAG_RE = re.compile(r"<[^>]*>")
+
+# XML-части, в которых ищем плейсхолдеры
+_TEMPLATED_PART_RE = re.compile(r"^word/(document|header\d*|footer\d*)\.xml$")
+
+
+def build_default_template():
+    """Шаблон по умолчанию (тот же макет, что раньше собирался в коде) — bytes .docx."""
+    from docx import Document
+    from docx.shared import Pt
+
+    doc = Document()
+
+    h = doc.add_heading(level=1)
+    run = h.add_run("Сертификат о прохождении курса")
+    run.bold = True
+    run.font.size = Pt(20)
+
+    doc.add_paragraph("")
+
+    p = doc.add_paragraph()
+    p.add_run("Настоящий сертификат подтверждает, что ").font.size = Pt(12)
+    run_b = p.add_run("{{name}} ({{email}})")
+    run_b.bold = True
+    run_b.font.size = Pt(12)
+    p.add_run(" успешно завершил(а) курс ").font.size = Pt(12)
+    p.add_run("{{course}}").bold = True
+
+    doc.add_paragraph("")
+
+    p2 = doc.add_paragraph()
+    p2.add_run("Дата выдачи: {{date}}")
+    p2.add_run("\n\n")
+    p2.add_run("Выдано: {{issuer}}")
+
+    doc.add_paragraph("")
+    doc.add_paragraph("Подпись: ____________________")
+
+    bio = io.BytesIO()
+    doc.save(bio)
+    return bio.getvalue()
+
+
+def _compile_part(xml):
+    """
+    Разбивает XML на [литерал, ключ, литерал, ключ, ..., литерал].
+    Теги внутри разрезанного плейсхолдера выбрасываются: между двумя кусками текста
+    одного абзаца это всегда пара «закрыли run — открыли run», баланс не нарушается.
+    """
+    segments = []
+    pos = 0
+    for m in _PLACEHOLDER_RE.finditer(xml):
+        key = _XML_TAG_RE.sub("", m.group(1)).strip()
+        if key not in PLACEHOLDERS:
+            continue
+        segments.append(xml[pos:m.start()])
+        segments.append(key)
+        pos = m.end()
+    segments.append(xml[pos:])
+    return segments
+
+
+class CertificateTemplate:
+    """Предзагруженный шаблон: члены zip в исходном порядке + скомпилированные XML-части."""
+
+    def __init__(self, docx_bytes, version):
+        self.version = version
+        self.members = []  # (ZipInfo, bytes или список сегментов)
+        with zipfile.ZipFile(io.BytesIO(docx_bytes)) as zf:
+            for info in zf.infolist():
+                data = zf.read(info.filename)
+                if _TEMPLATED_PART_RE.match(info.filename):
+                    segments = _compile_part(data.decode("utf-8"))
+                    if len(segments) > 1:
+                        self.members.append((info, segments))
+                        continue
+                self.members.append((info, data))
+
+    def render(self, values):
+        """values: {placeholder: str} -> bytes .docx"""
+        escaped = {k: escape(str(values.get(k, ""))) for k in PLACEHOLDERS}
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w") as zf:
+            for info, payload in self.members:
+                # ZipInfo при записи мутирует (размеры, CRC, смещение) — пишем копию
+                member = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                member.external_attr = info.external_attr
+                if isinstance(payload, list):
+                    # чётные элементы — литералы, нечётные — ключи
+                    payload = "".join(
+                        escaped[part] if i % 2 else part for i, part in enumerate(payload)
+                    ).encode("utf-8")
+                zf.writestr(member, payload, compress_type=info.compress_type, compresslevel=1)
+        return out.getvalue()
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def _template_version(path):
+    """mtime+размер файла шаблона; 'default' — встроенный шаблон."""
+    if path and os.path.exists(path):
+        st = os.stat(path)
+        return f"{int(st.st_mtime)}-{st.st_size}"
+    return "default"
+
+
+def load_template(path, version):
+    if version == "default":
+        return CertificateTemplate(build_default_template(), version)
+    with open(path, "rb") as fh:
+        return CertificateTemplate(fh.read(), version)
+
+
+def get_certificate_template():
+    """Шаблон процесса; перечитывается, только если файл шаблона заменили."""
+    global _template
+    path = current_app.config.get("CERTIFICATE_TEMPLATE")
+    version = _template_version(path)
+    if _template is not None and _template.version == version:
+        return _template
+    with _template_lock:
+        if _template is None or _template.version != version:
+            _template = load_template(path, version)
+    return _template
+
+
+def render_certificate(user, course, issuer_name=DEFAULT_ISSUER, template=None):
+    template = template or get_certificate_template()
+    return template.render(certificate_values(user.username, user.email, course.title, issuer_name))
+
+
+# ---------- пакетный рендер в пуле процессов ----------
+# Пул один на процесс (воркер gunicorn): создаётся при первой пакетной выгрузке и живёт
+# до worker_exit (shutdown_render_pool), а не заводится на каждый запрос.
+# Процессы пула стартуют через forkserver: fork прямо из многопоточного воркера
+# (диспетчер почты, сброс просмотров, соединения БД) унаследовал бы захваченные
+# другими потоками блокировки. Шаблон процессы пула читают сами и держат до смены версии.
+_render_pool = None
+_render_pool_lock = threading.Lock()
+_worker_template = None
+
+
+def _pool_render(key, values, path, version):
+    global _worker_template
+    if _worker_template is None or _worker_template.version != version:
+        _worker_template = load_template(path, version)
+    return key, _worker_template.render(values)
+
+
+def _start_method():
+    methods = multiprocessing.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+def get_render_pool(workers):
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(_start_method()))
+        return _render_pool
+
+
+def _discard_render_pool(pool):
+    # процесс пула упал — пул сломан навсегда, следующая выгрузка создаст новый
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_render_pool():
+    """Останавливает пул процесса (gunicorn worker_exit)."""
+    global _render_pool
+    with _render_pool_lock:
+        pool, _render_pool = _render_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def certificate_values(username, email, course_title, issuer_name=DEFAULT_ISSUER):
+    return {
+        "name": username,
+        "email": email,
+        "course": course_title,
+        "date": datetime.utcnow().strftime("%d.%m.%Y"),
+        "issuer": issuer_name,
+    }
+
+
+def iter_rendered(jobs, workers):
+    """
+    jobs: iterable (key, values). Отдаёт (key, docx_bytes) по мере готовности.
+    В работе держим не больше 2*workers задач, так что в памяти одновременно
+    лишь несколько документов, а не весь курс.
+    """
+    template = get_certificate_template()
+    if workers <= 1:
+        for key, values in jobs:
+            yield key, template.render(values)
+        return
+
+    path = current_app.config.get("CERTIFICATE_TEMPLATE")
+    pool = get_render_pool(workers)
+    pending = set()
+    try:
+        for key, values in jobs:
+            pending.add(pool.submit(_pool_render, key, values, path, template.version))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+        for fut in as_completed(pending):
+            yield fut.result()
+        pending = set()
+    except BrokenProcessPool:
+        _discard_render_pool(pool)
+        raise
+    finally:
+        # клиент оборвал скачивание — пул общий, не оставляем в нём наши задачи
+        for fut in pending:
+            fut.cancel()
+
+
+@certificates_cli.command("make-template")
+@click.argument("path", required=False)
+def make_template_command(path):
+    """Записать шаблон по умолчанию (для правки в Word) в CERTIFICATE_TEMPLATE или PATH."""
+    path = path or current_app.config["CERTIFICATE_TEMPLATE"]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(build_default_template())
+    click.echo(f"Шаблон записан: {path}")
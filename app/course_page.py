@@ -0,0 +1,150 @@
+# app/course_page.py
+# Данные страницы курса: курс, опубликованные уроки по order_index, число материалов
+# по урокам и автор с профилем — фиксированное число запросов (selectinload + один GROUP BY)
+# вместо ленивых загрузок из шаблона.
+# Результат — неизменяемый снимок (не ORM-объекты), кэшируется в процессе по course_id
+# и пересобирается, когда меняется версия: updated_at курса и профиля автора,
+# count/max(updated_at) уроков и материалов курса. Проверка версии — один запрос.
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload, undefer
+
+from app.extensions import db
+from app.models import Course, Lesson, Material, Profile, User
+
+CACHE_SIZE = 128
+
+_cache = OrderedDict()  # course_id -> CourseDetail
+_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class LessonItem:
+    id: int
+    title: str
+    order_index: int
+    excerpt: str
+    materials_count: int
+
+
+@dataclass(frozen=True)
+class CourseDetail:
+    id: int
+    title: str
+    description: str
+    level: str
+    is_published: bool
+    start_date: object
+    end_date: object
+    author_name: str
+    author_organization: str
+    lessons: tuple
+    version: str
+
+
+def course_detail_version(course_id):
+    """Версия страницы курса или None, если курса нет."""
+    def lessons(column):
+        return select(column).where(Lesson.course_id == course_id).scalar_subquery()
+
+    def materials(column):
+        return (
+            select(column).join(Lesson, Lesson.id == Material.lesson_id)
+            .where(Lesson.course_id == course_id).scalar_subquery()
+        )
+
+    row = db.session.execute(
+        select(
+            Course.updated_at,
+            lessons(func.count(Lesson.id)),
+            lessons(func.max(Lesson.updated_at)),
+            materials(func.count(Material.id)),
+            materials(func.max(Material.updated_at)),
+            User.updated_at,
+            Profile.updated_at,
+        )
+        .outerjoin(User, User.id == Course.created_by)
+        .outerjoin(Profile, Profile.user_id == Course.created_by)
+        .where(Course.id == course_id)
+    ).first()
+    if row is None:
+        return None
+    return "|".join("" if value is None else str(value) for value in row)
+
+
+def load_course_detail(course_id, version):
+    """
+    Запросы: курс; автор; профиль автора; опубликованные уроки (selectinload);
+    число материалов по урокам (GROUP BY).
+    """
+    course = (
+        Course.query
+        .options(
+            undefer(Course.description),
+            selectinload(Course.author).selectinload(User.profile),
+            selectinload(Course.lessons.and_(Lesson.is_published.is_(True))),
+        )
+        .filter(Course.id == course_id)
+        # курс мог быть уже в сессии с полной коллекцией lessons — перечитываем с фильтром
+        .populate_existing()
+        .first()
+    )
+    if course is None:
+        return None
+
+    lesson_ids = [lesson.id for lesson in course.lessons]
+    counts = dict(db.session.execute(
+        select(Material.lesson_id, func.count(Material.id))
+        .where(Material.lesson_id.in_(lesson_ids))
+        .group_by(Material.lesson_id)
+    ).all()) if lesson_ids else {}
+
+    author = course.author
+    profile = author.profile if author else None
+    full_name = " ".join(
+        part for part in (profile.last_name, profile.first_name, profile.patronymic) if part
+    ) if profile else ""
+    detail = CourseDetail(
+        id=course.id,
+        title=course.title,
+        description=course.description,
+        level=course.level,
+        is_published=course.is_published,
+        start_date=course.start_date,
+        end_date=course.end_date,
+        author_name=full_name or (author.username if author else None),
+        author_organization=profile.organization if profile else None,
+        lessons=tuple(
+            LessonItem(lesson.id, lesson.title, lesson.order_index, lesson.excerpt, counts.get(lesson.id, 0))
+            for lesson in course.lessons
+        ),
+        version=version,
+    )
+    # коллекция lessons загружена с фильтром — сбрасываем её, чтобы дальше в запросе
+    # course.lessons перечитался полностью
+    db.session.expire(course, ["lessons"])
+    return detail
+
+
+def get_course_detail(course_id):
+    """Снимок страницы курса из кэша процесса (с проверкой версии) или None."""
+    version = course_detail_version(course_id)
+    if version is None:
+        return None
+    with _cache_lock:
+        detail = _cache.get(course_id)
+    if detail is not None and detail.version == version:
+        return detail
+
+    detail = load_course_detail(course_id, version)
+    if detail is None:
+        return None
+    with _cache_lock:
+        _cache[course_id] = detail
+        _cache.move_to_end(course_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return detail
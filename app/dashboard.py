@@ -1,20 +1,28 @@
 # app/dashboard.py
+import hashlib
 from io import BytesIO
-import os
-import json
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
-from flask import Blueprint, render_template, request, url_for, redirect, flash, send_file, current_app
+from flask import Blueprint, render_template, request, url_for, redirect, flash, send_file, current_app, abort, jsonify
 from flask_login import login_required, current_user
 from sqlalchemy import func
+from sqlalchemy.orm import load_only, undefer
 from werkzeug.utils import secure_filename
 
-from app.utils import roles_required, make_breadcrumbs
+from app.utils import roles_required, make_breadcrumbs, ListPagination
+from app.materials_index import get_materials_index
+from app.storage import get_storage
+from app.roster import DEFAULT_SORT, SORTS as ROSTER_SORTS, roster_page
+from app.gradebook import get_gradebook
+from app.schedule import (
+    clamp_window_start, events_in_range, get_ics_feed, load_feed_token, make_feed_token, reset_feed_token,
+    schedule_etag, schedule_version,
+)
 from app.extensions import db
 from app.models import (
     Course, Enrollment, Lesson, Progress, File, Report, User, Contact
 )
-from app.export_utils import generate_certificate_docx, make_filename, save_bytes_to_uploads
+from app.certificate_registry import issue_certificate
 
 dashboard_bp = Blueprint("dashboard", __name__, template_folder="templates", url_prefix="/dashboard")
 
@@ -58,7 +66,11 @@ def student_dashboard():
 @roles_required("student")
 def student_courses():
     page = request.args.get("page", 1, type=int)
-    qs = Course.query.join(Enrollment, Enrollment.course_id == Course.id).filter(Enrollment.user_id == current_user.id)
+    qs = (
+        Course.query.options(load_only(Course.id, Course.title, Course.excerpt))
+        .join(Enrollment, Enrollment.course_id == Course.id)
+        .filter(Enrollment.user_id == current_user.id)
+    )
     pagination = qs.order_by(Course.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
     breadcrumbs = make_breadcrumbs(("ЛК", "dashboard.index", None), ("Мои курсы", None, None))
     return render_template("dashboard/student_courses.html", pagination=pagination, breadcrumbs=breadcrumbs)
@@ -90,15 +102,8 @@ def student_certificate(course_id):
         return redirect(url_for("dashboard.student_course_detail", course_id=course_id))
 
     course = Course.query.get_or_404(course_id)
-    doc_bytes = generate_certificate_docx(current_user, course)
-    filename = make_filename(f"certificate-{current_user.username}-{course.slug}", "docx")
-    stored_name, size = save_bytes_to_uploads(doc_bytes, filename)
-    new_file = File(owner_user_id=current_user.id, original_name=filename, path=stored_name,
-                    content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    size_bytes=size, visibility="private")
-    db.session.add(new_file)
-    db.session.commit()
-    return redirect(url_for("main.download_file", file_id=new_file.id))
+    cert_file, _ = issue_certificate(current_user, course)
+    return redirect(url_for("main.download_file", file_id=cert_file.id))
 
 
 @dashboard_bp.route("/student/messages")
@@ -133,7 +138,12 @@ def instructor_dashboard():
 @roles_required("teacher")
 def instructor_courses():
     page = request.args.get("page", 1, type=int)
-    pagination = Course.query.filter_by(created_by=current_user.id).order_by(Course.created_at.desc()).paginate(page=page, per_page=20, error_out=False)
+    pagination = (
+        Course.query.options(load_only(Course.id, Course.title, Course.excerpt))
+        .filter_by(created_by=current_user.id)
+        .order_by(Course.created_at.desc())
+        .paginate(page=page, per_page=20, error_out=False)
+    )
     breadcrumbs = make_breadcrumbs(("ЛК", "dashboard.index", None), ("Мои курсы", None, None))
     return render_template("dashboard/instructor_courses.html", pagination=pagination, breadcrumbs=breadcrumbs)
 
@@ -146,11 +156,60 @@ def instructor_course_students(course_id):
     if course.created_by != current_user.id and not current_user.has_role("admin"):
         flash("Нет доступа к списку студентов этого курса.", "danger")
         return redirect(url_for("dashboard.instructor_courses"))
-    students = db.session.query(User).join(Enrollment, Enrollment.user_id == User.id).filter(Enrollment.course_id == course_id).all()
+    sort = request.args.get("sort", DEFAULT_SORT)
+    roster = roster_page(
+        course_id,
+        sort=sort,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=50,
+    )
     breadcrumbs = make_breadcrumbs(("ЛК", "dashboard.index", None), ("Мои курсы", "dashboard.instructor_courses", None), (f"Студенты: {course.title}", None, None))
-    return render_template("dashboard/instructor_course_students.html", course=course, students=students, breadcrumbs=breadcrumbs)
+    return render_template("dashboard/instructor_course_students.html", course=course, roster=roster,
+                           sort=sort if sort in ROSTER_SORTS else DEFAULT_SORT, breadcrumbs=breadcrumbs)
+
+
+def _own_course_or_none(course_id):
+    course = Course.query.get_or_404(course_id)
+    if course.created_by != current_user.id and not current_user.has_role("admin"):
+        return None
+    return course
+
+
+@dashboard_bp.route("/instructor/course/<int:course_id>/gradebook")
+@login_required
+@roles_required("teacher")
+def instructor_gradebook(course_id):
+    course = _own_course_or_none(course_id)
+    if course is None:
+        flash("Нет доступа к журналу этого курса.", "danger")
+        return redirect(url_for("dashboard.instructor_courses"))
+    book = get_gradebook(course_id)
+    # матрица в кэше, на страницу рендерим только её срез
+    page = request.args.get("page", 1, type=int)
+    pagination = ListPagination(range(len(book.students)), page, per_page=100)
+    rows = [(book.students[i], book.row(i), book.completed_count(i)) for i in pagination.items]
+    breadcrumbs = make_breadcrumbs(("ЛК", "dashboard.index", None), ("Мои курсы", "dashboard.instructor_courses", None), (f"Журнал: {course.title}", None, None))
+    return render_template("dashboard/instructor_gradebook.html", course=course, book=book, rows=rows,
+                           pagination=pagination, pagination_args={"course_id": course.id}, breadcrumbs=breadcrumbs)
 
 
+@dashboard_bp.route("/instructor/course/<int:course_id>/gradebook.json")
+@login_required
+@roles_required("teacher")
+def instructor_gradebook_json(course_id):
+    if _own_course_or_none(course_id) is None:
+        abort(403)
+    book = get_gradebook(course_id)
+    etag = hashlib.sha1(f"gradebook:{course_id}:{book.version}".encode("utf-8")).hexdigest()
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(book.to_json())
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
 @dashboard_bp.route("/instructor/reports")
 @login_required
 @roles_required("teacher")
@@ -166,25 +225,27 @@ def instructor_reports():
 @login_required
 @roles_required("teacher")
 def instructor_materials():
-    static_root = current_app.static_folder
-    materials_dir = os.path.join(static_root, "materials")
-    groups = []
-    if os.path.exists(materials_dir):
-        for course_slug in sorted(os.listdir(materials_dir)):
-            course_path = os.path.join(materials_dir, course_slug)
-            if not os.path.isdir(course_path):
-                continue
-            items = []
-            for fname in sorted(os.listdir(course_path)):
-                fpath = os.path.join(course_path, fname)
-                if os.path.isfile(fpath):
-                    items.append({
-                        "name": fname,
-                        "url": url_for("static", filename=f"materials/{course_slug}/{fname}")
-                    })
-            groups.append({"course_slug": course_slug, "items": items})
+    index = get_materials_index()
+    index.ensure_fresh()
+
+    course_slug = request.args.get("course", "").strip() or None
+    page = request.args.get("page", 1, type=int)
+    pagination = ListPagination(index.items(course_slug), page, per_page=50)
+    # url_for считаем только для файлов текущей страницы; словари индекса общие — не меняем их
+    pagination.items = [
+        dict(item, url=url_for("static", filename=f"materials/{item['course_slug']}/{item['name']}"))
+        for item in pagination.items
+    ]
+
+    pagination_args = request.args.to_dict()
+    pagination_args.pop("page", None)
     breadcrumbs = [("Личный кабинет", url_for("dashboard.instructor_dashboard")), ("Методические материалы", None)]
-    return render_template("dashboard/instructor_materials.html", groups=groups, breadcrumbs=breadcrumbs)
+    return render_template("dashboard/instructor_materials.html",
+                           pagination=pagination,
+                           pagination_args=pagination_args,
+                           course_slugs=index.course_slugs(),
+                           current_course=course_slug,
+                           breadcrumbs=breadcrumbs)
 
 
 # --- Обратная связь от студентов (контакты) ---
@@ -194,7 +255,12 @@ def instructor_materials():
 def instructor_contacts():
     page = request.args.get("page", 1, type=int)
     per_page = 20
-    pagination = Contact.query.order_by(Contact.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    pagination = (
+        Contact.query.options(load_only(Contact.id, Contact.name, Contact.email, Contact.subject,
+                                        Contact.excerpt, Contact.created_at))
+        .order_by(Contact.created_at.desc())
+        .paginate(page=page, per_page=per_page, error_out=False)
+    )
     breadcrumbs = [("Личный кабинет", url_for("dashboard.instructor_dashboard")), ("Обратная связь", None)]
     return render_template("dashboard/instructor_contacts.html", pagination=pagination, breadcrumbs=breadcrumbs)
 
@@ -203,7 +269,7 @@ def instructor_contacts():
 @login_required
 @roles_required("teacher")
 def instructor_contact_detail(contact_id):
-    c = Contact.query.get_or_404(contact_id)
+    c = Contact.query.options(undefer(Contact.message)).get_or_404(contact_id)
     breadcrumbs = [("Личный кабинет", url_for("dashboard.instructor_dashboard")), ("Обратная связь", url_for("dashboard.instructor_contacts")), (f"Сообщение #{c.id}", None)]
     return render_template("dashboard/instructor_contact_detail.html", contact=c, breadcrumbs=breadcrumbs)
 
@@ -242,24 +308,57 @@ def instructor_profile():
 @login_required
 @roles_required("teacher")
 def instructor_schedule():
-    static_root = current_app.static_folder
-    schedules_dir = os.path.join(static_root, "schedules")
-    schedule = []
-    schedule_file = os.path.join(schedules_dir, f"{current_user.username}.json")
-    if os.path.exists(schedule_file):
-        try:
-            with open(schedule_file, "r", encoding="utf-8") as fh:
-                schedule = json.load(fh)
-        except Exception:
-            schedule = []
+    # окно дат: ?start=YYYY-MM-DD&days=N (по умолчанию — две недели с понедельника)
+    today = datetime.utcnow().date()
+    try:
+        start = date.fromisoformat(request.args.get("start", ""))
+    except ValueError:
+        start = today - timedelta(days=today.weekday())
+    start = clamp_window_start(start)
+    days = min(max(request.args.get("days", 14, type=int), 1), 92)
+    window_start = datetime.combine(start, datetime.min.time())
+    schedule = events_in_range(current_user.id, window_start, window_start + timedelta(days=days))
+
+    feed_url = url_for("dashboard.instructor_schedule_ics", token=make_feed_token(current_user), _external=True)
     breadcrumbs = [("Личный кабинет", url_for("dashboard.instructor_dashboard")), ("Расписание", None)]
-    for item in schedule:
-        if "date" in item:
-            try:
-                item["date_obj"] = datetime.fromisoformat(item["date"])
-            except Exception:
-                item["date_obj"] = None
-    return render_template("dashboard/instructor_schedule.html", schedule=schedule, breadcrumbs=breadcrumbs)
+    return render_template("dashboard/instructor_schedule.html",
+                           schedule=schedule,
+                           start=start,
+                           days=days,
+                           last_day=start + timedelta(days=days - 1),
+                           prev_start=start - timedelta(days=days),
+                           next_start=start + timedelta(days=days),
+                           feed_url=feed_url,
+                           breadcrumbs=breadcrumbs)
+
+
+@dashboard_bp.route("/instructor/schedule/feed/reset", methods=["POST"])
+@login_required
+@roles_required("teacher")
+def reset_schedule_feed():
+    reset_feed_token(current_user)
+    flash("Старая ссылка на календарь отключена, используйте новую.", "success")
+    return redirect(url_for("dashboard.instructor_schedule"))
+
+
+# iCalendar-подписка: без логина, доступ по подписанному токену
+@dashboard_bp.route("/schedule/<token>.ics")
+def instructor_schedule_ics(token):
+    teacher = load_feed_token(token)
+    if teacher is None:
+        abort(404)
+
+    version = schedule_version(teacher.id)
+    etag = schedule_etag(teacher.id, version)
+    # клиенты опрашивают фид каждые несколько минут — отвечаем 304 без сборки календаря
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        etag, body = get_ics_feed(teacher, version)
+        response = current_app.response_class(body, mimetype="text/calendar")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, max-age=300"
+    return response
 
 @dashboard_bp.route("/instructor/reports/upload", methods=["GET", "POST"])
 @login_required
@@ -267,9 +366,6 @@ def instructor_schedule():
 def upload_report():
     return "Функция скачивания пока не реализована"
 
-from flask import send_from_directory, abort, current_app
-import os
-
 @dashboard_bp.route("/instructor/reports/download/<int:report_id>")
 @login_required
 @roles_required("teacher")
@@ -279,52 +375,17 @@ def download_report(report_id):
     if not report:
         abort(404, "Отчёт не найден")
 
-    # 2) если в отчёте хранится ссылка на запись в таблице files (целое число)
-    folder = current_app.config.get("UPLOAD_FOLDER")
-    file_to_send = None
-    download_name = None
-
-    # если file_id — число или строка-число, пробуем найти в таблице File
-    try:
-        # иногда в базе file_id хранится строка (например '1.png'), поэтому сначала пробуем привести к int
-        file_id_int = int(report.file_id) if report.file_id is not None else None
-    except (ValueError, TypeError):
-        file_id_int = None
-
-    if file_id_int:
-        file_rec = File.query.get(file_id_int)
-        if file_rec:
-            # используем путь из File.path
-            if folder and os.path.isabs(file_rec.path):
-                # если в path уже абсолютный путь
-                candidate = file_rec.path
-            else:
-                candidate = os.path.join(folder or current_app.static_folder, file_rec.path)
-            if os.path.exists(candidate):
-                file_to_send = candidate
-                download_name = file_rec.original_name or os.path.basename(candidate)
-
-    # 3) если не нашли через таблицу File — возможно в report.file_id лежит само имя файла/путь
-    if not file_to_send and report.file_id:
-        # считаем, что report.file_id — это имя файла в UPLOAD_FOLDER
-        folder = folder or current_app.config.get("UPLOADS_FOLDER") or current_app.static_folder
-        candidate = os.path.join(folder, str(report.file_id))
-        if os.path.exists(candidate):
-            file_to_send = candidate
-            download_name = os.path.basename(candidate)
-
-    if not file_to_send:
-        # дополнительно логируем, чтобы отладить на проде (можно убрать)
-        current_app.logger.error(f"Download failed: report_id={report_id}, file_id={report.file_id}, UPLOAD_FOLDER={folder}")
+    # 2) файл отчёта — строка в files; битые ссылки чинит `flask files reconcile`
+    file_rec = File.query.get(report.file_id) if report.file_id else None
+    storage = get_storage()
+    if file_rec is None or not storage.exists(file_rec.path):
+        current_app.logger.error(f"Download failed: report_id={report_id}, file_id={report.file_id}, storage={storage.name}")
         abort(404, "Файл отчёта не найден на сервере")
 
-    # 4) используем send_from_directory безопасно
-    folder_dir = os.path.dirname(file_to_send)
-    filename = os.path.basename(file_to_send)
-    try:
-        # modern Flask
-        return send_from_directory(folder_dir, filename, as_attachment=True, download_name=download_name)
-    except TypeError:
-        # fallback для старых Flask
-        return send_from_directory(folder_dir, filename, as_attachment=True, attachment_filename=download_name)
+    # 3) local — send_from_directory, s3 — редирект на presigned URL
+    return storage.download_response(
+        file_rec.path,
+        download_name=file_rec.original_name or file_rec.path.rsplit("/", 1)[-1],
+        mimetype=file_rec.content_type,
+    )
 
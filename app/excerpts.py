@@ -0,0 +1,95 @@
+# app/excerpts.py
+# Короткие превью длинных текстов (описание курса, текст урока, новости, сообщения).
+# Большие Text-колонки в моделях отложенные (deferred): списки их не читают,
+# а показывают колонку excerpt — она пересчитывается при записи исходного текста
+# (before_insert / before_update), так что на страницах списков нет ни лишних байт,
+# ни обрезки в шаблоне.
+import html
+import re
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import attributes
+
+from app.extensions import db
+from app.models import Contact, Course, Lesson, News
+
+excerpts_cli = AppGroup("excerpts", help="Превью длинных текстов")
+
+EXCERPT_CHARS = 300
+
+# модель -> колонка с полным текстом
+SOURCES = {
+    Course: "description",
+    Lesson: "content",
+    News: "body",
+    Contact: "message",
+}
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def make_excerpt(text, length=EXCERPT_CHARS):
+    """Текст без HTML-тегов и лишних пробелов, обрезанный по слову до length символов (с «…»)."""
+    if not text:
+        return None
+    plain = _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", text))).strip()
+    if len(plain) <= length:
+        return plain or None
+    cut = plain[:length - 1]
+    space = cut.rfind(" ")
+    if space > length // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,.;:-—") + "…"
+
+
+def _on_insert(mapper, connection, target):
+    target.excerpt = make_excerpt(getattr(target, SOURCES[type(target)]))
+
+
+def _on_update(mapper, connection, target):
+    # не изменённый (и, возможно, не загруженный) текст не трогаем
+    source = SOURCES[type(target)]
+    if attributes.get_history(target, source).has_changes():
+        target.excerpt = make_excerpt(getattr(target, source))
+
+
+for _model in SOURCES:
+    event.listen(_model, "before_insert", _on_insert)
+    event.listen(_model, "before_update", _on_update)
+
+
+def rebuild_excerpts(batch_size=500):
+    """Пересчитывает excerpt во всех таблицах (после смены EXCERPT_CHARS или правок в обход ORM)."""
+    total = 0
+    for model, source in SOURCES.items():
+        text = getattr(model, source)
+        stmt = select(model.id, text).order_by(model.id).execution_options(yield_per=batch_size)
+        batch = []
+        for row_id, value in db.session.execute(stmt):
+            batch.append({"row_id": row_id, "excerpt": make_excerpt(value)})
+            if len(batch) >= batch_size:
+                total += _write(model, batch)
+                batch = []
+        total += _write(model, batch)
+    db.session.commit()
+    return total
+
+
+def _write(model, batch):
+    if not batch:
+        return 0
+    table = model.__table__
+    db.session.execute(
+        update(table).where(table.c.id == db.bindparam("row_id")).values(excerpt=db.bindparam("excerpt")),
+        batch,
+    )
+    return len(batch)
+
+
+@excerpts_cli.command("rebuild")
+def rebuild_command():
+    """Пересчитать превью (excerpt) курсов, уроков, новостей и сообщений."""
+    click.echo(f"Обновлено строк: {rebuild_excerpts()}")
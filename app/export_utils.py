@@ -1,12 +1,14 @@
 # app/export_utils.py
+import csv
 import io
-import os
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
 from uuid import uuid4
 from werkzeug.utils import secure_filename
-from flask import current_app
-from docx import Document
-from docx.shared import Pt
-from datetime import datetime
+from app.certificates import DEFAULT_ISSUER, render_certificate
+from app.storage import get_storage
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 
@@ -14,57 +16,19 @@ def make_filename(prefix, ext):
     name = f"{prefix}-{uuid4().hex}.{ext}"
     return secure_filename(name)
 
-def save_bytes_to_uploads(content_bytes: bytes, filename: str):
+def save_bytes_to_uploads(content_bytes: bytes, filename: str, content_type=None):
     """
-    Сохраняет байты в папку uploads и возвращает путь (имя файла на диске) и размер.
+    Сохраняет байты в хранилище файлов и возвращает ключ (File.path) и размер.
     """
-    upload_folder = current_app.config["UPLOAD_FOLDER"]
-    os.makedirs(upload_folder, exist_ok=True)
-    path = os.path.join(upload_folder, filename)
-    with open(path, "wb") as f:
-        f.write(content_bytes)
-    size = os.path.getsize(path)
+    size = get_storage().save_bytes(filename, content_bytes, content_type)
     return filename, size
 
-def generate_certificate_docx(user, course, issuer_name="Московский университет"):
+def generate_certificate_docx(user, course, issuer_name=DEFAULT_ISSUER):
     """
-    Возвращает bytes (docx) для сертификата ученика user по course
+    Возвращает bytes (docx) для сертификата ученика user по course.
+    Макет берётся из .docx-шаблона (CERTIFICATE_TEMPLATE), см. app/certificates.py
     """
-    doc = Document()
-
-    # простой стиль заголовка
-    h = doc.add_heading(level=1)
-    run = h.add_run("Сертификат о прохождении курса")
-    run.bold = True
-    run.font.size = Pt(20)
-
-    doc.add_paragraph("")  # пустая
-
-    # студент и курс
-    p = doc.add_paragraph()
-    run = p.add_run(f"Настоящий сертификат подтверждает, что ")
-    run.font.size = Pt(12)
-    run_b = p.add_run(f"{user.username} ({user.email})")
-    run_b.bold = True
-    run_b.font.size = Pt(12)
-    p.add_run(f" успешно завершил(а) курс ").font.size = Pt(12)
-    p.add_run(f"{course.title}").bold = True
-
-    doc.add_paragraph("")  # пустая
-
-    p2 = doc.add_paragraph()
-    p2.add_run(f"Дата выдачи: {datetime.utcnow().strftime('%d.%m.%Y')}")
-    p2.add_run("\n\n")
-    p2.add_run(f"Выдано: {issuer_name}")
-
-    doc.add_paragraph("")
-    doc.add_paragraph("Подпись: ____________________")
-
-    # Сохраняем в байты
-    bio = io.BytesIO()
-    doc.save(bio)
-    bio.seek(0)
-    return bio.getvalue()
+    return render_certificate(user, course, issuer_name)
 
 def generate_progress_xlsx(course_id, rows):
     """
@@ -96,17 +60,187 @@ def generate_progress_xlsx(course_id, rows):
     bio.seek(0)
     return bio.getvalue()
 
-def generate_stats_xlsx(stats_rows, title="Statistics"):
+def generate_stats_xlsx(stats_rows, title="Statistics", sheets=None):
+    """
+    stats_rows: [(показатель, значение)] — первый лист.
+    sheets: [(название листа, заголовки, строки)] — дополнительные листы-таблицы.
+    """
     wb = Workbook()
     ws = wb.active
-    ws.title = title
+    ws.title = title[:31]
 
     headers = ["Показатель", "Значение"]
     ws.append(headers)
     for k, v in stats_rows:
         ws.append([k, v])
 
+    for sheet_title, sheet_headers, rows in sheets or []:
+        sheet = wb.create_sheet(sheet_title[:31])
+        sheet.append(sheet_headers)
+        for row in rows:
+            sheet.append(list(row))
+
     bio = io.BytesIO()
     wb.save(bio)
     bio.seek(0)
-    return bio.getvalue()
\ No newline at end of file
+    return bio.getvalue()
+
+class _ZipStream:
+    """Файлоподобный приёмник для zipfile без seek: накапливает байты, пока их не заберут."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """
+    entries: iterable (arcname, bytes). Генератор кусков zip-архива:
+    каждый файл отдаётся клиенту сразу после записи, архив целиком в памяти не лежит.
+    """
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for arcname, data in entries:
+            zf.writestr(arcname, data)
+            yield sink.drain()
+    # центральный каталог пишется при закрытии
+    yield sink.drain()
+
+
+# ---------- Потоковые выгрузки таблиц (CSV / XLSX) ----------
+# Строки берутся из генератора (запрос с yield_per) и отдаются клиенту пачками
+# по STREAM_CHUNK_ROWS: в памяти — только текущая пачка, первые байты уходят сразу.
+STREAM_CHUNK_ROWS = 500
+
+# символы, недопустимые в XML 1.0 (openpyxl на них падает с IllegalCharacterError)
+_ILLEGAL_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "да" if value else "нет"
+    return str(value)
+
+
+def _csv_safe(text):
+    # значение, начинающееся с = + - @, Excel выполняет как формулу
+    return "'" + text if text[:1] in ("=", "+", "-", "@") else text
+
+
+def stream_csv(headers, rows):
+    """Генератор кусков CSV (UTF-8 с BOM — чтобы Excel открыл кириллицу, разделитель «;»)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";")
+    writer.writerow(headers)
+    yield ("\ufeff" + buf.getvalue()).encode("utf-8")
+    buf.seek(0)
+    buf.truncate()
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_csv_safe(_cell_text(v)) for v in row])
+        if i % STREAM_CHUNK_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            text = escape(_ILLEGAL_XML_RE.sub("", _cell_text(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+
+def stream_xlsx(headers, rows, title="Sheet1"):
+    """
+    Генератор кусков xlsx с одним листом. Workbook(write_only=True) из openpyxl копит лист
+    во временном файле и упаковывает его только в save(), поэтому лист пишется здесь прямо
+    в zip-поток (строки — inline strings, без общей таблицы строк) через тот же приёмник, что stream_zip.
+    """
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _XLSX_WORKBOOK.format(title=escape(title[:31], {'"': "&quot;"})))
+        zf.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        with zf.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                .encode("utf-8")
+            )
+            sheet.write(_xlsx_row(headers).encode("utf-8"))
+            yield sink.drain()
+            chunk = []
+            for row in rows:
+                chunk.append(_xlsx_row(row))
+                if len(chunk) >= STREAM_CHUNK_ROWS:
+                    sheet.write("".join(chunk).encode("utf-8"))
+                    chunk = []
+                    yield sink.drain()
+            sheet.write(("".join(chunk) + "</sheetData></worksheet>").encode("utf-8"))
+        yield sink.drain()
+    # центральный каталог пишется при закрытии
+    yield sink.drain()
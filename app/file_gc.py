@@ -0,0 +1,220 @@
+# app/file_gc.py
+# Сверка хранилища с таблицей files и уборка.
+# Листинг хранилища и строки files (id, path) читаются потоком, оба отсортированы
+# по ключу, и сливаются за один проход — без запроса на каждый файл.
+#   orphan blob  — объект в хранилище без строки в files
+#   dangling row — строка в files без объекта в хранилище
+# Плюс починка reports.file_id и срок хранения сгенерированных выгрузок.
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import exists, select, update
+
+from app.extensions import db
+from app.models import Certificate, File, Material, Profile, Report
+from app.storage import get_storage
+from app.storage_quota import recount_usage, release_usage
+
+files_cli = AppGroup("files", help="Сверка и уборка файлов")
+
+BATCH_SIZE = 1000
+
+
+@dataclass
+class ReconcileResult:
+    blobs: int = 0
+    rows: int = 0
+    orphan_blobs: list = field(default_factory=list)  # [(key, size)]
+    dangling_rows: list = field(default_factory=list)  # [file_id]
+    young_orphans: int = 0  # моложе grace — возможно, загрузка ещё не закоммичена
+    young_rows: int = 0  # строки моложе grace — объект, возможно, ещё пишется или копируется
+
+
+def _path_order():
+    # PostgreSQL сортирует строки по collation базы; для слияния нужен побайтовый порядок,
+    # как у Python str и листинга S3
+    if db.engine.dialect.name == "postgresql":
+        return File.path.collate("C")
+    return File.path
+
+
+def iter_file_rows(batch_size=BATCH_SIZE):
+    """(id, path, created_at) всех строк files, по возрастанию path, порциями (server-side курсор)."""
+    stmt = (
+        select(File.id, File.path, File.created_at)
+        .order_by(_path_order(), File.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in db.session.execute(stmt):
+        yield row.id, row.path, row.created_at
+
+
+def _utc_timestamp(value):
+    # в базе datetime.utcnow() без tzinfo — считаем его UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def reconcile(storage=None, grace_seconds=3600, now=None):
+    """Сливает отсортированные листинги и возвращает ReconcileResult; ничего не удаляет."""
+    storage = storage or get_storage()
+    now = now or time.time()
+    result = ReconcileResult()
+
+    blobs = iter(storage.iter_keys())
+    rows = iter(iter_file_rows())
+    blob = next(blobs, None)
+    row = next(rows, None)
+
+    while blob is not None or row is not None:
+        if row is None or (blob is not None and blob[0] < row[1]):
+            key, size, mtime = blob
+            result.blobs += 1
+            if now - mtime < grace_seconds:
+                result.young_orphans += 1
+            else:
+                result.orphan_blobs.append((key, size))
+            blob = next(blobs, None)
+        elif blob is None or row[1] < blob[0]:
+            result.rows += 1
+            created_at = row[2]
+            if created_at is not None and now - _utc_timestamp(created_at) < grace_seconds:
+                result.young_rows += 1
+            else:
+                result.dangling_rows.append(row[0])
+            row = next(rows, None)
+        else:
+            # совпадение; несколько строк могут ссылаться на один ключ
+            key = blob[0]
+            result.blobs += 1
+            while row is not None and row[1] == key:
+                result.rows += 1
+                row = next(rows, None)
+            blob = next(blobs, None)
+
+    return result
+
+
+def _chunks(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def delete_file_rows(file_ids):
+    """
+    Удаляет строки files пачками. Ссылки обнуляются явно (не полагаемся на
+    ON DELETE SET NULL — в SQLite внешние ключи по умолчанию не проверяются);
+    готовые отчёты без файла помечаются failed.
+    """
+    removed = 0
+    for chunk in _chunks(list(file_ids)):
+        db.session.execute(
+            update(Report).where(Report.file_id.in_(chunk)).values(file_id=None, status="failed")
+        )
+        db.session.execute(update(Material).where(Material.file_id.in_(chunk)).values(file_id=None))
+        db.session.execute(update(Profile).where(Profile.avatar_file_id.in_(chunk)).values(avatar_file_id=None))
+        db.session.execute(update(Certificate).where(Certificate.file_id.in_(chunk)).values(file_id=None))
+        release_usage(chunk)
+        removed += File.query.filter(File.id.in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+    return removed
+
+
+def repair_reports():
+    """
+    reports.file_id, указывающие на несуществующую строку files (старые записи,
+    SQLite без FK), обнуляются; 'ready' без файла становятся 'failed'.
+    Возвращает число исправленных отчётов.
+    """
+    missing = ~exists().where(File.id == Report.file_id)
+    fixed = db.session.execute(
+        update(Report).where(Report.file_id.isnot(None), missing).values(file_id=None, status="failed")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    fixed += db.session.execute(
+        update(Report).where(Report.status == "ready", Report.file_id.is_(None)).values(status="failed")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return fixed
+
+
+def expired_export_ids(ttl_days, now=None):
+    """
+    Файлы выгрузок (на них ссылается reports) старше ttl_days. Текущие файлы
+    реестра сертификатов не трогаем — это «оригинал», а не разовая выгрузка.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=ttl_days)
+    stmt = (
+        select(File.id, File.path)
+        .where(
+            File.created_at < cutoff,
+            exists().where(Report.file_id == File.id),
+            ~exists().where(Certificate.file_id == File.id),
+        )
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    return [(row.id, row.path) for row in db.session.execute(stmt)]
+
+
+@files_cli.command("reconcile")
+@click.option("--delete", "do_delete", is_flag=True, help="Удалить найденное (иначе только отчёт).")
+@click.option("--grace-minutes", default=60, show_default=True,
+              help="Объекты и строки files моложе этого не трогаем (загрузка или перенос могут быть не закончены).")
+@click.option("--show", default=20, show_default=True, help="Сколько примеров вывести.")
+def reconcile_command(do_delete, grace_minutes, show):
+    """Сверить хранилище с таблицей files, починить ссылки отчётов."""
+    storage = get_storage()
+    result = reconcile(storage, grace_seconds=grace_minutes * 60)
+
+    orphan_bytes = sum(size for _, size in result.orphan_blobs)
+    click.echo(f"Хранилище ({storage.name}): {result.blobs} объектов, files: {result.rows} строк")
+    click.echo(f"Объекты без строки: {len(result.orphan_blobs)} ({orphan_bytes} байт), "
+               f"свежих пропущено: {result.young_orphans}")
+    for key, _ in result.orphan_blobs[:show]:
+        click.echo(f"  blob  {key}")
+    click.echo(f"Строки без объекта: {len(result.dangling_rows)}, свежих пропущено: {result.young_rows}")
+    for file_id in result.dangling_rows[:show]:
+        click.echo(f"  row   files.id={file_id}")
+
+    if not do_delete:
+        click.echo("Ничего не удалено (добавьте --delete).")
+        return
+
+    for key, _ in result.orphan_blobs:
+        storage.delete(key)
+    removed_rows = delete_file_rows(result.dangling_rows)
+    fixed = repair_reports()
+    click.echo(f"Удалено объектов: {len(result.orphan_blobs)}, строк files: {removed_rows}, "
+               f"исправлено отчётов: {fixed}")
+
+
+@files_cli.command("expire-exports")
+@click.option("--days", type=int, default=None, help="Срок хранения (по умолчанию FILE_EXPORT_TTL_DAYS).")
+@click.option("--dry-run", is_flag=True, help="Только показать, сколько файлов истекло.")
+def expire_exports_command(days, dry_run):
+    """Удалить файлы сгенерированных выгрузок старше срока хранения."""
+    days = days if days is not None else current_app.config["FILE_EXPORT_TTL_DAYS"]
+    expired = expired_export_ids(days)
+    click.echo(f"Выгрузок старше {days} дн.: {len(expired)}")
+    if dry_run or not expired:
+        return
+    storage = get_storage()
+    # сначала строки (отчёты станут failed), потом объекты: сбой посередине оставит
+    # только сирот в хранилище, их подберёт reconcile
+    removed = delete_file_rows([file_id for file_id, _ in expired])
+    for _, key in expired:
+        storage.delete(key)
+    click.echo(f"Удалено: {removed}")
+
+
+@files_cli.command("recount-usage")
+def recount_usage_command():
+    """Пересчитать счётчики storage_usage по таблице files."""
+    recount_usage()
+    click.echo("Счётчики storage_usage пересчитаны")
@@ -48,3 +48,8 @@ class CourseForm(FlaskForm):
     is_published = BooleanField("Опубликован")
     submit = SubmitField("Сохранить")
 
+
+class FeedbackForm(FlaskForm):
+    rating = SelectField("Оценка", coerce=int, choices=[(r, "★" * r) for r in range(5, 0, -1)])
+    comment = TextAreaField("Отзыв", validators=[Optional(), Length(max=2000)])
+    submit = SubmitField("Оценить")
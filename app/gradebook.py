@@ -0,0 +1,185 @@
+# app/gradebook.py
+# Журнал курса: матрица студенты × уроки (статус и балл).
+# Матрица строится одним упорядоченным проходом по progress ⨝ lessons и хранится
+# в плоских array (1 байт статуса и 4 байта балла на ячейку) — 2000 × 40 это ~400 КБ,
+# а не 80 000 ORM-объектов. Кэш — на процесс, по курсу:
+#   - запись Progress через ORM сбрасывает кэш курса после commit (события ниже);
+#   - изменения из других воркеров/SQL ловит «версия» (count + max(updated_at)),
+#     она проверяется не чаще раза в GRADEBOOK_CHECK_INTERVAL секунд.
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+
+from app.extensions import db
+from app.models import Enrollment, Lesson, Profile, Progress, User
+from app.roster import full_name_expr
+
+STATUS_CODES = {None: 0, "not_started": 1, "in_progress": 2, "completed": 3}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+CACHE_SIZE = 32
+
+_cache = OrderedDict()  # course_id -> Gradebook
+_cache_lock = threading.Lock()
+
+
+class Gradebook:
+    """Матрица n_students × n_lessons; ячейка (i, j) — индекс i * n_lessons + j."""
+
+    __slots__ = ("course_id", "version", "checked_at", "students", "lessons", "lesson_ids", "status", "scores")
+
+    def __init__(self, course_id, version, students, lessons):
+        self.course_id = course_id
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.students = students  # [(user_id, имя)]
+        self.lessons = lessons  # [(lesson_id, title)]
+        self.lesson_ids = frozenset(lesson_id for lesson_id, _ in lessons)
+        cells = len(students) * len(lessons)
+        self.status = array("b", bytes(cells))
+        self.scores = array("f", [math.nan]) * cells
+
+    def status_at(self, i, j):
+        return STATUS_NAMES[self.status[i * len(self.lessons) + j]]
+
+    def score_at(self, i, j):
+        value = self.scores[i * len(self.lessons) + j]
+        return None if math.isnan(value) else value
+
+    def row(self, i):
+        """[(код статуса, балл или None)] по урокам для студента i."""
+        n = len(self.lessons)
+        start = i * n
+        return [
+            (self.status[k], None if math.isnan(self.scores[k]) else self.scores[k])
+            for k in range(start, start + n)
+        ]
+
+    def completed_count(self, i):
+        n = len(self.lessons)
+        return self.status[i * n:(i + 1) * n].count(STATUS_CODES["completed"])
+
+    def to_json(self):
+        n = len(self.lessons)
+        return {
+            "course_id": self.course_id,
+            "version": self.version,
+            "statuses": {code: name for code, name in STATUS_NAMES.items() if name},
+            "lessons": [{"id": lesson_id, "title": title} for lesson_id, title in self.lessons],
+            "students": [{"id": user_id, "name": name} for user_id, name in self.students],
+            # строки матрицы: коды статусов и баллы (null — нет оценки)
+            "status": [self.status[i * n:(i + 1) * n].tolist() for i in range(len(self.students))],
+            "scores": [
+                [None if math.isnan(v) else round(v, 2) for v in self.scores[i * n:(i + 1) * n]]
+                for i in range(len(self.students))
+            ],
+        }
+
+
+def gradebook_version(course_id):
+    """
+    Дешёвая версия журнала: строки progress (count, max(updated_at)),
+    число записанных студентов и уроков курса.
+    """
+    count, last_update = db.session.execute(
+        select(func.count(Progress.id), func.max(Progress.updated_at))
+        .join(Lesson, Lesson.id == Progress.lesson_id)
+        .where(Lesson.course_id == course_id)
+    ).one()
+    enrolled = db.session.scalar(select(func.count(Enrollment.id)).where(Enrollment.course_id == course_id))
+    lessons = db.session.scalar(select(func.count(Lesson.id)).where(Lesson.course_id == course_id))
+    return f"{count}:{last_update.isoformat() if last_update else ''}:{enrolled}:{lessons}"
+
+
+def build_gradebook(course_id, version):
+    lessons = db.session.execute(
+        select(Lesson.id, Lesson.title).where(Lesson.course_id == course_id).order_by(Lesson.order_index, Lesson.id)
+    ).all()
+    name = func.coalesce(func.nullif(full_name_expr(), ""), User.username)
+    students = db.session.execute(
+        select(User.id, name)
+        .join(Enrollment, Enrollment.user_id == User.id)
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .where(Enrollment.course_id == course_id)
+        .order_by(func.lower(name), User.id)
+    ).all()
+
+    book = Gradebook(course_id, version, [tuple(s) for s in students], [tuple(lesson) for lesson in lessons])
+    row_of = {user_id: i for i, (user_id, _) in enumerate(book.students)}
+    col_of = {lesson_id: j for j, (lesson_id, _) in enumerate(book.lessons)}
+    n = len(book.lessons)
+    status, scores, codes = book.status, book.scores, STATUS_CODES
+
+    # один проход; порядок по (user_id, lesson_id) — последовательное чтение по индексу
+    stmt = (
+        select(Progress.user_id, Progress.lesson_id, Progress.status, Progress.score)
+        .join(Lesson, Lesson.id == Progress.lesson_id)
+        .where(Lesson.course_id == course_id)
+        .order_by(Progress.user_id, Progress.lesson_id)
+        .execution_options(yield_per=5000)
+    )
+    for user_id, lesson_id, st, score in db.session.execute(stmt):
+        i = row_of.get(user_id)
+        if i is None:  # прогресс без записи на курс
+            continue
+        k = i * n + col_of[lesson_id]
+        status[k] = codes.get(st, 0)
+        if score is not None:
+            scores[k] = float(score)
+    return book
+
+
+def get_gradebook(course_id):
+    with _cache_lock:
+        book = _cache.get(course_id)
+    if book is not None and time.monotonic() - book.checked_at < current_app.config["GRADEBOOK_CHECK_INTERVAL"]:
+        return book
+
+    version = gradebook_version(course_id)
+    if book is not None and book.version == version:
+        book.checked_at = time.monotonic()
+        return book
+
+    book = build_gradebook(course_id, version)
+    with _cache_lock:
+        _cache[course_id] = book
+        _cache.move_to_end(course_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return book
+
+
+def invalidate_lessons(lesson_ids):
+    """Сбрасывает закэшированные журналы, в которых есть эти уроки."""
+    with _cache_lock:
+        for course_id in [cid for cid, book in _cache.items() if book.lesson_ids & lesson_ids]:
+            del _cache[course_id]
+
+
+# ---------- инвалидация при записи Progress через ORM ----------
+def _remember(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("gradebook_dirty_lessons", set()).add(target.lesson_id)
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Progress, _event_name, _remember)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    dirty = session.info.pop("gradebook_dirty_lessons", None)
+    if dirty:
+        invalidate_lessons(dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("gradebook_dirty_lessons", None)
@@ -0,0 +1,415 @@
+# app/mailer.py
+# Исходящая почта через outbox: запрос только добавляет строку в таблицу outbox
+# (в той же транзакции, что и остальные изменения) и сразу отвечает.
+# Отправляет фоновый диспетчер — поток в каждом веб-воркере и/или отдельный процесс
+# `flask mail dispatch`:
+#   - берёт пачку созревших писем (FOR UPDATE SKIP LOCKED + claim_token — воркеры не
+#     отправляют одно письмо дважды; захват истекает через MAIL_LEASE_SECONDS);
+#   - делит её между MAIL_POOL_SIZE SMTP-соединениями, которые переиспользуются между пачками;
+#   - пишет результат: sent / повтор с экспоненциальной задержкой / failed (5xx или лимит попыток).
+import atexit
+import os
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formatdate, parseaddr
+from uuid import uuid4
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, event, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models import OutboxMessage, Report, User
+
+mail_cli = AppGroup("mail", help="Исходящая почта (outbox)")
+
+
+# ---------- Постановка в очередь ----------
+def enqueue_mail(to_addr, subject, body, kind="generic", **refs):
+    """
+    Добавляет письмо в outbox (без commit — пишется вместе с транзакцией вызывающего).
+    refs: contact_id / report_id. После commit диспетчер процесса будится сразу.
+    """
+    message = OutboxMessage(to_addr=to_addr, subject=subject[:255], body=body, kind=kind, **refs)
+    db.session.add(message)
+    db.session.info["outbox_wake"] = True
+    return message
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("outbox_wake", False):
+        dispatcher = current_app.extensions.get("mail_dispatcher") if current_app else None
+        if dispatcher is not None:
+            dispatcher.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("outbox_wake", None)
+
+
+def notify_report_ready(report_id):
+    """Письмо владельцу отчёта о том, что он готов."""
+    row = db.session.execute(
+        select(User.email, User.username, Report.type)
+        .join(User, User.id == Report.user_id)
+        .where(Report.id == report_id)
+    ).first()
+    if row is None:
+        return None
+    email, username, report_type = row
+    return enqueue_mail(
+        email,
+        f"Отчёт #{report_id} готов",
+        f"Здравствуйте, {username}!\n\nОтчёт #{report_id} ({report_type}) сформирован. "
+        "Он доступен в личном кабинете, в разделе отчётов.\n\n— ML-Study",
+        kind="report_ready",
+        report_id=report_id,
+    )
+
+
+# ---------- SMTP ----------
+class SMTPPool:
+    """Пул SMTP-соединений процесса: соединение после пачки возвращается и используется снова."""
+
+    def __init__(self, host, port, username=None, password=None, use_tls=False, use_ssl=False,
+                 timeout=10, size=2, idle=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.size = max(1, size)
+        self.idle = idle
+        self._idle = []  # (conn, time.monotonic() последнего использования)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config["MAIL_SERVER"], config["MAIL_PORT"],
+            username=config["MAIL_USERNAME"], password=config["MAIL_PASSWORD"],
+            use_tls=config["MAIL_USE_TLS"], use_ssl=config["MAIL_USE_SSL"],
+            timeout=config["MAIL_TIMEOUT"], size=config["MAIL_POOL_SIZE"], idle=config["MAIL_CONNECTION_IDLE"],
+        )
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        conn = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.use_tls and not self.use_ssl:
+            conn.starttls()
+        if self.username:
+            conn.login(self.username, self.password or "")
+        return conn
+
+    @staticmethod
+    def _quit(conn):
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if time.monotonic() - last_used > self.idle:
+                self._quit(conn)
+                continue
+            # сервер мог закрыть простаивавшее соединение — проверяем одним NOOP
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._quit(conn)
+        return self._connect()
+
+    def release(self, conn, broken=False):
+        if not broken:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append((conn, time.monotonic()))
+                    return
+        self._quit(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._quit(conn)
+
+
+def build_email(message, sender):
+    email = EmailMessage()
+    email["From"] = sender
+    email["To"] = message["to_addr"]
+    email["Subject"] = message["subject"]
+    email["Date"] = formatdate(localtime=True)
+    # постоянный Message-ID: повтор после сбоя получатель распознает как то же письмо
+    domain = parseaddr(sender)[1].rpartition("@")[2] or "localhost"
+    email["Message-ID"] = f"<outbox-{message['id']}@{domain}>"
+    email.set_content(message["body"])
+    return email
+
+
+def _is_permanent(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 500 <= exc.smtp_code < 600
+    return False
+
+
+def _send_chunk(pool, messages, sender):
+    """Отправляет письма через одно соединение из пула. [(id, ошибка или None, постоянная ли)]."""
+    results = []
+    conn = None
+    for number, message in enumerate(messages):
+        if conn is None:
+            try:
+                conn = pool.acquire()
+            except Exception as exc:
+                # сервер недоступен или не принял логин — вся оставшаяся часть пачки на повтор
+                error = f"{type(exc).__name__}: {exc}"[:1000]
+                results.extend((rest["id"], error, False) for rest in messages[number:])
+                return results
+        try:
+            conn.send_message(build_email(message, sender))
+            results.append((message["id"], None, False))
+        except Exception as exc:
+            permanent = _is_permanent(exc)
+            results.append((message["id"], f"{type(exc).__name__}: {exc}"[:1000], permanent))
+            if not permanent:
+                # обрыв/таймаут: соединение больше не используем
+                pool.release(conn, broken=True)
+                conn = None
+    if conn is not None:
+        pool.release(conn)
+    return results
+
+
+def send_batch(pool, messages, sender):
+    """Делит пачку между соединениями пула (параллельно) и собирает результаты."""
+    if not messages:
+        return []
+    chunks = [messages[i::pool.size] for i in range(min(pool.size, len(messages)))]
+    if len(chunks) == 1:
+        return _send_chunk(pool, chunks[0], sender)
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        futures = [executor.submit(_send_chunk, pool, chunk, sender) for chunk in chunks]
+        return [result for future in futures for result in future.result()]
+
+
+# ---------- Очередь в БД ----------
+def retry_delay(attempts, base, cap):
+    """Задержка перед попыткой attempts + 1: base * 2^(attempts-1), не больше cap, ±20%."""
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_batch(batch_size, lease_seconds, max_attempts, now=None):
+    """Захватывает созревшие письма и возвращает (token, [dict]) — данные для отправки без ORM."""
+    now = now or datetime.utcnow()
+    # захват истёк на последней попытке — процесс падал на этом письме, больше не пробуем
+    db.session.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.status == "sending", OutboxMessage.locked_until < now,
+               OutboxMessage.attempts >= max_attempts)
+        .values(status="failed", claim_token=None, locked_until=None, last_error="lease expired")
+        .execution_options(synchronize_session=False)
+    )
+    claimable = or_(
+        and_(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now),
+        and_(OutboxMessage.status == "sending", OutboxMessage.locked_until < now),
+    )
+    ids = db.session.scalars(
+        select(OutboxMessage.id).where(claimable)
+        .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not ids:
+        db.session.commit()
+        return None, []
+
+    token = uuid4().hex
+    db.session.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(ids), claimable)
+        .values(status="sending", claim_token=token, locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=OutboxMessage.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    rows = db.session.execute(
+        select(OutboxMessage.id, OutboxMessage.to_addr, OutboxMessage.subject, OutboxMessage.body,
+               OutboxMessage.attempts)
+        .where(OutboxMessage.claim_token == token)
+        .order_by(OutboxMessage.id)
+    ).all()
+    db.session.commit()
+    return token, [row._asdict() for row in rows]
+
+
+def record_results(token, messages, results, config, now=None):
+    """Пишет исход отправки одной транзакцией. Возвращает {"sent", "retry", "failed"}."""
+    now = now or datetime.utcnow()
+    attempts = {message["id"]: message["attempts"] for message in messages}
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    for message_id, error, permanent in results:
+        if error is None:
+            values = {"status": "sent", "sent_at": now, "last_error": None}
+            counts["sent"] += 1
+        elif permanent or attempts[message_id] >= config["MAIL_MAX_ATTEMPTS"]:
+            values = {"status": "failed", "last_error": error}
+            counts["failed"] += 1
+        else:
+            delay = retry_delay(attempts[message_id], config["MAIL_RETRY_BASE"], config["MAIL_RETRY_MAX"])
+            values = {"status": "pending", "last_error": error, "next_attempt_at": now + timedelta(seconds=delay)}
+            counts["retry"] += 1
+        db.session.execute(
+            # письмо с истёкшим захватом мог взять другой процесс — его не перезаписываем
+            update(OutboxMessage)
+            .where(OutboxMessage.id == message_id, OutboxMessage.claim_token == token)
+            .values(claim_token=None, locked_until=None, updated_at=now, **values)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return counts
+
+
+def dispatch_once(pool, config=None):
+    """Одна пачка: захват, отправка, запись результата. Возвращает (взято писем, счётчики)."""
+    config = config or current_app.config
+    token, messages = claim_batch(config["MAIL_BATCH_SIZE"], config["MAIL_LEASE_SECONDS"], config["MAIL_MAX_ATTEMPTS"])
+    if not messages:
+        return 0, {"sent": 0, "retry": 0, "failed": 0}
+    results = send_batch(pool, messages, config["MAIL_DEFAULT_SENDER"])
+    return len(messages), record_results(token, messages, results, config)
+
+
+# ---------- Диспетчер ----------
+class MailDispatcher:
+    """Фоновый поток процесса. Запускается при первом запросе в процессе (после fork)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config["MAIL_POLL_INTERVAL"]
+        self.pool = SMTPPool.from_config(app.config)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # SMTP-соединения, унаследованные от мастера, — не наши
+            self.pool = SMTPPool.from_config(self.app.config)
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="mail-dispatcher", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        batch_size = self.app.config["MAIL_BATCH_SIZE"]
+        while not self._stop.is_set():
+            taken = 0
+            try:
+                with self.app.app_context():
+                    taken, counts = dispatch_once(self.pool)
+                if taken:
+                    self.app.logger.info("Mail outbox: sent %(sent)d, retry %(retry)d, failed %(failed)d", counts)
+            except Exception:
+                self.app.logger.exception("Mail outbox: dispatch failed")
+            if taken >= batch_size:
+                continue  # очередь не пуста — следующая пачка сразу
+            self._wake.wait(self.interval)
+            self._wake.clear()
+        self.pool.close()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+
+def init_mailer(app):
+    dispatcher = None
+    if app.config["MAIL_DISPATCHER_ENABLED"]:
+        dispatcher = MailDispatcher(app)
+        app.before_request(dispatcher.ensure_started)
+        atexit.register(dispatcher.stop)
+    app.extensions["mail_dispatcher"] = dispatcher
+    app.cli.add_command(mail_cli)
+
+
+def stop_mailer(app):
+    """Остановка диспетчера (выход воркера): дожидаемся текущей пачки."""
+    dispatcher = app.extensions.get("mail_dispatcher")
+    if dispatcher is not None:
+        dispatcher.stop()
+
+
+# ---------- CLI ----------
+@mail_cli.command("dispatch")
+@click.option("--once", is_flag=True, help="Одна пачка и выход (для cron)")
+def dispatch_command(once):
+    """Отправлять письма из outbox (отдельный процесс-диспетчер)."""
+    config = current_app.config
+    pool = SMTPPool.from_config(config)
+    try:
+        while True:
+            taken, counts = dispatch_once(pool)
+            if taken:
+                click.echo(f"Отправлено: {counts['sent']}, повтор: {counts['retry']}, ошибок: {counts['failed']}")
+            if once:
+                break
+            if taken < config["MAIL_BATCH_SIZE"]:
+                time.sleep(config["MAIL_POLL_INTERVAL"])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+
+
+@mail_cli.command("stats")
+def stats_command():
+    """Письма в outbox по статусам."""
+    rows = db.session.execute(
+        select(OutboxMessage.status, func.count(OutboxMessage.id)).group_by(OutboxMessage.status)
+    ).all()
+    for status, count in sorted(rows):
+        click.echo(f"{status}: {count}")
+
+
+@mail_cli.command("retry-failed")
+def retry_failed_command():
+    """Вернуть письма со статусом failed в очередь (попытки с нуля)."""
+    updated = db.session.execute(
+        update(OutboxMessage).where(OutboxMessage.status == "failed")
+        .values(status="pending", attempts=0, next_attempt_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    click.echo(f"Возвращено в очередь: {updated}")
@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, url_for, redirect, flash
 from app.extensions import db
-from app.models import Course, Lesson, News, Contact  # используем свои модели
-from app.forms import ContactForm
+from app.models import Course, Lesson, Contact, Feedback, User  # используем свои модели
+from app.forms import ContactForm, FeedbackForm
 import os
 from flask import current_app, request, flash, redirect, url_for, render_template, send_from_directory, abort
 from flask_login import login_required, current_user
@@ -9,6 +9,16 @@ from app.forms import FileUploadForm
 from app.extensions import db
 from app.models import File
 from app.utils import save_uploaded_file
+from app.storage import get_storage
+from app.storage_quota import check_quota_after_flush, upload_quota_required, usage_for, user_quota
+from app import news_feed
+from app.ratelimit import rate_limit
+from app.view_tracking import record_view
+from sqlalchemy.orm import load_only, undefer
+from app.ratings import submit_feedback, summaries_for, summary_for
+from app import catalog
+from app.course_page import get_course_detail
+from app import sitemap
 
 
 main_bp = Blueprint("main", __name__)
@@ -25,27 +35,111 @@ def about():
     breadcrumbs = [("About", url_for("main.about"))]
     return render_template("about.html", breadcrumbs=breadcrumbs)
 
-# Courses list with simple pagination
+# Courses catalog: фильтры, сортировка, счётчики фасетов (app/catalog.py)
 @main_bp.route("/courses")
 def courses():
     page = request.args.get("page", 1, type=int)
     per_page = 6
-    pagination = Course.query.order_by(Course.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    staff = current_user.is_authenticated and (current_user.has_role("admin") or current_user.has_role("teacher"))
+    filters = catalog.CatalogFilters.from_args(request.args, staff=staff)
+    facets = catalog.get_facet_index().counts(filters)
+    pagination = catalog.catalog_query(filters).paginate(page=page, per_page=per_page, error_out=False)
+    # средние оценки карточек — одним запросом по rating_summaries
+    ratings = summaries_for("course", [c.id for c in pagination.items])
     breadcrumbs = [("Courses", url_for("main.courses"))]
-    return render_template("courses.html", pagination=pagination, breadcrumbs=breadcrumbs)
+    return render_template("courses.html", pagination=pagination, ratings=ratings, breadcrumbs=breadcrumbs,
+                           filters=filters, facets=facets, catalog=catalog, staff=staff,
+                           pagination_args=filters.to_args())
 
 # Course detail
 @main_bp.route("/courses/<int:course_id>")
 def course_detail(course_id):
-    course = Course.query.get_or_404(course_id)
+    # снимок из кэша: курс, опубликованные уроки, число материалов, автор (app/course_page.py)
+    course = get_course_detail(course_id)
+    if course is None:
+        abort(404)
     breadcrumbs = [("Courses", url_for("main.courses")), (course.title, None)]
-    return render_template("course_detail.html", course=course, breadcrumbs=breadcrumbs)
+    rating = summary_for("course", course.id)
+    lesson_ratings = summaries_for("lesson", [lesson.id for lesson in course.lessons])
+    recent_feedback = _feedback_query("course", course.id).limit(5).all()
+    form = _feedback_form("course", course.id)
+    return render_template("course_detail.html", course=course, breadcrumbs=breadcrumbs,
+                           rating=rating, lesson_ratings=lesson_ratings, recent_feedback=recent_feedback, form=form)
+
+
+# ============================
+# Feedback (оценки курсов и уроков)
+# ============================
+def _feedback_query(target_type, target_id):
+    column = Feedback.course_id if target_type == "course" else Feedback.lesson_id
+    return (
+        db.session.query(Feedback, User.username)
+        .join(User, User.id == Feedback.user_id)
+        .filter(Feedback.target_type == target_type, column == target_id)
+        .order_by(Feedback.updated_at.desc(), Feedback.id.desc())
+    )
+
+
+def _feedback_form(target_type, target_id):
+    """Форма с текущей оценкой пользователя (если он уже оценивал)."""
+    form = FeedbackForm()
+    if request.method == "GET" and current_user.is_authenticated:
+        column = Feedback.course_id if target_type == "course" else Feedback.lesson_id
+        own = Feedback.query.filter(Feedback.user_id == current_user.id, column == target_id).first()
+        if own is not None:
+            form.rating.data = own.rating
+            form.comment.data = own.comment
+    return form
+
+
+def _feedback_page(target_type, target_id, title, back_url, pagination_args):
+    if request.method == "POST" and not current_user.is_authenticated:
+        return current_app.login_manager.unauthorized()
+
+    form = _feedback_form(target_type, target_id)
+    if form.validate_on_submit():
+        comment = (form.comment.data or "").strip() or None
+        _, created = submit_feedback(current_user.id, target_type, target_id, form.rating.data, comment)
+        flash("Спасибо за оценку!" if created else "Оценка обновлена.", "success")
+        return redirect(url_for(request.endpoint, **pagination_args))
+
+    page = request.args.get("page", 1, type=int)
+    pagination = _feedback_query(target_type, target_id).paginate(page=page, per_page=20, error_out=False)
+    breadcrumbs = [(title, back_url), ("Отзывы", None)]
+    return render_template("feedback_list.html", form=form, pagination=pagination,
+                           rating=summary_for(target_type, target_id), title=title, back_url=back_url,
+                           pagination_args=pagination_args, breadcrumbs=breadcrumbs)
+
+
+@main_bp.route("/courses/<int:course_id>/feedback", methods=["GET", "POST"])
+@rate_limit("feedback")
+def course_feedback(course_id):
+    course = Course.query.filter_by(id=course_id, is_published=True).first_or_404()
+    return _feedback_page("course", course.id, course.title,
+                          url_for("main.course_detail", course_id=course.id), {"course_id": course.id})
+
+
+@main_bp.route("/lessons/<int:lesson_id>/feedback", methods=["GET", "POST"])
+@rate_limit("feedback")
+def lesson_feedback(lesson_id):
+    # как lesson_detail: опубликованный урок в опубликованном курсе
+    lesson = (
+        Lesson.query.join(Course, Course.id == Lesson.course_id)
+        .filter(Lesson.id == lesson_id, Lesson.is_published.is_(True), Course.is_published.is_(True))
+        .first_or_404()
+    )
+    return _feedback_page("lesson", lesson.id, lesson.title,
+                          url_for("main.lesson_detail", lesson_id=lesson.id), {"lesson_id": lesson.id})
 
 # Lessons list (optionally per course)
 @main_bp.route("/lessons")
 def lessons():
     breadcrumbs = [("Lessons", url_for("main.lessons"))]
-    lessons = Lesson.query.order_by(Lesson.created_at.desc()).all()
+    lessons = (
+        Lesson.query.options(load_only(Lesson.id, Lesson.course_id, Lesson.title, Lesson.excerpt))
+        .order_by(Lesson.created_at.desc())
+        .all()
+    )
     return render_template("lessons.html", lessons=lessons, breadcrumbs=breadcrumbs)
 
 # ============================
@@ -110,23 +204,89 @@ def lesson_detail(lesson_id):
         }
     }
 
-    lesson = newnew_lessons.get(lesson_id)
-    if not lesson:
-        abort(404)
+    # сначала БД (те же уроки, что попадают в sitemap: опубликованные в опубликованных курсах),
+    # встроенные демо-уроки — только если такого урока в БД нет
+    row = (
+        Lesson.query.options(undefer(Lesson.content))
+        .join(Course, Course.id == Lesson.course_id)
+        .filter(Lesson.id == lesson_id, Lesson.is_published.is_(True), Course.is_published.is_(True))
+        .first()
+    )
+    from_db = row is not None
+    if from_db:
+        lesson = {"title": row.title, "text": row.content}
+    else:
+        lesson = newnew_lessons.get(lesson_id)
+        if lesson is None:
+            abort(404)
 
     breadcrumbs = [
         ("Lessons", url_for("main.lessons")),
         (lesson["title"], None)
     ]
 
+    # демо-уроки не из БД: их id не должны попадать в progress
+    if from_db and current_user.is_authenticated:
+        record_view(current_user.id, lesson_id)
+
     return render_template("lesson_detail.html", lesson=lesson, breadcrumbs=breadcrumbs)
 
 
 # News list
 @main_bp.route("/news")
 def news_list():
-    news_list = News.query.order_by(News.created_at.desc()).all()
-    return render_template("news_list.html", news_list=news_list)
+    page = request.args.get("page", 1, type=int)
+    pagination = news_feed.paginate_cards(page, per_page=12)
+    return render_template("news_list.html", pagination=pagination, news_list=pagination.items, pagination_args={})
+
+
+def _cached_response(etag, body, mimetype):
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return response
+
+
+def _feed_response(kind, mimetype):
+    etag, body = news_feed.get_feed(kind, limit=20)
+    return _cached_response(etag, body, mimetype)
+
+
+@main_bp.route("/news/atom.xml")
+def news_atom():
+    return _feed_response("atom", "application/atom+xml")
+
+
+@main_bp.route("/news/rss.xml")
+def news_rss():
+    return _feed_response("rss", "application/rss+xml")
+
+
+# ---------------------------
+# sitemap.xml / robots.txt
+# ---------------------------
+@main_bp.route("/sitemap.xml")
+def sitemap_index():
+    sitemaps = sitemap.get_sitemaps()
+    return _cached_response(sitemaps.etag, sitemaps.index, "application/xml")
+
+
+@main_bp.route("/sitemap-<int:number>.xml")
+def sitemap_part(number):
+    sitemaps = sitemap.get_sitemaps()
+    if not 1 <= number <= len(sitemaps.parts):
+        abort(404)
+    return _cached_response(f"{sitemaps.etag}-{number}", sitemaps.parts[number - 1], "application/xml")
+
+
+@main_bp.route("/robots.txt")
+def robots_txt():
+    response = current_app.response_class(sitemap.build_robots(), mimetype="text/plain")
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return response
 
 # ---------------------------
 # ML materials + demo lesson
@@ -153,12 +313,13 @@ def ml_intro():
 
 @main_bp.route("/news/<int:news_id>")
 def news_detail(news_id):
-    news = News.query.get_or_404(news_id)
-    latest_news = News.query.filter(News.id != news_id).order_by(News.created_at.desc()).limit(3).all()
+    news = news_feed.get_published_or_404(news_id)
+    latest_news = news_feed.latest_cards(3, exclude_id=news_id)
     return render_template("news_detail.html", news=news, latest_news=latest_news)
 
 # Contacts - form
 @main_bp.route("/contacts", methods=["GET", "POST"])
+@rate_limit("contacts")
 def contacts():
     form = ContactForm()
     breadcrumbs = [("Контакты", url_for("main.contacts"))]
@@ -196,6 +357,7 @@ def terms():
 
 @main_bp.route("/files/upload", methods=["GET", "POST"])
 @login_required
+@upload_quota_required
 def upload_file():
     form = FileUploadForm()
     if form.validate_on_submit():
@@ -203,7 +365,6 @@ def upload_file():
         try:
             stored_name, original_name, size, content_type = save_uploaded_file(
                 f,
-                current_app.config["UPLOAD_FOLDER"],
                 current_app.config["ALLOWED_UPLOAD_EXTENSIONS"]
             )
         except ValueError:
@@ -220,6 +381,13 @@ def upload_file():
             visibility="private"  # по умолчанию приватный
         )
         db.session.add(new_file)
+        db.session.flush()  # счётчик storage_usage увеличен в этой же транзакции
+        ok, used, limit = check_quota_after_flush(current_user)
+        if not ok:
+            db.session.rollback()
+            get_storage().delete(stored_name)
+            flash(f"Превышена квота хранилища ({limit // (1024 * 1024)} МБ)", "danger")
+            return redirect(url_for("main.user_files"))
         db.session.commit()
         flash("Файл загружен успешно", "success")
         return redirect(url_for("main.user_files"))
@@ -234,7 +402,9 @@ def user_files():
     pagination = File.query.filter(
         (File.owner_user_id == current_user.id) | (File.visibility != "private")
     ).order_by(File.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
-    return render_template("files/list.html", pagination=pagination)
+    used_bytes, _ = usage_for("user", current_user.id)
+    return render_template("files/list.html", pagination=pagination,
+                           used_bytes=used_bytes, quota_bytes=user_quota(current_user))
 
 @main_bp.route("/files/<int:file_id>/download")
 @login_required
@@ -248,12 +418,6 @@ def download_file(file_id):
     if file.owner_user_id != current_user.id and not current_user.has_role("admin") and file.visibility == "private":
         abort(403)
 
-    uploads = current_app.config["UPLOAD_FOLDER"]
-    # send_from_directory безопасно, не отдаёт файлы вне папки
-    # modern Flask: use download_name; older: attachment_filename
-    try:
-        return send_from_directory(uploads, file.path, as_attachment=True, download_name=file.original_name)
-    except TypeError:
-        # Fallback для старых версий Flask
-        return send_from_directory(uploads, file.path, as_attachment=True, attachment_filename=file.original_name)
+    # local — send_from_directory (не выходит за пределы папки), s3 — редирект на presigned URL
+    return get_storage().download_response(file.path, download_name=file.original_name, mimetype=file.content_type)
 
@@ -0,0 +1,191 @@
+# app/materials_index.py
+# Индекс методических материалов из static/materials/<course_slug>/.
+# Папки сканируются один раз, дальше индекс пересобирается только для тех курсов,
+# у которых изменился mtime каталога (файл добавлен/удалён/переименован).
+# Изменение содержимого файла «на месте» mtime каталога не меняет — для этого
+# есть `flask materials rescan`.
+import hashlib
+import json
+import os
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+materials_cli = AppGroup("materials", help="Индекс методических материалов")
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MaterialsIndex:
+    """
+    Состояние: {course_slug: {"mtime": mtime каталога, "items": [{name, size, mtime, sha256}]}}.
+    Хранится в памяти процесса и в JSON-файле, чтобы перезапуск не требовал полного скана.
+    Для запросов при каждой пересборке готовится снимок: отсортированные slug'и и плоские
+    списки файлов (все и по курсу) — items() отдаёт готовый кортеж, ничего не копируя.
+    """
+
+    def __init__(self, root, cache_file=None, check_interval=30):
+        self.root = root
+        self.cache_file = cache_file
+        self.check_interval = check_interval
+        self._courses = {}
+        self._snapshot = ((), {None: ()})  # (slug'и, {course_slug или None: кортеж файлов})
+        self._root_mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._load()
+
+    # ---------- persistence ----------
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return
+        if data.get("root") != self.root:
+            return
+        self._root_mtime = data.get("root_mtime")
+        self._set_courses(data.get("courses", {}))
+
+    def _set_courses(self, courses):
+        """Подменяет индекс и снимок для запросов (одним присваиванием каждого)."""
+        slugs = tuple(sorted(courses))
+        flat = {
+            slug: tuple(dict(item, course_slug=slug) for item in courses[slug].get("items", []))
+            for slug in slugs
+        }
+        flat[None] = tuple(item for slug in slugs for item in flat[slug])
+        self._courses = courses
+        self._snapshot = (slugs, flat)
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"root": self.root, "root_mtime": self._root_mtime, "courses": self._courses},
+                      fh, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_file)
+
+    # ---------- scanning ----------
+    def _scan_course(self, course_slug, dir_mtime, rehash=False):
+        """Список файлов курса (новая запись индекса); хэш пересчитывается только для изменённых файлов."""
+        course_path = os.path.join(self.root, course_slug)
+        previous = {} if rehash else {
+            item["name"]: item for item in self._courses.get(course_slug, {}).get("items", [])
+        }
+        items = []
+        with os.scandir(course_path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                old = previous.get(entry.name)
+                if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime:
+                    items.append(old)
+                    continue
+                items.append({
+                    "name": entry.name,
+                    "size": st.st_size,
+                    "mtime": st.st_mtime,
+                    "sha256": _sha256(entry.path),
+                })
+        items.sort(key=lambda i: i["name"])
+        return {"mtime": dir_mtime, "items": items}
+
+    def refresh(self, force=False, rehash=False):
+        """
+        Проверяет mtime корня и каталогов курсов и досканирует изменившиеся.
+        force — обойти все каталоги (поймать правки файлов «на месте»),
+        rehash — дополнительно пересчитать хэши всех файлов.
+        Возвращает True, если индекс поменялся.
+        Новый индекс собирается в отдельном словаре и подменяется целиком вместе со снимком:
+        читатели (course_slugs/items) из других потоков не видят его в процессе изменения.
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if not os.path.isdir(self.root):
+                changed = bool(self._courses)
+                self._root_mtime = None
+                self._set_courses({})
+                if changed:
+                    self._save()
+                return changed
+
+            changed = False
+            root_mtime = os.stat(self.root).st_mtime
+            if force or root_mtime != self._root_mtime:
+                self._root_mtime = root_mtime
+                changed = True
+
+            courses = {}
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if not entry.is_dir():
+                        continue
+                    dir_mtime = entry.stat().st_mtime
+                    cached = self._courses.get(entry.name)
+                    if force or cached is None or cached["mtime"] != dir_mtime:
+                        courses[entry.name] = self._scan_course(entry.name, dir_mtime, rehash=rehash)
+                        changed = True
+                    else:
+                        courses[entry.name] = cached
+
+            if set(self._courses) - set(courses):
+                changed = True
+
+            if changed:
+                self._set_courses(courses)
+                self._save()
+            return changed
+
+    def ensure_fresh(self):
+        """Проверка mtime не чаще, чем раз в check_interval секунд."""
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+
+    # ---------- queries ----------
+    def course_slugs(self):
+        return list(self._snapshot[0])
+
+    def items(self, course_slug=None):
+        """
+        Кортеж файлов (с course_slug), отсортированный по курсу и имени. Словари общие
+        для всех запросов — только для чтения.
+        """
+        return self._snapshot[1].get(course_slug or None, ())
+
+
+def get_materials_index():
+    """Индекс текущего приложения (один на процесс)."""
+    app = current_app._get_current_object()
+    index = app.extensions.get("materials_index")
+    if index is None:
+        index = MaterialsIndex(
+            os.path.join(app.static_folder, "materials"),
+            cache_file=app.config.get("MATERIALS_INDEX_FILE"),
+            check_interval=app.config.get("MATERIALS_INDEX_CHECK_INTERVAL", 30),
+        )
+        app.extensions["materials_index"] = index
+    return index
+
+
+@materials_cli.command("rescan")
+@click.option("--full", is_flag=True, help="Пересчитать хэши всех файлов, а не только изменённых.")
+def rescan_command(full):
+    """Принудительно пересканировать static/materials/."""
+    index = get_materials_index()
+    index.refresh(force=True, rehash=full)
+    click.echo(f"Курсов: {len(index.course_slugs())}, файлов: {len(index.items())}")
@@ -0,0 +1,131 @@
+# app/migrations_runner.py
+# Применение миграций при старте нескольких экземпляров.
+# Сначала дешёвая проверка: ревизия в alembic_version == head из migrations/versions —
+# тогда ничего не делаем (env.py Alembic не загружается). Иначе берём блокировку
+# (advisory lock в PostgreSQL, файловую на SQLite), перепроверяем и выполняем upgrade.
+# Ошибки не глотаются: вызывающий код должен завершить старт.
+import os
+import time
+import zlib
+
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask import current_app
+from flask_migrate import upgrade
+
+from app.extensions import db
+
+# постоянный ключ advisory lock для миграций этого приложения
+ADVISORY_LOCK_KEY = zlib.crc32(b"vkrsite:migrations")
+
+
+class MigrationLockTimeout(RuntimeError):
+    pass
+
+
+def script_heads():
+    """Head-ревизии из каталога миграций (читаются только файлы versions/)."""
+    directory = current_app.extensions["migrate"].directory
+    config = AlembicConfig(os.path.join(directory, "alembic.ini"))
+    config.set_main_option("script_location", directory)
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def database_heads(connection):
+    return set(MigrationContext.configure(connection).get_current_heads())
+
+
+def is_up_to_date():
+    with db.engine.connect() as conn:
+        return database_heads(conn) == script_heads()
+
+
+class _PostgresLock:
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.conn = None
+
+    def __enter__(self):
+        # отдельное соединение держит блокировку на всё время upgrade
+        self.conn = db.engine.connect()
+        deadline = time.monotonic() + self.timeout
+        while not self.conn.exec_driver_sql(f"SELECT pg_try_advisory_lock({ADVISORY_LOCK_KEY})").scalar():
+            if time.monotonic() > deadline:
+                self.conn.close()
+                raise MigrationLockTimeout("advisory lock на миграции не получен")
+            time.sleep(1)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.conn.exec_driver_sql(f"SELECT pg_advisory_unlock({ADVISORY_LOCK_KEY})")
+        finally:
+            self.conn.close()
+
+
+class _FileLock:
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self.fh = None
+
+    def __enter__(self):
+        import fcntl
+
+        self.fh = open(self.path, "a")
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(self.fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    self.fh.close()
+                    raise MigrationLockTimeout(f"файловая блокировка {self.path} не получена")
+                time.sleep(0.5)
+
+    def __exit__(self, *exc):
+        import fcntl
+
+        fcntl.flock(self.fh, fcntl.LOCK_UN)
+        self.fh.close()
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def migration_lock(timeout=None):
+    if timeout is None:
+        timeout = current_app.config["MIGRATION_LOCK_TIMEOUT"]
+    url = db.engine.url
+    if url.get_backend_name() == "postgresql":
+        return _PostgresLock(timeout)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        return _FileLock(os.path.abspath(url.database) + ".migrate.lock", timeout)
+    return _NoLock()
+
+
+def apply_migrations(log=print):
+    """
+    Доводит схему до head. Возвращает True, если upgrade выполнялся.
+    Исключения (в т.ч. MigrationLockTimeout) пробрасываются.
+    """
+    if is_up_to_date():
+        log(">>> Schema is up to date, migrations skipped")
+        return False
+
+    with migration_lock():
+        # пока ждали блокировку, другой экземпляр мог всё применить
+        if is_up_to_date():
+            log(">>> Schema migrated by another instance")
+            return False
+        log(">>> Running migrations...")
+        upgrade()
+        log(">>> MIGRATIONS APPLIED")
+        return True
@@ -1,8 +1,10 @@
 from app.extensions import db
 from datetime import datetime
 from sqlalchemy import UniqueConstraint
+from sqlalchemy.orm import deferred
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from .passwords import make_password_hash
 from .extensions import db
 
 # ---------- Roles ----------
@@ -35,6 +37,8 @@ class User(db.Model, UserMixin):
     last_login_at = db.Column(db.DateTime(timezone=True))
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
     updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    # версия ссылки на iCalendar-фид расписания (app/schedule.py); +1 — старые ссылки отозваны
+    schedule_feed_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     # связи
     roles = db.relationship("Role", secondary=user_roles, backref=db.backref("users", lazy="dynamic"))
@@ -44,7 +48,7 @@ class User(db.Model, UserMixin):
     # 🔑 методы для работы с паролем
     def set_password(self, password: str) -> None:
         """Хэшируем и сохраняем пароль"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = make_password_hash(password)
 
     def check_password(self, password: str) -> bool:
         """Проверяем введённый пароль"""
@@ -79,7 +83,9 @@ class Course(db.Model):
     id = db.Column(db.BigInteger, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     slug = db.Column(db.String(255), unique=True, nullable=False, index=True)
-    description = db.Column(db.Text)
+    # полный текст — только на странице курса; спискам хватает excerpt (app/excerpts.py)
+    description = deferred(db.Column(db.Text))
+    excerpt = db.Column(db.String(300))
     level = db.Column(db.Enum("beginner","intermediate","advanced", name="course_level"), nullable=False, default="beginner")
     is_published = db.Column(db.Boolean, default=False, nullable=False)
     start_date = db.Column(db.Date)
@@ -89,7 +95,14 @@ class Course(db.Model):
     updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
     author = db.relationship("User", back_populates="courses_created")
-    lessons = db.relationship("Lesson", back_populates="course", cascade="all, delete-orphan")
+    lessons = db.relationship("Lesson", back_populates="course", cascade="all, delete-orphan", order_by="Lesson.order_index")
+
+    # каталог: фильтр по публикации (+ уровень) и сортировка по дате создания / начала
+    __table_args__ = (
+        db.Index("ix_courses_published_created", "is_published", "created_at"),
+        db.Index("ix_courses_published_level_created", "is_published", "level", "created_at"),
+        db.Index("ix_courses_published_start", "is_published", "start_date"),
+    )
 
 class Lesson(db.Model):
     __tablename__ = "lessons"
@@ -97,7 +110,8 @@ class Lesson(db.Model):
     course_id = db.Column(db.BigInteger, db.ForeignKey("courses.id", ondelete="CASCADE"), nullable=False, index=True)
     title = db.Column(db.String(255), nullable=False)
     order_index = db.Column(db.Integer, nullable=False, default=1)
-    content = db.Column(db.Text)
+    content = deferred(db.Column(db.Text))
+    excerpt = db.Column(db.String(300))
     video_url = db.Column(db.String(500))
     is_published = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
@@ -161,17 +175,59 @@ class Feedback(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
     updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # одна оценка пользователя на курс / урок (у оценки урока course_id пустой, NULL не конфликтует)
+    __table_args__ = (
+        UniqueConstraint("user_id", "course_id", name="uq_feedback_user_course"),
+        UniqueConstraint("user_id", "lesson_id", name="uq_feedback_user_lesson"),
+    )
+
+    @property
+    def target_id(self):
+        return self.course_id if self.target_type == "course" else self.lesson_id
+
+
+class RatingSummary(db.Model):
+    """
+    Сводка оценок по объекту: target_type='course'/'lesson', target_id — id курса/урока.
+    Число, сумма и гистограмма (r1..r5) меняются в той же транзакции, что и Feedback (app/ratings.py).
+    """
+    __tablename__ = "rating_summaries"
+    target_type = db.Column(db.String(16), primary_key=True)
+    target_id = db.Column(db.BigInteger, primary_key=True)
+    ratings_count = db.Column(db.Integer, nullable=False, default=0)
+    ratings_sum = db.Column(db.Integer, nullable=False, default=0)
+    r1 = db.Column(db.Integer, nullable=False, default=0)
+    r2 = db.Column(db.Integer, nullable=False, default=0)
+    r3 = db.Column(db.Integer, nullable=False, default=0)
+    r4 = db.Column(db.Integer, nullable=False, default=0)
+    r5 = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def average(self):
+        return round(self.ratings_sum / self.ratings_count, 1) if self.ratings_count else None
+
+    @property
+    def histogram(self):
+        """[(оценка, количество)] от 5 до 1."""
+        return [(r, getattr(self, f"r{r}")) for r in range(5, 0, -1)]
+
 # ---------- Files ----------
 class File(db.Model):
     __tablename__ = "files"
     id = db.Column(db.BigInteger, primary_key=True)
     owner_user_id = db.Column(db.BigInteger, db.ForeignKey("users.id", ondelete="SET NULL"))
+    # курс, к которому относится файл (сертификаты, выгрузки) — для учёта места по курсам
+    course_id = db.Column(db.BigInteger, db.ForeignKey("courses.id", ondelete="SET NULL"), index=True)
     original_name = db.Column(db.String(255), nullable=False)
     path = db.Column(db.String(1000), nullable=False)
     content_type = db.Column(db.String(255))
     size_bytes = db.Column(db.BigInteger)
     sha256 = db.Column(db.String(64), index=True)
     visibility = db.Column(db.Enum("private","course","public", name="file_visibility"), nullable=False, default="private")
+    # "upload" — загружен пользователем, "certificate" — выдан реестром сертификатов,
+    # "export" — архив выгрузки (последние два в квоту владельца не входят, см. app/storage_quota.py)
+    kind = db.Column(db.String(20), nullable=False, default="upload", server_default="upload")
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
 
 # ---------- Reports ----------
@@ -180,7 +236,7 @@ class Report(db.Model):
     id = db.Column(db.BigInteger, primary_key=True)
     user_id = db.Column(db.BigInteger, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     course_id = db.Column(db.BigInteger, db.ForeignKey("courses.id", ondelete="SET NULL"))
-    type = db.Column(db.Enum("docx","xlsx","pdf", name="report_type"), nullable=False, default="docx")
+    type = db.Column(db.Enum("docx","xlsx","pdf","zip", name="report_type"), nullable=False, default="docx")
     status = db.Column(db.Enum("queued","generating","ready","failed", name="report_status"), nullable=False, default="queued")
     file_id = db.Column(db.BigInteger, db.ForeignKey("files.id", ondelete="SET NULL"))
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
@@ -192,19 +248,124 @@ class News(db.Model):
     id = db.Column(db.BigInteger, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     slug = db.Column(db.String(255), unique=True, nullable=False, index=True)
-    body = db.Column(db.Text)
+    body = deferred(db.Column(db.Text))
+    excerpt = db.Column(db.String(300))
     is_published = db.Column(db.Boolean, default=False, nullable=False)
     published_at = db.Column(db.DateTime(timezone=True))
     author_user_id = db.Column(db.BigInteger, db.ForeignKey("users.id", ondelete="SET NULL"))
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
     updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # лента: WHERE is_published ORDER BY coalesce(published_at, created_at) DESC (app/news_feed.py)
+    __table_args__ = (db.Index("ix_news_published", "is_published", "published_at"),)
+
 class Contact(db.Model):
     __tablename__ = "contacts"
     id = db.Column(db.BigInteger, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     email = db.Column(db.String(255), nullable=False)
     subject = db.Column(db.String(255))
-    message = db.Column(db.Text, nullable=False)
+    message = deferred(db.Column(db.Text, nullable=False))
+    excerpt = db.Column(db.String(300))
     is_read = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+
+# ---------- Schedule ----------
+class ScheduleEvent(db.Model):
+    __tablename__ = "schedule_events"
+    id = db.Column(db.BigInteger, primary_key=True)
+    teacher_id = db.Column(db.BigInteger, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    course_id = db.Column(db.BigInteger, db.ForeignKey("courses.id", ondelete="SET NULL"))
+    title = db.Column(db.String(255), nullable=False)
+    starts_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    ends_at = db.Column(db.DateTime(timezone=True))
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    course = db.relationship("Course")
+
+    # выборка окна дат по преподавателю идёт по этому индексу;
+    # уникальный ключ — страховка от дублей при повторном импорте (app/schedule.py)
+    __table_args__ = (
+        db.Index("ix_schedule_events_teacher_starts", "teacher_id", "starts_at"),
+        UniqueConstraint("teacher_id", "starts_at", "title", name="uq_schedule_events_teacher_starts_title"),
+    )
+
+# ---------- Certificates ----------
+class Certificate(db.Model):
+    """Выданный сертификат: один на (user, course), файл перевыпускается только при смене данных."""
+    __tablename__ = "certificates"
+    id = db.Column(db.BigInteger, primary_key=True)
+    user_id = db.Column(db.BigInteger, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    course_id = db.Column(db.BigInteger, db.ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
+    file_id = db.Column(db.BigInteger, db.ForeignKey("files.id", ondelete="SET NULL"))
+    template_version = db.Column(db.String(64), nullable=False)
+    # sha256 от версии шаблона и подставляемых данных (имя, email, название курса)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    file = db.relationship("File")
+
+    __table_args__ = (UniqueConstraint("user_id", "course_id", name="uq_certificate_user_course"),)
+
+# ---------- Rate limiting ----------
+class RateLimitBucket(db.Model):
+    """Token bucket для общего (между воркерами) ограничения частоты запросов."""
+    __tablename__ = "rate_limit_buckets"
+    key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    # unix time последнего пересчёта (секунды)
+    refilled_at = db.Column(db.Float, nullable=False, index=True)
+
+# ---------- Storage usage ----------
+class StorageUsage(db.Model):
+    """
+    Счётчики занятого места: scope='user' (owner_id = users.id) или 'course' (owner_id = courses.id).
+    Обновляются в той же транзакции, что и вставка/удаление File (см. app/storage_quota.py).
+    """
+    __tablename__ = "storage_usage"
+    scope = db.Column(db.String(16), primary_key=True)
+    owner_id = db.Column(db.BigInteger, primary_key=True)
+    bytes_used = db.Column(db.BigInteger, nullable=False, default=0)
+    files_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.Index("ix_storage_usage_scope_bytes", "scope", "bytes_used"),)
+
+# ---------- Analytics ----------
+class CourseStatsSnapshot(db.Model):
+    """Снимок аналитики курса (воронка, точки ухода, распределения) — JSON из app/analytics.py."""
+    __tablename__ = "course_stats_snapshots"
+    id = db.Column(db.BigInteger, primary_key=True)
+    course_id = db.Column(db.BigInteger, db.ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
+    computed_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    students = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.JSON, nullable=False)
+
+    __table_args__ = (db.Index("ix_course_stats_snapshots_course_computed", "course_id", "computed_at"),)
+
+# ---------- Mail outbox ----------
+class OutboxMessage(db.Model):
+    """Письмо в очереди на отправку (app/mailer.py): запрос только добавляет строку, шлёт фоновый диспетчер."""
+    __tablename__ = "outbox"
+    id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, default="generic")
+    to_addr = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Enum("pending","sending","sent","failed", name="outbox_status"), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    # захват пачки диспетчером: кто взял и до какого времени (после — письмо берёт другой)
+    claim_token = db.Column(db.String(32))
+    locked_until = db.Column(db.DateTime(timezone=True))
+    last_error = db.Column(db.Text)
+    contact_id = db.Column(db.BigInteger, db.ForeignKey("contacts.id", ondelete="SET NULL"), index=True)
+    report_id = db.Column(db.BigInteger, db.ForeignKey("reports.id", ondelete="SET NULL"))
+    created_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime(timezone=True))
+    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # диспетчер: WHERE status = 'pending' AND next_attempt_at <= now ORDER BY next_attempt_at
+    __table_args__ = (db.Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),)
@@ -0,0 +1,164 @@
+# app/news_feed.py
+# Лента новостей: только опубликованные, по published_at (индекс ix_news_published),
+# для карточек — только нужные колонки. Последние N новостей и Atom/RSS кэшируются
+# в процессе и пересобираются, только когда меняется «версия» таблицы news.
+import hashlib
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from sqlalchemy import func
+from sqlalchemy.orm import undefer
+
+from app.extensions import db
+from app.models import News
+from app.utils import external_url, site_base_url
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def news_version():
+    """
+    Версия ленты: количество строк и последний updated_at.
+    Любая публикация, правка или удаление новости её меняет.
+    """
+    count, last_update = db.session.query(func.count(News.id), func.max(News.updated_at)).one()
+    return f"{count}:{last_update.isoformat() if last_update else ''}"
+
+
+def _cached(key, version, build):
+    hit = _cache.get(key)
+    if hit and hit[0] == version:
+        return hit[1]
+    value = build()
+    with _cache_lock:
+        _cache[key] = (version, value)
+    return value
+
+
+def published_at_expr():
+    """Дата новости для карточек и порядка ленты: published_at, а если её нет — created_at."""
+    return func.coalesce(News.published_at, News.created_at)
+
+
+def card_columns():
+    return (
+        News.id,
+        News.title,
+        News.slug,
+        published_at_expr().label("published_at"),
+        # превью хранится в news.excerpt (app/excerpts.py) — body не читаем
+        News.excerpt,
+    )
+
+
+def published_cards_query():
+    return (
+        db.session.query(*card_columns())
+        .filter(News.is_published.is_(True))
+        # та же дата, что показывается: без неё новости без published_at (NULL первым
+        # при DESC на PostgreSQL) всплывали бы в начало ленты
+        .order_by(published_at_expr().desc(), News.id.desc())
+    )
+
+
+def paginate_cards(page, per_page):
+    """Страница карточек (Row: id, title, slug, published_at, excerpt)."""
+    return published_cards_query().paginate(page=page, per_page=per_page, error_out=False)
+
+
+def latest_cards(limit, exclude_id=None, version=None):
+    """Последние опубликованные новости из кэша; exclude_id — текущая новость на странице детали."""
+    version = version or news_version()
+    # берём на одну больше, чтобы после исключения текущей осталось limit
+    rows = _cached(("latest", limit + 1), version,
+                   lambda: [r._asdict() for r in published_cards_query().limit(limit + 1).all()])
+    return [r for r in rows if r["id"] != exclude_id][:limit]
+
+
+def get_published_or_404(news_id):
+    return News.query.options(undefer(News.body)).filter_by(id=news_id, is_published=True).first_or_404()
+
+
+# ---------- Atom / RSS ----------
+def _feed_items(limit):
+    return published_cards_query().limit(limit).all()
+
+
+def _as_utc(value):
+    # в базе datetime.utcnow() без tzinfo — считаем его UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def rfc3339(value):
+    return _as_utc(value).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def build_atom(limit):
+    items = _feed_items(limit)
+    updated = items[0].published_at if items else datetime.utcnow()
+    feed_url = external_url("main.news_atom")
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<feed xmlns="http://www.w3.org/2005/Atom">',
+        "<title>ML-Study — Новости</title>",
+        f"<id>{escape(feed_url)}</id>",
+        f'<link rel="self" href="{escape(feed_url)}"/>',
+        f'<link href="{escape(external_url("main.news_list"))}"/>',
+        f"<updated>{rfc3339(updated)}</updated>",
+    ]
+    for item in items:
+        link = external_url("main.news_detail", news_id=item.id)
+        parts += [
+            "<entry>",
+            f"<title>{escape(item.title)}</title>",
+            f'<link href="{escape(link)}"/>',
+            f"<id>{escape(link)}</id>",
+            f"<updated>{rfc3339(item.published_at)}</updated>",
+            f'<summary type="html">{escape(item.excerpt or "")}</summary>',
+            "</entry>",
+        ]
+    parts.append("</feed>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def build_rss(limit):
+    items = _feed_items(limit)
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<rss version="2.0">',
+        "<channel>",
+        "<title>ML-Study — Новости</title>",
+        f"<link>{escape(external_url('main.news_list'))}</link>",
+        "<description>Новости ML-Study</description>",
+    ]
+    for item in items:
+        link = external_url("main.news_detail", news_id=item.id)
+        parts += [
+            "<item>",
+            f"<title>{escape(item.title)}</title>",
+            f"<link>{escape(link)}</link>",
+            f'<guid isPermaLink="true">{escape(link)}</guid>',
+            f"<pubDate>{format_datetime(_as_utc(item.published_at), usegmt=True)}</pubDate>",
+            f"<description>{escape(item.excerpt or '')}</description>",
+            "</item>",
+        ]
+    parts += ["</channel>", "</rss>"]
+    return "\n".join(parts).encode("utf-8")
+
+
+def get_feed(kind, limit):
+    """
+    (etag, body) для 'atom' или 'rss'. Лента собирается один раз на версию таблицы
+    (т.е. на событие публикации), а не на каждый запрос. Адрес сайта входит в версию,
+    а не в ключ кэша: на ленту одна запись, сколько бы разных Host ни присылали.
+    """
+    version = f"{news_version()}:{site_base_url()}"
+    etag = hashlib.sha1(f"{kind}:{limit}:{version}".encode("utf-8")).hexdigest()
+    build = build_atom if kind == "atom" else build_rss
+    body = _cached((kind, limit), version, lambda: build(limit))
+    return etag, body
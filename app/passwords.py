@@ -0,0 +1,68 @@
+# app/passwords.py
+# Хэширование паролей с параметрами из Config, перехэширование при входе,
+# если хэш посчитан со старыми параметрами, и ограничение числа одновременных
+# проверок: лишние логины ждут слот, а не забирают CPU у остальных запросов.
+import threading
+
+from flask import abort, current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_prefix_cache = {}
+_semaphores = {}
+_semaphore_lock = threading.Lock()
+
+
+def hash_method():
+    return current_app.config["PASSWORD_HASH_METHOD"]
+
+
+def make_password_hash(password):
+    return generate_password_hash(
+        password, method=hash_method(), salt_length=current_app.config["PASSWORD_SALT_LENGTH"]
+    )
+
+
+def _method_prefix(method):
+    """
+    Полный префикс хэша для метода: 'scrypt' -> 'scrypt:32768:8:1'.
+    Считается один раз, чтобы сравнивать с сохранёнными хэшами без лишней работы.
+    """
+    prefix = _prefix_cache.get(method)
+    if prefix is None:
+        prefix = generate_password_hash("", method=method, salt_length=1).split("$", 1)[0]
+        _prefix_cache[method] = prefix
+    return prefix
+
+
+def needs_rehash(pwhash):
+    return pwhash.split("$", 1)[0] != _method_prefix(hash_method())
+
+
+def _verify_slots():
+    limit = current_app.config["PASSWORD_VERIFY_CONCURRENCY"]
+    sem = _semaphores.get(limit)
+    if sem is None:
+        with _semaphore_lock:
+            sem = _semaphores.setdefault(limit, threading.BoundedSemaphore(limit))
+    return sem
+
+
+def verify_password(user, password):
+    """
+    Проверяет пароль пользователя. Одновременно идёт не больше
+    PASSWORD_VERIFY_CONCURRENCY проверок на процесс; если слот не освободился за
+    PASSWORD_VERIFY_TIMEOUT секунд — 503 с Retry-After.
+    При успехе и устаревших параметрах хэш пересчитывается (коммит — на вызывающей стороне).
+    """
+    slots = _verify_slots()
+    if not slots.acquire(timeout=current_app.config["PASSWORD_VERIFY_TIMEOUT"]):
+        response = current_app.response_class("Сервер занят, повторите вход через несколько секунд", status=503)
+        response.headers["Retry-After"] = "2"
+        abort(response)
+    try:
+        ok = check_password_hash(user.password_hash, password)
+        if ok and needs_rehash(user.password_hash):
+            user.password_hash = make_password_hash(password)
+        return ok
+    finally:
+        slots.release()
@@ -0,0 +1,173 @@
+# app/ratelimit.py
+# Token bucket для POST-форм (вход, регистрация, контакты). Проверка идёт в
+# декораторе до валидации формы, т.е. до хэширования пароля и записи в БД.
+# Ключи: IP клиента и аккаунт (поле формы, обычно email).
+# Бэкенды: "memory" — в процессе, "database" — таблица rate_limit_buckets,
+# общая для всех воркеров и нод.
+import hashlib
+import math
+import threading
+import time
+from functools import wraps
+
+import click
+from flask import abort, current_app, request
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import RateLimitBucket
+
+ratelimit_cli = AppGroup("ratelimit", help="Ограничение частоты запросов")
+
+
+class MemoryBackend:
+    """Корзины в словаре процесса. Подходит для одного воркера или как грубый лимит на воркер."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key, capacity, period, now):
+        """Забирает токен; возвращает 0 при успехе или секунды до появления токена."""
+        rate = capacity / period
+        with self._lock:
+            tokens, refilled_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - refilled_at) * rate)
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                self._prune(now)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def _prune(self, now, max_idle=3600):
+        stale = [k for k, (_, ts) in self._buckets.items() if now - ts > max_idle]
+        for k in stale:
+            del self._buckets[k]
+
+
+class DatabaseBackend:
+    """Корзины в таблице rate_limit_buckets; строка блокируется на время пересчёта."""
+
+    table = RateLimitBucket.__table__
+
+    def take(self, key, capacity, period, now):
+        rate = capacity / period
+        t = self.table
+        # отдельная короткая транзакция, сессия запроса не затрагивается
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                select(t.c.tokens, t.c.refilled_at).where(t.c.key == key).with_for_update()
+            ).first()
+            if row is None:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(t).values(key=key, tokens=capacity - 1, refilled_at=now))
+                    return 0
+                except IntegrityError:
+                    # параллельный запрос создал строку — считаем по ней
+                    row = conn.execute(
+                        select(t.c.tokens, t.c.refilled_at).where(t.c.key == key).with_for_update()
+                    ).first()
+
+            tokens = min(capacity, row.tokens + (now - row.refilled_at) * rate)
+            allowed = tokens >= 1
+            conn.execute(
+                update(t).where(t.c.key == key).values(tokens=tokens - 1 if allowed else tokens, refilled_at=now)
+            )
+            return 0 if allowed else (1 - tokens) / rate
+
+    def purge(self, older_than):
+        with db.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(self.table.c.refilled_at < older_than)).rowcount
+
+
+_backends = {}
+
+
+def get_backend():
+    name = current_app.config["RATE_LIMIT_BACKEND"]
+    backend = _backends.get(name)
+    if backend is None:
+        backend = DatabaseBackend() if name == "database" else MemoryBackend()
+        _backends[name] = backend
+    return backend
+
+
+def client_ip():
+    if current_app.config["RATE_LIMIT_TRUST_PROXY"]:
+        # за балансировщиком (Render и т.п.) реальный адрес — первый в X-Forwarded-For
+        return request.access_route[0]
+    return request.remote_addr or "unknown"
+
+
+# самый длинный текстовый IPv6-адрес (с IPv4-хвостом)
+MAX_IP_LENGTH = 45
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _too_many(retry_after):
+    response = current_app.response_class(
+        "Слишком много запросов. Повторите попытку позже.", status=429, mimetype="text/plain"
+    )
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    abort(response)
+
+
+def check_rate_limit(name):
+    """
+    Проверяет все лимиты из RATE_LIMITS[name]:
+        {"ip": (запросов, секунд), "account": (запросов, секунд, поле формы)}
+    """
+    limits = current_app.config["RATE_LIMITS"].get(name)
+    if not limits or not current_app.config["RATE_LIMIT_ENABLED"]:
+        return
+    backend = get_backend()
+    now = time.time()
+    retry_after = 0
+
+    if "ip" in limits:
+        capacity, period = limits["ip"]
+        ip = client_ip()
+        # X-Forwarded-For присылает клиент — длинное значение не должно ломать ключ (String(255))
+        if len(ip) > MAX_IP_LENGTH:
+            ip = _digest(ip)
+        retry_after = max(retry_after, backend.take(f"{name}:ip:{ip}", capacity, period, now))
+
+    if "account" in limits:
+        capacity, period, field = limits["account"]
+        account = (request.form.get(field) or "").strip().lower()
+        if account:
+            # поле ещё не провалидировано и может быть любой длины — в ключе только хэш
+            retry_after = max(retry_after, backend.take(f"{name}:acc:{_digest(account)}", capacity, period, now))
+
+    if retry_after:
+        _too_many(retry_after)
+
+
+def rate_limit(name):
+    """Декоратор: ограничивает только POST (GET формы не считаем)."""
+    def wrapper(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method == "POST":
+                check_rate_limit(name)
+            return f(*args, **kwargs)
+        return decorated_function
+    return wrapper
+
+
+@ratelimit_cli.command("purge")
+@click.option("--hours", default=24, show_default=True, help="Удалить корзины, не тронутые столько часов.")
+def purge_command(hours):
+    """Удалить старые корзины из rate_limit_buckets."""
+    removed = DatabaseBackend().purge(time.time() - hours * 3600)
+    click.echo(f"Удалено корзин: {removed}")
@@ -0,0 +1,208 @@
+# app/ratings.py
+# Оценки курсов и уроков (Feedback) и сводка rating_summaries.
+# Сводка (число, сумма, гистограмма 1..5) меняется событиями маппера Feedback в той же
+# транзакции, что и запись оценки, — атомарным upsert (как storage_usage), поэтому
+# каталог показывает средний балл одним чтением по первичному ключу, без агрегации feedback.
+# Каскадные удаления в БД (курс, урок, пользователь) событий Feedback не вызывают —
+# для них свои обработчики ниже.
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, event, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import attributes
+
+from app.extensions import db
+from app.models import Course, Feedback, Lesson, RatingSummary, User
+from app.storage_quota import dialect_insert
+
+ratings_cli = AppGroup("ratings", help="Оценки курсов и уроков")
+
+RATINGS = (1, 2, 3, 4, 5)
+
+
+def _target(target_type, course_id, lesson_id):
+    return (target_type, course_id if target_type == "course" else lesson_id)
+
+
+def apply_deltas(connection, deltas):
+    """deltas: {(target_type, target_id): {rating: +-n}} — атомарно прибавляет к сводкам."""
+    table = RatingSummary.__table__
+    insert = dialect_insert(connection.dialect.name)
+    for (target_type, target_id), by_rating in deltas.items():
+        by_rating = {r: n for r, n in by_rating.items() if n}
+        if target_id is None or not by_rating:
+            continue
+        values = {
+            "ratings_count": sum(by_rating.values()),
+            "ratings_sum": sum(r * n for r, n in by_rating.items()),
+        }
+        values.update({f"r{r}": n for r, n in by_rating.items()})
+        changes = {name: table.c[name] + value for name, value in values.items()}
+        changes["updated_at"] = func.now()
+        if insert is not None:
+            stmt = insert(table).values(target_type=target_type, target_id=target_id, **values)
+            connection.execute(stmt.on_conflict_do_update(index_elements=["target_type", "target_id"], set_=changes))
+        else:
+            updated = connection.execute(
+                update(table).where(table.c.target_type == target_type, table.c.target_id == target_id)
+                .values(**changes)
+            ).rowcount
+            if not updated:
+                connection.execute(table.insert().values(target_type=target_type, target_id=target_id, **values))
+
+
+def _add(deltas, key, rating, n):
+    if rating not in RATINGS:
+        return
+    by_rating = deltas.setdefault(key, {})
+    by_rating[rating] = by_rating.get(rating, 0) + n
+
+
+def _old_value(target, name):
+    hist = attributes.get_history(target, name)
+    if hist.deleted:
+        return hist.deleted[0]
+    return hist.unchanged[0] if hist.unchanged else None
+
+
+@event.listens_for(Feedback, "after_insert")
+def _feedback_inserted(mapper, connection, target):
+    deltas = {}
+    _add(deltas, _target(target.target_type, target.course_id, target.lesson_id), target.rating, 1)
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(Feedback, "after_delete")
+def _feedback_deleted(mapper, connection, target):
+    deltas = {}
+    _add(deltas, _target(target.target_type, target.course_id, target.lesson_id), target.rating, -1)
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(Feedback, "after_update")
+def _feedback_updated(mapper, connection, target):
+    names = ("target_type", "course_id", "lesson_id", "rating")
+    if not any(attributes.get_history(target, name).deleted for name in names):
+        return
+    deltas = {}
+    old_key = _target(_old_value(target, "target_type"), _old_value(target, "course_id"), _old_value(target, "lesson_id"))
+    _add(deltas, old_key, _old_value(target, "rating"), -1)
+    _add(deltas, _target(target.target_type, target.course_id, target.lesson_id), target.rating, 1)
+    apply_deltas(connection, deltas)
+
+
+# оценки удаляются каскадом в БД вместе с курсом/уроком — сводку убираем сами
+@event.listens_for(Course, "after_delete")
+def _course_deleted(mapper, connection, target):
+    connection.execute(delete(RatingSummary.__table__).where(
+        RatingSummary.target_type == "course", RatingSummary.target_id == target.id))
+
+
+@event.listens_for(Lesson, "after_delete")
+def _lesson_deleted(mapper, connection, target):
+    connection.execute(delete(RatingSummary.__table__).where(
+        RatingSummary.target_type == "lesson", RatingSummary.target_id == target.id))
+
+
+# оценки пользователя тоже уходят каскадом в БД, без after_delete Feedback —
+# вычитаем их из сводок до удаления строки users
+@event.listens_for(User, "before_delete")
+def _user_deleted(mapper, connection, target):
+    rows = connection.execute(
+        select(Feedback.target_type, Feedback.course_id, Feedback.lesson_id, Feedback.rating, func.count())
+        .where(Feedback.user_id == target.id)
+        .group_by(Feedback.target_type, Feedback.course_id, Feedback.lesson_id, Feedback.rating)
+    )
+    deltas = {}
+    for target_type, course_id, lesson_id, rating, n in rows:
+        _add(deltas, _target(target_type, course_id, lesson_id), rating, -n)
+    apply_deltas(connection, deltas)
+
+
+FEEDBACK_UNIQUE = {
+    "course": ("uq_feedback_user_course", "feedback.user_id, feedback.course_id"),
+    "lesson": ("uq_feedback_user_lesson", "feedback.user_id, feedback.lesson_id"),
+}
+
+
+def _is_duplicate_feedback(exc, target_type):
+    """Нарушено ли уникальное ограничение «одна оценка пользователя на объект»."""
+    name, columns = FEEDBACK_UNIQUE[target_type]
+    diag = getattr(exc.orig, "diag", None)  # psycopg2 сообщает имя ограничения
+    if getattr(diag, "constraint_name", None):
+        return diag.constraint_name == name
+    # SQLite: "UNIQUE constraint failed: feedback.user_id, feedback.course_id"
+    message = str(exc.orig)
+    return name in message or columns in message
+
+
+def _own_feedback(user_id, column, target_id):
+    return Feedback.query.filter(Feedback.user_id == user_id, column == target_id).with_for_update().first()
+
+
+def submit_feedback(user_id, target_type, target_id, rating, comment=None):
+    """
+    Ставит или меняет оценку пользователя (одна на объект). Сводка обновляется событиями.
+    Возвращает (feedback, created).
+    """
+    column = Feedback.course_id if target_type == "course" else Feedback.lesson_id
+    feedback = _own_feedback(user_id, column, target_id)
+    created = feedback is None
+    if created:
+        feedback = Feedback(user_id=user_id, target_type=target_type, rating=rating, comment=comment)
+        setattr(feedback, column.key, target_id)
+        try:
+            with db.session.begin_nested():
+                db.session.add(feedback)
+        except IntegrityError as exc:
+            if not _is_duplicate_feedback(exc, target_type):
+                raise
+            # параллельный запрос того же пользователя успел вставить — обновляем его строку;
+            # откатывается только точка сохранения, повтор один
+            feedback = _own_feedback(user_id, column, target_id)
+            if feedback is None:
+                raise
+            created = False
+    if not created:
+        feedback.rating = rating
+        feedback.comment = comment
+    db.session.commit()
+    return feedback, created
+
+
+def summaries_for(target_type, target_ids):
+    """{target_id: RatingSummary} одним запросом (для карточек каталога)."""
+    ids = list(target_ids)
+    if not ids:
+        return {}
+    rows = RatingSummary.query.filter(RatingSummary.target_type == target_type, RatingSummary.target_id.in_(ids))
+    return {row.target_id: row for row in rows}
+
+
+def summary_for(target_type, target_id):
+    return db.session.get(RatingSummary, (target_type, target_id))
+
+
+def recount_ratings():
+    """Пересчитывает rating_summaries с нуля по таблице feedback."""
+    table = RatingSummary.__table__
+    db.session.execute(table.delete())
+    for target_type, column in (("course", Feedback.course_id), ("lesson", Feedback.lesson_id)):
+        buckets = [func.coalesce(func.sum(case((Feedback.rating == r, 1), else_=0)), 0) for r in RATINGS]
+        db.session.execute(
+            table.insert().from_select(
+                ["target_type", "target_id", "ratings_count", "ratings_sum"] + [f"r{r}" for r in RATINGS],
+                select(db.literal(target_type), column, func.count(Feedback.id),
+                       func.coalesce(func.sum(Feedback.rating), 0), *buckets)
+                .where(Feedback.target_type == target_type, column.isnot(None), Feedback.rating.between(1, 5))
+                .group_by(column),
+            )
+        )
+    db.session.commit()
+
+
+@ratings_cli.command("recount")
+def recount_command():
+    """Пересчитать rating_summaries по таблице feedback."""
+    recount_ratings()
+    click.echo("Сводки оценок пересчитаны")
@@ -0,0 +1,223 @@
+# app/roster.py
+# Список студентов курса для преподавателя: ФИО из профиля, статус записи,
+# число пройденных уроков, процент и средний балл — одним SQL-запросом
+# (прогресс агрегируется подзапросом с GROUP BY по user_id).
+# Пагинация keyset: курсор — значения ключа сортировки последней строки,
+# поэтому страница 100 курса на 5000 студентов стоит столько же, сколько первая.
+import base64
+import json
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, case, func, literal, or_, select
+
+from app.extensions import db
+from app.models import Enrollment, Lesson, Profile, Progress, User
+
+# ключ сортировки: (колонка подзапроса, по убыванию?)
+SORTS = {
+    "progress": ("completed", True),
+    "name": ("sort_name", False),
+    "score": ("avg_score_key", True),
+    "enrolled": ("enrolled_key", True),
+}
+# enrolled_at может быть NULL, а NULL в keyset не сравнивается — такие записи идут как самые ранние
+NULL_ENROLLED_AT = datetime(1970, 1, 1)
+DEFAULT_SORT = "progress"
+
+
+@dataclass
+class RosterRow:
+    user_id: int
+    username: str
+    email: str
+    full_name: str
+    status: str
+    enrolled_at: datetime
+    completed: int
+    percent: int
+    avg_score: float
+
+
+@dataclass
+class RosterPage:
+    rows: list
+    total_lessons: int
+    total_students: int
+    next_cursor: str
+    prev_cursor: str
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_json_value(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _int(value):
+    # bool — подкласс int, но в курсоре ему не место
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(value)
+    return value
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(value)
+    return value
+
+
+def _text(value):
+    if not isinstance(value, str):
+        raise ValueError(value)
+    return value
+
+
+# тип значения курсора по колонке сортировки
+CURSOR_TYPES = {
+    "completed": _int,
+    "sort_name": _text,
+    "avg_score_key": _number,
+    "enrolled_key": lambda value: datetime.fromisoformat(_text(value)),
+}
+
+
+def decode_cursor(token, column):
+    """
+    [значение ключа column, user_id] из курсора или None, если курсор испорчен:
+    подделанный токен не должен доходить до SQL с чужими типами.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != 2:
+            return None
+        return [CURSOR_TYPES[column](values[0]), _int(values[1])]
+    except (ValueError, TypeError):
+        return None
+
+
+def full_name_expr():
+    """«Фамилия Имя Отчество» из profiles (пустая строка, если профиля нет)."""
+    return func.trim(
+        func.coalesce(Profile.last_name, "") + literal(" ")
+        + func.coalesce(Profile.first_name, "") + literal(" ")
+        + func.coalesce(Profile.patronymic, "")
+    )
+
+
+def _roster_subquery(course_id):
+    progress = (
+        select(
+            Progress.user_id.label("user_id"),
+            func.sum(case((Progress.status == "completed", 1), else_=0)).label("completed"),
+            # округление: значение попадает в курсор и должно точно сравниваться при следующем запросе
+            func.round(func.avg(Progress.score), 2).label("avg_score"),
+        )
+        .join(Lesson, Lesson.id == Progress.lesson_id)
+        .where(Lesson.course_id == course_id)
+        .group_by(Progress.user_id)
+        .subquery()
+    )
+    full_name = full_name_expr()
+    return (
+        select(
+            User.id.label("user_id"),
+            User.username,
+            User.email,
+            full_name.label("full_name"),
+            # пустое ФИО сортируем по логину
+            func.lower(func.coalesce(func.nullif(full_name, ""), User.username)).label("sort_name"),
+            Enrollment.status,
+            Enrollment.enrolled_at,
+            func.coalesce(Enrollment.enrolled_at, NULL_ENROLLED_AT).label("enrolled_key"),
+            func.coalesce(progress.c.completed, 0).label("completed"),
+            progress.c.avg_score,
+            # NULL в keyset неудобен: без оценок — как -1
+            func.coalesce(progress.c.avg_score, -1).label("avg_score_key"),
+        )
+        .select_from(Enrollment)
+        .join(User, User.id == Enrollment.user_id)
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .outerjoin(progress, progress.c.user_id == User.id)
+        .where(Enrollment.course_id == course_id)
+        .subquery()
+    )
+
+
+def roster_page(course_id, sort=DEFAULT_SORT, after=None, before=None, per_page=50):
+    """
+    Страница списка. after/before — курсоры из предыдущего ответа
+    (next_cursor/prev_cursor); без них — первая страница.
+    """
+    if sort not in SORTS:
+        sort = DEFAULT_SORT
+    column_name, descending = SORTS[sort]
+    roster = _roster_subquery(course_id)
+    key = roster.c[column_name]
+    uid = roster.c.user_id
+
+    cursor = decode_cursor(after or before or "", column_name)
+    backwards = cursor is not None and not after
+    stmt = select(roster)
+
+    if cursor is not None:
+        value, last_uid = cursor
+        # «дальше по списку»: для убывающего ключа — меньше, для возрастающего — больше;
+        # при равенстве — по user_id по возрастанию
+        forward_key = key < value if descending else key > value
+        backward_key = key > value if descending else key < value
+        if backwards:
+            stmt = stmt.where(or_(backward_key, and_(key == value, uid < last_uid)))
+        else:
+            stmt = stmt.where(or_(forward_key, and_(key == value, uid > last_uid)))
+
+    forward_order = [key.desc() if descending else key.asc(), uid.asc()]
+    backward_order = [key.asc() if descending else key.desc(), uid.desc()]
+    stmt = stmt.order_by(*(backward_order if backwards else forward_order)).limit(per_page + 1)
+
+    rows = db.session.execute(stmt).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    total_lessons = db.session.scalar(select(func.count(Lesson.id)).where(Lesson.course_id == course_id))
+    total_students = db.session.scalar(select(func.count(Enrollment.id)).where(Enrollment.course_id == course_id))
+
+    items = [
+        RosterRow(
+            user_id=r.user_id,
+            username=r.username,
+            email=r.email,
+            full_name=r.full_name or r.username,
+            status=r.status,
+            enrolled_at=r.enrolled_at,
+            completed=int(r.completed),
+            percent=int(r.completed * 100 / total_lessons) if total_lessons else 0,
+            avg_score=float(r.avg_score) if r.avg_score is not None else None,
+        )
+        for r in rows
+    ]
+
+    def cursor_of(row):
+        return encode_cursor([getattr(row, column_name), row.user_id])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        # вперёд можно, если после последней строки ещё есть (или мы пришли назад)
+        if (has_more and not backwards) or backwards:
+            next_cursor = cursor_of(rows[-1])
+        if (cursor is not None and not backwards) or (backwards and has_more):
+            prev_cursor = cursor_of(rows[0])
+
+    return RosterPage(items, total_lessons, total_students, next_cursor, prev_cursor)
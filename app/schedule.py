@@ -0,0 +1,235 @@
+# app/schedule.py
+# Расписание преподавателя: импорт старых JSON-файлов, выборка по окну дат
+# и iCalendar-фид (.ics), который пересобирается только при изменении расписания.
+import hashlib
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from app.extensions import db
+from app.models import Course, ScheduleEvent, User
+
+schedule_cli = AppGroup("schedule", help="Расписание преподавателей")
+
+# длительность занятия, если ends_at не задан
+DEFAULT_EVENT_DURATION = timedelta(hours=1)
+
+# допустимое начало окна на странице расписания: дальше timedelta упирается в date.min/date.max
+WINDOW_MIN_START = date(1970, 1, 1)
+WINDOW_MAX_START = date(9000, 1, 1)
+
+# готовые фиды: teacher_id -> (version, etag, body)
+_feed_cache = {}
+_feed_lock = threading.Lock()
+
+
+# ---------- выборка ----------
+def events_in_range(teacher_id, start, end):
+    """События преподавателя с start <= starts_at < end (по индексу teacher_id, starts_at)."""
+    return (
+        ScheduleEvent.query
+        .options(joinedload(ScheduleEvent.course))
+        .filter(ScheduleEvent.teacher_id == teacher_id,
+                ScheduleEvent.starts_at >= start,
+                ScheduleEvent.starts_at < end)
+        .order_by(ScheduleEvent.starts_at)
+        .all()
+    )
+
+
+def schedule_version(teacher_id):
+    """
+    Дешёвая «версия» расписания: количество событий и последний updated_at.
+    Меняется при любом добавлении, правке или удалении.
+    """
+    count, last_update = db.session.query(
+        func.count(ScheduleEvent.id), func.max(ScheduleEvent.updated_at)
+    ).filter(ScheduleEvent.teacher_id == teacher_id).one()
+    return f"{count}:{last_update.isoformat() if last_update else ''}"
+
+
+def schedule_etag(teacher_id, version):
+    return hashlib.sha1(f"{teacher_id}:{version}".encode("utf-8")).hexdigest()
+
+
+# ---------- iCalendar ----------
+def _ics_escape(text):
+    return (text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_dt(value):
+    return value.strftime("%Y%m%dT%H%M%S")
+
+
+def _as_utc(value):
+    # в базе datetime.utcnow() без tzinfo — считаем его UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def build_ics(teacher, events):
+    """Текст календаря (RFC 5545), строки через CRLF."""
+    host = current_app.config.get("SCHEDULE_ICS_UID_DOMAIN", "vkrsite")
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//ML-Study//Schedule//RU",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_ics_escape('Расписание ' + teacher.username)}",
+    ]
+    for ev in events:
+        ends_at = ev.ends_at or ev.starts_at + DEFAULT_EVENT_DURATION
+        stamp = ev.updated_at or ev.created_at or ev.starts_at
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:schedule-{ev.id}@{host}",
+            f"DTSTAMP:{_ics_dt(_as_utc(stamp))}Z",
+            f"DTSTART:{_ics_dt(ev.starts_at)}",
+            f"DTEND:{_ics_dt(ends_at)}",
+            f"SUMMARY:{_ics_escape(ev.title)}",
+        ]
+        if ev.course is not None:
+            lines.append(f"CATEGORIES:{_ics_escape(ev.course.slug)}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+def get_ics_feed(teacher, version):
+    """(etag, body) фида; календарь собирается заново только при смене версии."""
+    cached = _feed_cache.get(teacher.id)
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+
+    events = (
+        ScheduleEvent.query.filter_by(teacher_id=teacher.id)
+        .options(joinedload(ScheduleEvent.course))
+        .order_by(ScheduleEvent.starts_at)
+        .all()
+    )
+    body = build_ics(teacher, events)
+    etag = schedule_etag(teacher.id, version)
+    with _feed_lock:
+        _feed_cache[teacher.id] = (version, etag, body)
+    return etag, body
+
+
+# ---------- токен для подписки (календарные клиенты не логинятся) ----------
+# В токене — id и users.schedule_feed_version: reset_feed_token увеличивает версию,
+# и все выданные ранее ссылки перестают работать.
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="schedule-ics")
+
+
+def make_feed_token(teacher):
+    return _serializer().dumps([teacher.id, teacher.schedule_feed_version or 0])
+
+
+def load_feed_token(token):
+    """Преподаватель по токену или None (подпись неверна, ссылка отозвана, роль снята)."""
+    try:
+        teacher_id, version = _serializer().loads(token)
+        teacher = db.session.get(User, int(teacher_id))
+    except (BadSignature, TypeError, ValueError):
+        return None
+    if teacher is None or not teacher.is_active or not teacher.has_role("teacher"):
+        return None
+    if version != (teacher.schedule_feed_version or 0):
+        return None
+    return teacher
+
+
+def reset_feed_token(teacher):
+    """Отзывает ссылку на фид; возвращает новый токен."""
+    teacher.schedule_feed_version = (teacher.schedule_feed_version or 0) + 1
+    db.session.commit()
+    return make_feed_token(teacher)
+
+
+def clamp_window_start(start):
+    return min(max(start, WINDOW_MIN_START), WINDOW_MAX_START)
+
+
+# ---------- импорт из static/schedules/<username>.json ----------
+def _wall_clock(value):
+    """
+    Время без tzinfo. В JSON время «настенное» (naive), а PostgreSQL возвращает
+    DateTime(timezone=True) с tzinfo — naive и aware datetime никогда не равны,
+    поэтому для сверки дубликатов обе стороны приводим к naive.
+    """
+    return value.replace(tzinfo=None) if value is not None and value.tzinfo is not None else value
+
+
+def _parse_entry(item):
+    date = item.get("date")
+    if not date:
+        return None
+    try:
+        return _wall_clock(datetime.fromisoformat(f"{date}T{item['time']}" if item.get("time") else date))
+    except ValueError:
+        return None
+
+
+def import_schedule_file(teacher, path):
+    """
+    Загружает JSON-файл расписания в schedule_events.
+    Повторный импорт не дублирует события (сверка по starts_at + title,
+    в базе — уникальный ключ uq_schedule_events_teacher_starts_title).
+    Возвращает (добавлено, пропущено).
+    """
+    with open(path, "r", encoding="utf-8") as fh:
+        items = json.load(fh)
+
+    existing = {
+        (_wall_clock(ev.starts_at), ev.title)
+        for ev in ScheduleEvent.query.filter_by(teacher_id=teacher.id).all()
+    }
+    slugs = {item.get("course_slug") for item in items if item.get("course_slug")}
+    courses = {c.slug: c.id for c in Course.query.filter(Course.slug.in_(slugs)).all()} if slugs else {}
+
+    added = skipped = 0
+    for item in items:
+        starts_at = _parse_entry(item)
+        title = (item.get("title") or "").strip()
+        if starts_at is None or not title or (starts_at, title) in existing:
+            skipped += 1
+            continue
+        db.session.add(ScheduleEvent(
+            teacher_id=teacher.id,
+            course_id=courses.get(item.get("course_slug")),
+            title=title,
+            starts_at=starts_at,
+        ))
+        existing.add((starts_at, title))
+        added += 1
+    db.session.commit()
+    return added, skipped
+
+
+@schedule_cli.command("import")
+@click.option("--dir", "directory", default=None, help="Папка с <username>.json (по умолчанию static/schedules).")
+def import_command(directory):
+    """Импортировать JSON-расписания в базу."""
+    directory = directory or os.path.join(current_app.static_folder, "schedules")
+    if not os.path.isdir(directory):
+        click.echo(f"Папка не найдена: {directory}")
+        return
+    for fname in sorted(os.listdir(directory)):
+        if not fname.endswith(".json"):
+            continue
+        username = fname[:-len(".json")]
+        teacher = User.query.filter_by(username=username).first()
+        if teacher is None:
+            click.echo(f"{fname}: пользователь {username} не найден, пропуск")
+            continue
+        added, skipped = import_schedule_file(teacher, os.path.join(directory, fname))
+        click.echo(f"{fname}: добавлено {added}, пропущено {skipped}")
@@ -0,0 +1,164 @@
+# app/sitemap.py
+# sitemap.xml и robots.txt: поисковики получают адреса курсов, уроков и новостей
+# из sitemap, а не обходом постраничных списков (/courses, /news).
+# Строки читаются потоково (yield_per — серверный курсор на PostgreSQL), только id и updated_at.
+# Адреса режутся на файлы по SITEMAP_MAX_URLS (лимит протокола — 50 000), /sitemap.xml —
+# индекс этих файлов. Результат кэшируется в процессе и пересобирается, только когда меняется
+# версия: count/max(updated_at) опубликованных курсов, уроков и новостей и адрес сайта.
+# Адреса строятся от SITE_URL (app/utils.external_url), а не от присланного клиентом Host,
+# поэтому кэш — одна запись на процесс.
+import hashlib
+import threading
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.models import Course, Lesson, News
+from app.news_feed import rfc3339
+from app.utils import external_url, site_base_url
+
+BATCH_SIZE = 1000
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+# страницы без записей в БД — без <lastmod>
+STATIC_ENDPOINTS = (
+    "main.index",
+    "main.about",
+    "main.courses",
+    "main.lessons",
+    "main.news_list",
+    "main.ml_materials",
+    "main.ml_intro",
+    "main.faq",
+    "main.instructors",
+    "main.terms",
+    "main.contacts",
+)
+ROBOTS_DISALLOW = ("/admin/", "/dashboard/", "/files")
+
+_cache = None  # Sitemaps последней собранной версии
+_build_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Sitemaps:
+    version: str
+    etag: str
+    index: bytes
+    parts: tuple  # bytes на каждый файл sitemap-<n>.xml (n с 1)
+
+
+def _published_lessons():
+    return (
+        select(Lesson.id, Lesson.updated_at)
+        .join(Course, Course.id == Lesson.course_id)
+        .where(Lesson.is_published.is_(True), Course.is_published.is_(True))
+    )
+
+
+def _sources():
+    """(endpoint, имя параметра, запрос id/updated_at) по каждому типу страниц."""
+    return (
+        ("main.course_detail", "course_id",
+         select(Course.id, Course.updated_at).where(Course.is_published.is_(True)).order_by(Course.id)),
+        ("main.lesson_detail", "lesson_id", _published_lessons().order_by(Lesson.id)),
+        ("main.news_detail", "news_id",
+         select(News.id, News.updated_at).where(News.is_published.is_(True)).order_by(News.id)),
+    )
+
+
+def sitemap_version():
+    """Версия sitemap: count и max(updated_at) опубликованных курсов, уроков и новостей — один запрос."""
+    lessons = _published_lessons().subquery()
+    row = db.session.execute(select(
+        select(func.count(Course.id)).where(Course.is_published.is_(True)).scalar_subquery(),
+        select(func.max(Course.updated_at)).where(Course.is_published.is_(True)).scalar_subquery(),
+        select(func.count(lessons.c.id)).scalar_subquery(),
+        select(func.max(lessons.c.updated_at)).scalar_subquery(),
+        select(func.count(News.id)).where(News.is_published.is_(True)).scalar_subquery(),
+        select(func.max(News.updated_at)).where(News.is_published.is_(True)).scalar_subquery(),
+    )).one()
+    return "|".join("" if value is None else str(value) for value in row)
+
+
+def iter_urls():
+    """Потоково: (абсолютный адрес, updated_at или None) для всех страниц sitemap."""
+    for endpoint in STATIC_ENDPOINTS:
+        yield external_url(endpoint), None
+    for endpoint, param, stmt in _sources():
+        for row_id, updated_at in db.session.execute(stmt.execution_options(yield_per=BATCH_SIZE)):
+            yield external_url(endpoint, **{param: row_id}), updated_at
+
+
+def _url_entry(loc, lastmod):
+    if lastmod is None:
+        return f"<url><loc>{escape(loc)}</loc></url>"
+    return f"<url><loc>{escape(loc)}</loc><lastmod>{rfc3339(lastmod)}</lastmod></url>"
+
+
+def _urlset(entries):
+    return "\n".join([
+        '<?xml version="1.0" encoding="utf-8"?>',
+        f'<urlset xmlns="{SITEMAP_NS}">',
+        *entries,
+        "</urlset>",
+    ]).encode("utf-8")
+
+
+def _newest(current, value):
+    if value is None:
+        return current
+    return value if current is None or value > current else current
+
+
+def build_sitemaps(version, max_urls):
+    """Один проход по iter_urls: файлы по max_urls адресов и индекс со ссылками на них."""
+    parts, lastmods = [], []
+    entries, newest = [], None
+    for loc, lastmod in iter_urls():
+        if len(entries) >= max_urls:
+            parts.append(_urlset(entries))
+            lastmods.append(newest)
+            entries, newest = [], None
+        entries.append(_url_entry(loc, lastmod))
+        newest = _newest(newest, lastmod)
+    parts.append(_urlset(entries))
+    lastmods.append(newest)
+
+    index = ['<?xml version="1.0" encoding="utf-8"?>', f'<sitemapindex xmlns="{SITEMAP_NS}">']
+    for number, lastmod in enumerate(lastmods, start=1):
+        loc = escape(external_url("main.sitemap_part", number=number))
+        index.append(
+            f"<sitemap><loc>{loc}</loc><lastmod>{rfc3339(lastmod)}</lastmod></sitemap>"
+            if lastmod is not None else f"<sitemap><loc>{loc}</loc></sitemap>"
+        )
+    index.append("</sitemapindex>")
+
+    etag = hashlib.sha1(f"sitemap:{max_urls}:{version}".encode("utf-8")).hexdigest()
+    return Sitemaps(version, etag, "\n".join(index).encode("utf-8"), tuple(parts))
+
+
+def get_sitemaps():
+    """Sitemap из кэша процесса; пересборка — только при смене версии и одним потоком."""
+    global _cache
+    version = f"{sitemap_version()}:{site_base_url()}"
+    hit = _cache
+    if hit is not None and hit.version == version:
+        return hit
+    with _build_lock:
+        # пока ждали блокировку, другой поток мог уже собрать эту версию
+        hit = _cache
+        if hit is not None and hit.version == version:
+            return hit
+        _cache = build_sitemaps(version, current_app.config["SITEMAP_MAX_URLS"])
+    return _cache
+
+
+def build_robots():
+    lines = ["User-agent: *"]
+    lines += [f"Disallow: {path}" for path in ROBOTS_DISALLOW]
+    lines += ["", f"Sitemap: {external_url('main.sitemap_index')}", ""]
+    return "\n".join(lines)
@@ -0,0 +1,283 @@
+# app/storage.py
+# Хранилище загруженных и сгенерированных файлов. File.path — ключ в хранилище.
+#   local — папка UPLOAD_FOLDER (один сервер или общий диск)
+#   s3    — S3-совместимый бакет (AWS, MinIO, ...), нужен пакет boto3
+# Скачивание из S3 отдаётся редиректом на presigned URL, чтобы байты шли мимо воркеров.
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote
+
+import click
+from flask import Response, abort, current_app, redirect, send_from_directory, stream_with_context
+from flask.cli import AppGroup
+
+CHUNK_SIZE = 64 * 1024
+
+storage_cli = AppGroup("storage", help="Хранилище файлов")
+
+
+def content_disposition(download_name):
+    # RFC 6266: ASCII-фолбэк + имя в UTF-8 (кириллица в названиях курсов)
+    ascii_name = download_name.encode("ascii", "ignore").decode() or "download"
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(download_name)}"
+
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root):
+        self.root = root
+
+    def _full_path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Недопустимый ключ: {key}")
+        return path
+
+    def _existing_path(self, key):
+        # для чтения недопустимый ключ (абсолютный или старый путь в File.path) — просто нет файла
+        try:
+            return self._full_path(key)
+        except ValueError:
+            raise FileNotFoundError(key) from None
+
+    def save(self, key, fileobj, content_type=None):
+        """Потоково пишет fileobj под ключом key, возвращает размер в байтах."""
+        path = self._full_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.part"
+        with open(tmp_path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, CHUNK_SIZE)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    def save_bytes(self, key, data, content_type=None):
+        path = self._full_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            out.write(data)
+        return len(data)
+
+    def open(self, key):
+        return open(self._existing_path(key), "rb")
+
+    def exists(self, key):
+        try:
+            return os.path.isfile(self._existing_path(key))
+        except FileNotFoundError:
+            return False
+
+    def size(self, key):
+        return os.path.getsize(self._existing_path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._existing_path(key))
+        except FileNotFoundError:
+            pass
+
+    def iter_keys(self, _prefix=""):
+        """
+        (ключ, размер, mtime) всех объектов в порядке возрастания ключа — как
+        list_objects_v2 в S3. Подкаталог сортируется как "имя/", поэтому порядок
+        совпадает с сортировкой полных ключей.
+        """
+        try:
+            entries = list(os.scandir(os.path.join(self.root, _prefix)))
+        except FileNotFoundError:
+            return
+        entries.sort(key=lambda e: e.name + "/" if e.is_dir() else e.name)
+        for entry in entries:
+            if entry.is_dir():
+                yield from self.iter_keys(f"{_prefix}{entry.name}/")
+            elif not entry.name.endswith(".part"):
+                st = entry.stat()
+                yield f"{_prefix}{entry.name}", st.st_size, st.st_mtime
+
+    def download_response(self, key, download_name, mimetype=None):
+        # send_from_directory не выпустит за пределы root и поддерживает Range/conditional
+        if not self.exists(key):
+            abort(404)
+        return send_from_directory(self.root, key, as_attachment=True,
+                                   download_name=download_name, mimetype=mimetype)
+
+
+class S3Storage:
+    name = "s3"
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, presign_ttl=300, client=None):
+        if client is None:
+            try:
+                import boto3
+                from botocore.config import Config as BotoConfig
+            except ImportError as exc:
+                raise RuntimeError("Для STORAGE_BACKEND=s3 нужен пакет boto3 (pip install boto3)") from exc
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url or None,
+                region_name=region or None,
+                aws_access_key_id=access_key or None,
+                aws_secret_access_key=secret_key or None,
+                config=BotoConfig(signature_version="s3v4", max_pool_connections=32),
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.presign_ttl = presign_ttl
+
+    def _object_key(self, key):
+        return self.prefix + key
+
+    def save(self, key, fileobj, content_type=None):
+        # upload_fileobj читает кусками и сам переходит на multipart для больших файлов
+        extra = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(fileobj, self.bucket, self._object_key(key), ExtraArgs=extra)
+        return self.size(key)
+
+    def save_bytes(self, key, data, content_type=None):
+        kwargs = {"ContentType": content_type} if content_type else {}
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data, **kwargs)
+        return len(data)
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))["Body"]
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head["ContentLength"]
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def iter_keys(self):
+        """(ключ, размер, mtime); S3 отдаёт ключи уже отсортированными."""
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):], obj["Size"], obj["LastModified"].timestamp()
+
+    def presigned_url(self, key, download_name, mimetype=None):
+        params = {
+            "Bucket": self.bucket,
+            "Key": self._object_key(key),
+            "ResponseContentDisposition": content_disposition(download_name),
+        }
+        if mimetype:
+            params["ResponseContentType"] = mimetype
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=self.presign_ttl)
+
+    def download_response(self, key, download_name, mimetype=None):
+        if self.presign_ttl:
+            return redirect(self.presigned_url(key, download_name, mimetype))
+        # presign выключен (бакет недоступен клиентам напрямую) — проксируем потоком
+        if not self.exists(key):
+            abort(404)
+        body = self.open(key)
+        response = Response(stream_with_context(body.iter_chunks(CHUNK_SIZE)),
+                            mimetype=mimetype or "application/octet-stream")
+        response.headers["Content-Disposition"] = content_disposition(download_name)
+        return response
+
+
+def build_storage(config, backend=None):
+    backend = backend or config["STORAGE_BACKEND"]
+    if backend == "s3":
+        return S3Storage(
+            bucket=config["S3_BUCKET"],
+            prefix=config["S3_PREFIX"],
+            endpoint_url=config["S3_ENDPOINT_URL"],
+            region=config["S3_REGION"],
+            access_key=config["S3_ACCESS_KEY_ID"],
+            secret_key=config["S3_SECRET_ACCESS_KEY"],
+            presign_ttl=config["STORAGE_PRESIGN_TTL"],
+        )
+    if backend == "local":
+        return LocalStorage(config["UPLOAD_FOLDER"])
+    raise ValueError(f"Неизвестный STORAGE_BACKEND: {backend}")
+
+
+def init_storage(app):
+    if app.config["STORAGE_BACKEND"] == "local":
+        os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    # клиент boto3 создаётся лениво, при первом обращении
+    app.extensions["storage"] = None
+
+
+def get_storage():
+    storage = current_app.extensions.get("storage")
+    if storage is None:
+        storage = build_storage(current_app.config)
+        current_app.extensions["storage"] = storage
+    return storage
+
+
+def copy_object(source, target, key, content_type=None, overwrite=False):
+    """Копирует один объект; возвращает 'copied' или 'skipped' (уже есть с тем же размером)."""
+    if not overwrite and target.exists(key) and target.size(key) == source.size(key):
+        return "skipped"
+    fh = source.open(key)
+    try:
+        target.save(key, fh, content_type)
+    finally:
+        fh.close()
+    return "copied"
+
+
+@storage_cli.command("migrate")
+@click.option("--source", "source_name", default="local", show_default=True, type=click.Choice(["local", "s3"]))
+@click.option("--target", "target_name", default="s3", show_default=True, type=click.Choice(["local", "s3"]))
+@click.option("--workers", default=8, show_default=True, help="Параллельных копирований.")
+@click.option("--overwrite", is_flag=True, help="Копировать даже если объект уже есть в целевом хранилище.")
+@click.option("--delete-source", is_flag=True, help="Удалять исходный объект после успешной копии.")
+def migrate_command(source_name, target_name, workers, overwrite, delete_source):
+    """Перенести blobs всех File.path из одного хранилища в другое."""
+    from app.models import File
+
+    if source_name == target_name:
+        raise click.UsageError("--source и --target совпадают")
+    source = build_storage(current_app.config, source_name)
+    target = build_storage(current_app.config, target_name)
+
+    files = [(f.path, f.content_type) for f in File.query.with_entities(File.path, File.content_type)]
+    counts = {"copied": 0, "skipped": 0, "missing": 0, "failed": 0}
+
+    def job(key, content_type):
+        if not source.exists(key):
+            return "missing"
+        result = copy_object(source, target, key, content_type, overwrite)
+        if delete_source:
+            source.delete(key)
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(job, key, ct): key for key, ct in files}
+        for future in as_completed(futures):
+            try:
+                counts[future.result()] += 1
+            except Exception as exc:
+                counts["failed"] += 1
+                click.echo(f"Ошибка {futures[future]}: {exc}", err=True)
+
+    click.echo(
+        f"Файлов: {len(files)}, скопировано: {counts['copied']}, уже были: {counts['skipped']}, "
+        f"нет в источнике: {counts['missing']}, ошибок: {counts['failed']}"
+    )
+    if counts["failed"]:
+        raise SystemExit(1)
@@ -0,0 +1,199 @@
+# app/storage_quota.py
+# Учёт занятого места по пользователям и курсам и квота на загрузку.
+# Счётчики storage_usage меняются событиями маппера File в той же транзакции,
+# что и INSERT/UPDATE/DELETE файла, — атомарным upsert (bytes_used = bytes_used + delta),
+# поэтому параллельные загрузки не теряют обновления.
+# Массовое удаление через Query.delete() события не вызывает — см. release_usage().
+# Сертификаты (files.kind = 'certificate') и архивы выгрузок ('export') создаёт система,
+# а не загружает пользователь: они учитываются в счётчике курса, но не в счётчике
+# (и квоте) владельца.
+from functools import wraps
+
+from flask import abort, current_app, request
+from flask_login import current_user
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import attributes
+
+from app.extensions import db
+from app.models import File, StorageUsage
+
+# виды файлов, которые не входят в счётчик владельца
+USER_EXEMPT_KINDS = ("certificate", "export")
+
+# запас на multipart-обёртку: Content-Length чуть больше самого файла
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+def dialect_insert(dialect_name):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def apply_deltas(connection, deltas):
+    """deltas: {(scope, owner_id): (delta_bytes, delta_files)} — атомарно прибавляет к счётчикам."""
+    table = StorageUsage.__table__
+    insert = dialect_insert(connection.dialect.name)
+    for (scope, owner_id), (d_bytes, d_files) in deltas.items():
+        if owner_id is None or (not d_bytes and not d_files):
+            continue
+        changes = {
+            "bytes_used": table.c.bytes_used + d_bytes,
+            "files_count": table.c.files_count + d_files,
+            "updated_at": func.now(),
+        }
+        if insert is not None:
+            stmt = insert(table).values(scope=scope, owner_id=owner_id, bytes_used=d_bytes, files_count=d_files)
+            connection.execute(stmt.on_conflict_do_update(index_elements=["scope", "owner_id"], set_=changes))
+        else:
+            updated = connection.execute(
+                update(table).where(table.c.scope == scope, table.c.owner_id == owner_id).values(**changes)
+            ).rowcount
+            if not updated:
+                connection.execute(table.insert().values(
+                    scope=scope, owner_id=owner_id, bytes_used=d_bytes, files_count=d_files))
+
+
+def _add(deltas, owner_user_id, course_id, size, count, kind=None):
+    if kind in USER_EXEMPT_KINDS:
+        owner_user_id = None
+    for scope, owner_id in (("user", owner_user_id), ("course", course_id)):
+        if owner_id is None:
+            continue
+        d_bytes, d_files = deltas.get((scope, owner_id), (0, 0))
+        deltas[(scope, owner_id)] = (d_bytes + size, d_files + count)
+
+
+def _old_value(target, name):
+    hist = attributes.get_history(target, name)
+    if hist.deleted:
+        return hist.deleted[0]
+    return hist.unchanged[0] if hist.unchanged else None
+
+
+@event.listens_for(File, "after_insert")
+def _file_inserted(mapper, connection, target):
+    deltas = {}
+    _add(deltas, target.owner_user_id, target.course_id, target.size_bytes or 0, 1, target.kind)
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(File, "after_delete")
+def _file_deleted(mapper, connection, target):
+    deltas = {}
+    _add(deltas, target.owner_user_id, target.course_id, -(target.size_bytes or 0), -1, target.kind)
+    apply_deltas(connection, deltas)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+# after_update нужно старое значение, даже если атрибут истёк после commit
+# (иначе история пустая и перенос учёта теряется) — active_history загружает его при записи
+for _attribute in (File.owner_user_id, File.course_id, File.size_bytes, File.kind):
+    event.listen(_attribute, "set", _load_old_value, active_history=True)
+
+
+@event.listens_for(File, "after_update")
+def _file_updated(mapper, connection, target):
+    # перевыпуск сертификата меняет размер, смена владельца/курса переносит учёт
+    names = ("owner_user_id", "course_id", "size_bytes", "kind")
+    if not any(attributes.get_history(target, name).deleted for name in names):
+        return
+    deltas = {}
+    _add(deltas, _old_value(target, "owner_user_id"), _old_value(target, "course_id"),
+         -(_old_value(target, "size_bytes") or 0), -1, _old_value(target, "kind"))
+    _add(deltas, target.owner_user_id, target.course_id, target.size_bytes or 0, 1, target.kind)
+    apply_deltas(connection, deltas)
+
+
+def release_usage(file_ids):
+    """Вычитает из счётчиков файлы, которые будут удалены массовым DELETE (в текущей транзакции)."""
+    rows = db.session.execute(
+        select(File.owner_user_id, File.course_id, File.kind,
+               func.coalesce(func.sum(File.size_bytes), 0), func.count(File.id))
+        .where(File.id.in_(file_ids))
+        .group_by(File.owner_user_id, File.course_id, File.kind)
+    )
+    deltas = {}
+    for owner_user_id, course_id, kind, size, count in rows:
+        _add(deltas, owner_user_id, course_id, -int(size), -count, kind)
+    apply_deltas(db.session.connection(), deltas)
+
+
+def recount_usage():
+    """Пересчитывает storage_usage с нуля по таблице files (первичное заполнение, дрейф)."""
+    table = StorageUsage.__table__
+    db.session.execute(table.delete())
+    for scope, column, condition in (
+        ("user", File.owner_user_id, File.kind.notin_(USER_EXEMPT_KINDS)),
+        ("course", File.course_id, db.true()),
+    ):
+        db.session.execute(
+            table.insert().from_select(
+                ["scope", "owner_id", "bytes_used", "files_count"],
+                select(db.literal(scope), column, func.coalesce(func.sum(File.size_bytes), 0), func.count(File.id))
+                .where(column.isnot(None), condition)
+                .group_by(column),
+            )
+        )
+    db.session.commit()
+
+
+def usage_for(scope, owner_id):
+    row = db.session.get(StorageUsage, (scope, owner_id))
+    return (row.bytes_used, row.files_count) if row else (0, 0)
+
+
+def user_quota(user):
+    """Квота пользователя в байтах или None (без ограничения)."""
+    limit = current_app.config["STORAGE_QUOTA_USER_BYTES"]
+    if not limit:
+        return None
+    if any(user.has_role(role) for role in current_app.config["STORAGE_QUOTA_EXEMPT_ROLES"]):
+        return None
+    return limit
+
+
+def _quota_exceeded(used, limit):
+    abort(413, f"Превышена квота хранилища: занято {used // 1024} КБ из {limit // 1024} КБ")
+
+
+def upload_quota_required(f):
+    """
+    Декоратор для POST-загрузок: отклоняет запрос по заголовку Content-Length
+    до чтения тела (и до разбора формы), если файл не помещается в остаток квоты.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method == "POST":
+            limit = user_quota(current_user)
+            if limit is not None:
+                length = request.content_length
+                if length is None:
+                    abort(411)
+                used, _ = usage_for("user", current_user.id)
+                if length - MULTIPART_OVERHEAD > limit - used:
+                    _quota_exceeded(used, limit)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def check_quota_after_flush(user):
+    """
+    Точная проверка после flush нового File: счётчик уже увеличен в этой транзакции,
+    а параллельная загрузка того же пользователя ждёт блокировку строки storage_usage.
+    Возвращает (ok, used, limit).
+    """
+    limit = user_quota(user)
+    if limit is None:
+        return True, None, None
+    used = db.session.execute(
+        select(StorageUsage.bytes_used).where(StorageUsage.scope == "user", StorageUsage.owner_id == user.id)
+    ).scalar() or 0
+    return used <= limit, used, limit
@@ -1,10 +1,10 @@
 from functools import wraps
-from flask import abort
+from flask import abort, current_app, request
 from flask_login import current_user
 from flask import url_for
-import os
 from uuid import uuid4
 from werkzeug.utils import secure_filename
+from app.storage import get_storage
 
 
 def roles_required(*roles):
@@ -50,16 +50,24 @@ def make_breadcrumbs(*items):
         out.append({"label": label, "url": url})
     return out
 
+def site_base_url():
+    """Адрес сайта без «/» на конце: SITE_URL из конфига или хост текущего запроса."""
+    return (current_app.config.get("SITE_URL") or request.host_url).rstrip("/")
+
+def external_url(endpoint, **values):
+    """Абсолютная ссылка от site_base_url() (а не от присланного клиентом Host)."""
+    return site_base_url() + url_for(endpoint, **values)
+
 def allowed_file(filename, allowed_set):
     if "." not in filename:
         return False
     ext = filename.rsplit(".", 1)[1].lower()
     return ext in allowed_set
 
-def save_uploaded_file(storage_file, upload_dir, allowed_exts):
+def save_uploaded_file(storage_file, allowed_exts):
     """
     storage_file: werkzeug FileStorage
-    upload_dir: папка куда сохранять (полный путь)
+    Файл потоково пишется в хранилище (app/storage.py) под уникальным ключом.
     Возвращает: (stored_filename, original_filename, size_bytes, content_type)
     """
     original_name = storage_file.filename
@@ -69,10 +77,8 @@ def save_uploaded_file(storage_file, upload_dir, allowed_exts):
     orig_secure = secure_filename(original_name)
     ext = orig_secure.rsplit(".", 1)[1].lower()
     unique_name = f"{uuid4().hex}.{ext}"
-    dest_path = os.path.join(upload_dir, unique_name)
-    storage_file.save(dest_path)
-    size = os.path.getsize(dest_path)
     content_type = storage_file.mimetype or None
+    size = get_storage().save(unique_name, storage_file.stream, content_type)
     return unique_name, orig_secure, size, content_type
 
 def make_breadcrumbs(*items):
@@ -87,3 +93,47 @@ def make_breadcrumbs(*items):
             url = url_for(endpoint, **(ep_kwargs or {}))
         out.append({"label": label, "url": url})
     return out
+
+
+class ListPagination:
+    """
+    Пагинация по готовому списку с тем же интерфейсом, что у Flask-SQLAlchemy
+    (items, page, pages, has_prev/has_next, iter_pages) — подходит для pagination.html.
+    """
+
+    def __init__(self, items, page, per_page):
+        self.total = len(items)
+        self.per_page = per_page
+        self.pages = max(1, (self.total + per_page - 1) // per_page)
+        self.page = min(max(page, 1), self.pages)
+        start = (self.page - 1) * per_page
+        self.items = items[start:start + per_page]
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (
+                num <= left_edge
+                or self.page - left_current <= num <= self.page + right_current
+                or num > self.pages - right_edge
+            ):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
@@ -0,0 +1,171 @@
+# app/view_tracking.py
+# Учёт просмотров уроков: Progress.last_viewed_at и переход not_started -> in_progress.
+# Запрос не пишет в БД: просмотр попадает в буфер процесса, повторные просмотры
+# той же пары (user, lesson) схлопываются в один (остаётся последнее время).
+# Буфер сбрасывается одним пакетным upsert:
+#   - фоновым потоком раз в VIEW_FLUSH_INTERVAL секунд;
+#   - сразу, если в буфере VIEW_FLUSH_MAX пар;
+#   - при остановке воркера (gunicorn worker_exit и atexit).
+# Между воркерами upsert безопасен: ON CONFLICT по uq_progress_user_lesson,
+# last_viewed_at только растёт, статус меняется только из not_started.
+import atexit
+import os
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, literal, select, update
+
+from app.extensions import db
+from app.models import Lesson, Progress, User
+from app.storage_quota import dialect_insert
+
+BATCH_SIZE = 500
+# при недоступной БД держим в памяти не больше VIEW_FLUSH_MAX * RETAIN_FACTOR пар
+RETAIN_FACTOR = 10
+
+
+def _newer(views, key, when):
+    previous = views.get(key)
+    if previous is None or when > previous:
+        views[key] = when
+
+
+def write_views(views):
+    """
+    views: {(user_id, lesson_id): datetime}. Одна транзакция; пары с удалёнными
+    пользователями/уроками отбрасываются. Возвращает число записанных пар.
+    """
+    t = Progress.__table__
+    with db.engine.begin() as conn:
+        lesson_ids = set(conn.scalars(select(Lesson.id).where(Lesson.id.in_({l for _, l in views}))))
+        user_ids = set(conn.scalars(select(User.id).where(User.id.in_({u for u, _ in views}))))
+        # одинаковый порядок строк во всех воркерах — без взаимных блокировок
+        rows = [
+            {"user_id": user_id, "lesson_id": lesson_id, "status": "in_progress",
+             "last_viewed_at": when, "created_at": when, "updated_at": when}
+            for (user_id, lesson_id), when in sorted(views.items())
+            if user_id in user_ids and lesson_id in lesson_ids
+        ]
+        if not rows:
+            return 0
+
+        not_started = t.c.status == "not_started"
+        insert = dialect_insert(conn.dialect.name)
+        for i in range(0, len(rows), BATCH_SIZE):
+            chunk = rows[i:i + BATCH_SIZE]
+            if insert is not None:
+                stmt = insert(t).values(chunk)
+                viewed = stmt.excluded.last_viewed_at
+                conn.execute(stmt.on_conflict_do_update(
+                    index_elements=["user_id", "lesson_id"],
+                    set_={
+                        "last_viewed_at": case(
+                            (t.c.last_viewed_at.is_(None), viewed),
+                            (t.c.last_viewed_at < viewed, viewed),
+                            else_=t.c.last_viewed_at,
+                        ),
+                        "status": case((not_started, literal("in_progress", t.c.status.type)), else_=t.c.status),
+                        # updated_at — только при смене статуса: версия журнала курса
+                        # (gradebook_version) не должна сбрасываться от каждого просмотра
+                        "updated_at": case((not_started, stmt.excluded.updated_at), else_=t.c.updated_at),
+                    },
+                ))
+            else:
+                for row in chunk:
+                    where = (t.c.user_id == row["user_id"], t.c.lesson_id == row["lesson_id"])
+                    # updated_at=updated_at — иначе сработает onupdate колонки
+                    conn.execute(update(t).where(*where, t.c.last_viewed_at.is_(None) | (t.c.last_viewed_at < row["last_viewed_at"]))
+                                 .values(last_viewed_at=row["last_viewed_at"], updated_at=t.c.updated_at))
+                    updated = conn.execute(update(t).where(*where, not_started)
+                                           .values(status="in_progress", updated_at=row["updated_at"])).rowcount
+                    exists = updated or conn.execute(select(t.c.id).where(*where)).first()
+                    if not exists:
+                        conn.execute(t.insert().values(**row))
+        return len(rows)
+
+
+class ViewBuffer:
+    """Буфер просмотров процесса. Поток сброса запускается при первом просмотре в процессе (после fork)."""
+
+    def __init__(self, app, interval, max_size):
+        self.app = app
+        self.interval = interval
+        self.max_size = max_size
+        self._views = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = None
+
+    def record(self, user_id, lesson_id, when=None):
+        when = when or datetime.utcnow()
+        self._ensure_thread()
+        with self._lock:
+            _newer(self._views, (user_id, lesson_id), when)
+            full = len(self._views) >= self.max_size
+        if full or self.interval <= 0:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._views)
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # копия буфера, унаследованная от мастера, — не наша: её сбросит сам мастер
+            self._views = {}
+            self._pid = pid
+            if self.interval > 0:
+                threading.Thread(target=self._run, name="view-tracking", daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Записывает накопленное; при ошибке возвращает просмотры в буфер. Возвращает число пар."""
+        with self._flush_lock:
+            with self._lock:
+                views, self._views = self._views, {}
+            if not views:
+                return 0
+            try:
+                with self.app.app_context():
+                    return write_views(views)
+            except Exception:
+                self.app.logger.exception("View tracking: flush of %d views failed", len(views))
+                with self._lock:
+                    if len(self._views) + len(views) <= self.max_size * RETAIN_FACTOR:
+                        for key, when in views.items():
+                            _newer(self._views, key, when)
+                return 0
+
+    def close(self):
+        self._stop.set()
+        return self.flush()
+
+
+def init_view_tracking(app):
+    buffer = None
+    if app.config["VIEW_TRACKING_ENABLED"]:
+        buffer = ViewBuffer(app, app.config["VIEW_FLUSH_INTERVAL"], app.config["VIEW_FLUSH_MAX"])
+        atexit.register(buffer.close)
+    app.extensions["view_buffer"] = buffer
+
+
+def record_view(user_id, lesson_id):
+    buffer = current_app.extensions.get("view_buffer")
+    if buffer is not None:
+        buffer.record(user_id, lesson_id)
+
+
+def flush_views(app):
+    """Сброс буфера процесса (остановка воркера)."""
+    buffer = app.extensions.get("view_buffer")
+    return buffer.close() if buffer is not None else 0
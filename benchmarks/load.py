@@ -0,0 +1,163 @@
+# benchmarks/load.py
+# Нагрузочное сравнение режимов gunicorn на одной и той же засеянной базе.
+#
+#   SQLALCHEMY_DATABASE_URI=postgresql+psycopg2://... python benchmarks/load.py --seed
+#
+# Для каждого режима запускается `gunicorn -c gunicorn.conf.py wsgi:app` с нужными
+# переменными окружения, затем --clients потоков гоняют смесь страниц --seconds секунд.
+# Печатаются req/s, p50/p95 задержки и число ошибок.
+import argparse
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    # как было: 2 sync-воркера без preload
+    "sync-2": {"GUNICORN_WORKER_CLASS": "sync", "GUNICORN_WORKERS": "2", "GUNICORN_PRELOAD": "false"},
+    # gthread, число воркеров по ядрам
+    "gthread": {"GUNICORN_WORKER_CLASS": "gthread", "GUNICORN_THREADS": "4", "GUNICORN_PRELOAD": "false"},
+    # то же + preload_app
+    "gthread-preload": {"GUNICORN_WORKER_CLASS": "gthread", "GUNICORN_THREADS": "4", "GUNICORN_PRELOAD": "true"},
+}
+
+PATHS = [
+    "/courses",
+    "/courses?page=2",
+    "/news",
+    "/news/atom.xml",
+    "/static/datasets/iris.csv",
+    "/health",
+]
+
+
+def seed(courses=60, lessons=8, news=40):
+    """Засевает базу тестовыми курсами/уроками/новостями (один раз, по маркеру slug)."""
+    from datetime import datetime, timedelta
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Course, Lesson, News
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if Course.query.filter(Course.slug.like("bench-%")).first():
+            print("seed: already seeded")
+            return
+        now = datetime.utcnow()
+        for i in range(courses):
+            course = Course(title=f"Bench course {i}", slug=f"bench-{i}",
+                            description="Описание курса. " * 40, is_published=True)
+            course.lessons = [
+                Lesson(title=f"Lesson {j}", order_index=j, content="Текст урока. " * 200, is_published=True)
+                for j in range(1, lessons + 1)
+            ]
+            db.session.add(course)
+        for i in range(news):
+            db.session.add(News(title=f"Bench news {i}", slug=f"bench-news-{i}", body="<p>Новость</p>" * 50,
+                                is_published=True, published_at=now - timedelta(hours=i)))
+        db.session.commit()
+        print(f"seed: {courses} courses, {courses * lessons} lessons, {news} news")
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def hammer(port, clients, seconds):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(n):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local, local_errors, i = [], 0, n
+        while time.perf_counter() < deadline:
+            path = PATHS[i % len(PATHS)]
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status >= 500:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+
+    return len(latencies) / elapsed, pct(0.5), pct(0.95), errors[0]
+
+
+def run_mode(name, env_overrides, port, clients, seconds):
+    env = dict(os.environ, PORT=str(port), **env_overrides)
+    proc = subprocess.Popen(
+        ["gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"), "wsgi:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_ready(port):
+            print(f"{name:<18} gunicorn did not start")
+            return
+        hammer(port, clients, 1)  # прогрев
+        rate, p50, p95, errors = hammer(port, clients, seconds)
+        print(f"{name:<18}{rate:>10.1f}{p50:>10.1f}{p95:>10.1f}{errors:>8}")
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", action="store_true", help="засеять базу перед прогоном")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    if args.seed:
+        seed()
+
+    print(f"clients={args.clients} seconds={args.seconds}")
+    print(f"{'mode':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for name in args.modes.split(","):
+        run_mode(name, MODES[name], args.port, args.clients, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
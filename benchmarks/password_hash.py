@@ -0,0 +1,91 @@
+# benchmarks/password_hash.py
+# Пропускная способность проверки пароля в зависимости от стоимости хэша.
+#
+#   python benchmarks/password_hash.py [--clients 8] [--seconds 3] [--concurrency 2]
+#
+# Для каждого метода: сколько логинов в секунду выдерживает один процесс при
+# --clients параллельных входах и лимите --concurrency (PASSWORD_VERIFY_CONCURRENCY),
+# плюс p50/p95 задержки одного входа.
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask  # noqa: E402
+from werkzeug.exceptions import HTTPException  # noqa: E402
+
+from app.passwords import verify_password  # noqa: E402
+
+METHODS = [
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+    "scrypt:65536:8:1",
+    "pbkdf2:sha256:100000",
+    "pbkdf2:sha256:600000",
+]
+
+
+def run(method, clients, seconds, concurrency):
+    app = Flask(__name__)
+    app.config.update(
+        PASSWORD_HASH_METHOD=method,
+        PASSWORD_SALT_LENGTH=16,
+        PASSWORD_VERIFY_CONCURRENCY=concurrency,
+        PASSWORD_VERIFY_TIMEOUT=30,
+    )
+    with app.app_context():
+        from app.passwords import make_password_hash
+        pwhash = make_password_hash("secret123")
+
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        user = SimpleNamespace(password_hash=pwhash)
+        local = []
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    verify_password(user, "secret123")
+                except HTTPException:
+                    pass
+                local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    return len(latencies) / elapsed, statistics.median(latencies) if latencies else 0, p95
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"clients={args.clients} concurrency={args.concurrency} seconds={args.seconds}")
+    print(f"{'method':<24}{'logins/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for method in METHODS:
+        rate, p50, p95 = run(method, args.clients, args.seconds, args.concurrency)
+        print(f"{method:<24}{rate:>10.1f}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
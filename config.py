@@ -5,6 +5,10 @@ import os
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-insecure")
 
+    # Канонический адрес сайта для абсолютных ссылок в RSS/Atom и sitemap (https://example.org).
+    # Пусто — берётся хост запроса (заголовок Host), кэш лент тогда держит только последний хост.
+    SITE_URL = os.getenv("SITE_URL", "")
+
     # Подключение к PostgreSQL
     DB_USER = os.getenv("POSTGRES_USER", "postgres")
     DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
@@ -12,8 +16,9 @@ class Config:
     DB_PORT = os.getenv("POSTGRES_PORT", "5432")
     DB_NAME = os.getenv("POSTGRES_DB", "vkrsite")
 
-    SQLALCHEMY_DATABASE_URI = (
-        f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    SQLALCHEMY_DATABASE_URI = os.getenv(
+        "SQLALCHEMY_DATABASE_URI",
+        f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
     )
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -22,8 +27,108 @@ class Config:
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 
+    # Хранилище файлов: "local" (UPLOAD_FOLDER) или "s3" (S3-совместимый бакет, нужен boto3)
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+    S3_BUCKET = os.getenv("S3_BUCKET", "")
+    S3_PREFIX = os.getenv("S3_PREFIX", "uploads")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")  # MinIO и т.п.; пусто — AWS
+    S3_REGION = os.getenv("S3_REGION", "")
+    S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID", "")
+    S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY", "")
+    # время жизни presigned-ссылки на скачивание, сек; 0 — отдавать через приложение
+    STORAGE_PRESIGN_TTL = int(os.getenv("STORAGE_PRESIGN_TTL", "300"))
+    # срок хранения файлов сгенерированных выгрузок (flask files expire-exports), дней
+    FILE_EXPORT_TTL_DAYS = int(os.getenv("FILE_EXPORT_TTL_DAYS", "30"))
+    # квота на загрузки одного пользователя, байт (0 — без ограничения); роли без квоты
+    STORAGE_QUOTA_USER_BYTES = int(os.getenv("STORAGE_QUOTA_USER_BYTES", str(100 * 1024 * 1024)))
+    STORAGE_QUOTA_EXEMPT_ROLES = {"admin", "teacher"}
+
     # Максимум 16 MB
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
 
     # Разрешённые расширения
     ALLOWED_UPLOAD_EXTENSIONS = {"pdf", "docx", "xlsx"}
+
+    # Статика: хэшированные копии и manifest.json (собираются `flask assets build`)
+    STATIC_DIST_DIR = "dist"
+    STATIC_USE_MANIFEST = os.getenv("STATIC_USE_MANIFEST", "true").lower() in ("1", "true", "yes")
+    # приватные/часто меняющиеся папки в сборку не попадают
+    STATIC_BUILD_EXCLUDE = {"materials", "schedules"}
+
+    # Индекс методических материалов (static/materials/<course_slug>/)
+    MATERIALS_INDEX_FILE = os.path.join(BASE_DIR, "var", "materials_index.json")
+    # как часто (сек) проверять mtime каталогов на каждом запросе
+    MATERIALS_INDEX_CHECK_INTERVAL = int(os.getenv("MATERIALS_INDEX_CHECK_INTERVAL", "30"))
+
+    # .docx-шаблон сертификата с плейсхолдерами {{name}}, {{email}}, {{course}}, {{date}}, {{issuer}}.
+    # Если файла нет — используется встроенный макет (`flask certificates make-template` выгрузит его)
+    CERTIFICATE_TEMPLATE = os.getenv(
+        "CERTIFICATE_TEMPLATE", os.path.join(BASE_DIR, "app", "docx_templates", "certificate.docx")
+    )
+    # процессов для пакетного выпуска сертификатов по курсу (1 — без пула)
+    CERTIFICATE_BATCH_WORKERS = int(os.getenv("CERTIFICATE_BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+    # Хэширование паролей (формат werkzeug: scrypt:N:r:p или pbkdf2:sha256:iterations).
+    # Хэши со старыми параметрами пересчитываются при успешном входе.
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_SALT_LENGTH = 16
+    # сколько проверок пароля одновременно на процесс и сколько секунд ждать слот (потом 503)
+    PASSWORD_VERIFY_CONCURRENCY = int(os.getenv("PASSWORD_VERIFY_CONCURRENCY", "2"))
+    PASSWORD_VERIFY_TIMEOUT = float(os.getenv("PASSWORD_VERIFY_TIMEOUT", "3"))
+
+    # Ограничение частоты POST-запросов (token bucket).
+    # "memory" — в каждом процессе свой счётчик, "database" — общий через таблицу rate_limit_buckets
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    # брать IP из X-Forwarded-For (включать только за доверенным прокси)
+    RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+    # {"ip": (запросов, за секунд), "account": (запросов, за секунд, поле формы)}
+    RATE_LIMITS = {
+        "login": {"ip": (20, 60), "account": (5, 60, "email")},
+        "register": {"ip": (5, 3600)},
+        "contacts": {"ip": (5, 600)},
+        "feedback": {"ip": (20, 600)},
+    }
+
+    # журнал курса: как часто (сек) сверять кэш матрицы с базой (записи других воркеров)
+    GRADEBOOK_CHECK_INTERVAL = int(os.getenv("GRADEBOOK_CHECK_INTERVAL", "10"))
+
+    # аналитика курсов: снимок старше этого (сек) пересчитывается при открытии; сколько снимков хранить
+    ANALYTICS_SNAPSHOT_MAX_AGE = int(os.getenv("ANALYTICS_SNAPSHOT_MAX_AGE", "900"))
+    ANALYTICS_SNAPSHOTS_KEEP = int(os.getenv("ANALYTICS_SNAPSHOTS_KEEP", "30"))
+
+    # просмотры уроков копятся в памяти воркера и пишутся пачкой:
+    # раз в VIEW_FLUSH_INTERVAL сек (0 — сразу) или при VIEW_FLUSH_MAX пар в буфере
+    VIEW_TRACKING_ENABLED = os.getenv("VIEW_TRACKING_ENABLED", "true").lower() in ("1", "true", "yes")
+    VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "10"))
+    VIEW_FLUSH_MAX = int(os.getenv("VIEW_FLUSH_MAX", "500"))
+
+    # sitemap: адресов в одном файле sitemap-<n>.xml (протокол допускает не больше 50 000)
+    SITEMAP_MAX_URLS = int(os.getenv("SITEMAP_MAX_URLS", "50000"))
+
+    # Почта: письма пишутся в таблицу outbox, отправляет фоновый диспетчер (app/mailer.py).
+    # Локальная проверка: python -m aiosmtpd -n -l localhost:8025 и MAIL_PORT=8025
+    MAIL_SERVER = os.getenv("MAIL_SERVER", "localhost")
+    MAIL_PORT = int(os.getenv("MAIL_PORT", "25"))
+    MAIL_USERNAME = os.getenv("MAIL_USERNAME") or None
+    MAIL_PASSWORD = os.getenv("MAIL_PASSWORD") or None
+    MAIL_USE_TLS = os.getenv("MAIL_USE_TLS", "false").lower() in ("1", "true", "yes")  # STARTTLS
+    MAIL_USE_SSL = os.getenv("MAIL_USE_SSL", "false").lower() in ("1", "true", "yes")
+    MAIL_TIMEOUT = float(os.getenv("MAIL_TIMEOUT", "10"))
+    MAIL_DEFAULT_SENDER = os.getenv("MAIL_DEFAULT_SENDER", "ML-Study <noreply@localhost>")
+    # диспетчер в каждом веб-воркере (false — только отдельным процессом: flask mail dispatch)
+    MAIL_DISPATCHER_ENABLED = os.getenv("MAIL_DISPATCHER_ENABLED", "true").lower() in ("1", "true", "yes")
+    MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "5"))
+    MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "50"))
+    # SMTP-соединений на процесс: пачка делится между ними, соединения переиспользуются
+    MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", "2"))
+    MAIL_CONNECTION_IDLE = float(os.getenv("MAIL_CONNECTION_IDLE", "60"))
+    # повторы: задержка MAIL_RETRY_BASE * 2^(попытка-1), не больше MAIL_RETRY_MAX сек
+    MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "8"))
+    MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE", "30"))
+    MAIL_RETRY_MAX = float(os.getenv("MAIL_RETRY_MAX", "3600"))
+    # письмо, захваченное упавшим процессом, снова берётся после этого срока (сек)
+    MAIL_LEASE_SECONDS = int(os.getenv("MAIL_LEASE_SECONDS", "300"))
+
+    # Миграции при старте: сколько секунд ждать блокировку, которую держит другой экземпляр
+    MIGRATION_LOCK_TIMEOUT = float(os.getenv("MIGRATION_LOCK_TIMEOUT", "600"))
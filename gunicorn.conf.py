@@ -0,0 +1,114 @@
+# gunicorn.conf.py — настройки gunicorn из переменных окружения
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# GUNICORN_WORKERS        число процессов (по умолчанию: ядра * 2 + 1, не больше GUNICORN_MAX_WORKERS)
+# GUNICORN_WORKER_CLASS   sync | gthread (по умолчанию gthread: скачивания и медленные запросы
+#                         занимают поток, а не весь процесс)
+# GUNICORN_THREADS        потоков на процесс для gthread
+# GUNICORN_PRELOAD        загрузить приложение в мастере до fork (общие страницы памяти, copy-on-write)
+# GUNICORN_MAX_REQUESTS   перезапуск воркера после N запросов (+ случайный jitter)
+# GUNICORN_TIMEOUT        секунд без ответа воркера до его перезапуска
+import math
+import os
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+def available_cpus():
+    """Ядра, реально доступные процессу: affinity и квота cgroup v2 (контейнеры)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as fh:
+            quota, period = fh.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = _env_int("GUNICORN_THREADS", 4) if worker_class == "gthread" else 1
+workers = _env_int(
+    "GUNICORN_WORKERS",
+    min(available_cpus() * 2 + 1, _env_int("GUNICORN_MAX_WORKERS", 8)),
+)
+
+preload_app = _env_bool("GUNICORN_PRELOAD", True)
+
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", max(1, max_requests // 10)) if max_requests else 0
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def _flask_app(server):
+    try:
+        return server.app.wsgi()
+    except Exception:
+        return None
+
+
+def when_ready(server):
+    # при preload приложение уже загружено в мастере: прогреваем кэши один раз,
+    # воркеры получат их через fork без копирования
+    if not preload_app:
+        return
+    app = _flask_app(server)
+    if app is None:
+        return
+    with app.app_context():
+        from app.certificates import get_certificate_template
+        get_certificate_template()
+    server.log.info("Caches warmed in master (preload_app)")
+
+
+def post_fork(server, worker):
+    # соединения пула, открытые в мастере, не должны использоваться в нескольких процессах
+    if not preload_app:
+        return
+    app = _flask_app(server)
+    if app is None:
+        return
+    with app.app_context():
+        from app.extensions import db
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # буфер просмотров уроков живёт в памяти воркера — дописываем его перед выходом
+    app = getattr(worker, "wsgi", None)
+    if app is None or not hasattr(app, "extensions"):
+        return
+    from app.view_tracking import flush_views
+    written = flush_views(app)
+    if written:
+        server.log.info("Flushed %d buffered lesson views", written)
+    # диспетчер почты: дожидаемся текущей пачки, чтобы не оставлять письма захваченными
+    from app.mailer import stop_mailer
+    stop_mailer(app)
+    # пул процессов пакетного рендера сертификатов
+    from app.certificates import shutdown_render_pool
+    shutdown_render_pool()
@@ -0,0 +1,37 @@
+"""add course_stats_snapshots
+
+Revision ID: a6c4e2f81b37
+Revises: f3b8d6c2a915
+Create Date: 2026-10-19 17:40:27.903114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c4e2f81b37'
+down_revision = 'f3b8d6c2a915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('course_stats_snapshots',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('course_id', sa.BigInteger(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('students', sa.Integer(), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('course_stats_snapshots', schema=None) as batch_op:
+        batch_op.create_index('ix_course_stats_snapshots_course_computed', ['course_id', 'computed_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('course_stats_snapshots', schema=None) as batch_op:
+        batch_op.drop_index('ix_course_stats_snapshots_course_computed')
+
+    op.drop_table('course_stats_snapshots')
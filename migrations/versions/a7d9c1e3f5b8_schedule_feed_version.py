@@ -0,0 +1,26 @@
+"""users.schedule_feed_version for revocable iCalendar links
+
+Revision ID: a7d9c1e3f5b8
+Revises: f1c3e5a7b9d2
+Create Date: 2026-10-21 09:42:18.331904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d9c1e3f5b8'
+down_revision = 'f1c3e5a7b9d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('schedule_feed_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('schedule_feed_version')
@@ -0,0 +1,44 @@
+"""files.kind: certificates do not count toward the owner's quota
+
+Revision ID: b2e4f6a8c0d1
+Revises: a7d9c1e3f5b8
+Create Date: 2026-10-21 11:05:47.218630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e4f6a8c0d1'
+down_revision = 'a7d9c1e3f5b8'
+branch_labels = None
+depends_on = None
+
+
+def _recount_user_usage(where):
+    op.execute("DELETE FROM storage_usage WHERE scope = 'user'")
+    op.execute(
+        "INSERT INTO storage_usage (scope, owner_id, bytes_used, files_count, updated_at) "
+        "SELECT 'user', owner_user_id, COALESCE(SUM(size_bytes), 0), COUNT(id), CURRENT_TIMESTAMP "
+        f"FROM files WHERE owner_user_id IS NOT NULL{where} GROUP BY owner_user_id"
+    )
+
+
+def upgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('kind', sa.String(length=20), server_default='upload', nullable=False))
+
+    op.execute(
+        "UPDATE files SET kind = 'certificate' "
+        "WHERE EXISTS (SELECT 1 FROM certificates c WHERE c.file_id = files.id)"
+    )
+    # выданные сертификаты уходят из счётчиков владельцев
+    _recount_user_usage(" AND kind <> 'certificate'")
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_column('kind')
+
+    _recount_user_usage("")
@@ -0,0 +1,41 @@
+"""add schedule_events
+
+Revision ID: b41c2e7d9a10
+Revises: 7ea8e504bae3
+Create Date: 2026-10-19 10:12:41.208315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41c2e7d9a10'
+down_revision = '7ea8e504bae3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('schedule_events',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('teacher_id', sa.BigInteger(), nullable=False),
+    sa.Column('course_id', sa.BigInteger(), nullable=True),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('starts_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('ends_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['teacher_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('schedule_events', schema=None) as batch_op:
+        batch_op.create_index('ix_schedule_events_teacher_starts', ['teacher_id', 'starts_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('schedule_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_schedule_events_teacher_starts')
+
+    op.drop_table('schedule_events')
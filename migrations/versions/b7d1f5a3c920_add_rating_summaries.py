@@ -0,0 +1,61 @@
+"""add rating_summaries and unique feedback per user
+
+Revision ID: b7d1f5a3c920
+Revises: a6c4e2f81b37
+Create Date: 2026-10-19 18:55:41.207315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d1f5a3c920'
+down_revision = 'a6c4e2f81b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # у оценки урока course_id пустой; из повторных оценок оставляем последнюю
+    op.execute("UPDATE feedback SET course_id = NULL WHERE target_type = 'lesson' AND lesson_id IS NOT NULL")
+    for column in ("course_id", "lesson_id"):
+        op.execute(
+            f"DELETE FROM feedback WHERE {column} IS NOT NULL AND id NOT IN "
+            f"(SELECT MAX(id) FROM feedback WHERE {column} IS NOT NULL GROUP BY user_id, {column})"
+        )
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_feedback_user_course', ['user_id', 'course_id'])
+        batch_op.create_unique_constraint('uq_feedback_user_lesson', ['user_id', 'lesson_id'])
+
+    op.create_table('rating_summaries',
+    sa.Column('target_type', sa.String(length=16), nullable=False),
+    sa.Column('target_id', sa.BigInteger(), nullable=False),
+    sa.Column('ratings_count', sa.Integer(), nullable=False),
+    sa.Column('ratings_sum', sa.Integer(), nullable=False),
+    sa.Column('r1', sa.Integer(), nullable=False),
+    sa.Column('r2', sa.Integer(), nullable=False),
+    sa.Column('r3', sa.Integer(), nullable=False),
+    sa.Column('r4', sa.Integer(), nullable=False),
+    sa.Column('r5', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('target_type', 'target_id')
+    )
+
+    # начальные значения сводок
+    buckets = ", ".join(f"SUM(CASE WHEN rating = {r} THEN 1 ELSE 0 END)" for r in range(1, 6))
+    for target_type, column in (("course", "course_id"), ("lesson", "lesson_id")):
+        op.execute(
+            "INSERT INTO rating_summaries (target_type, target_id, ratings_count, ratings_sum, r1, r2, r3, r4, r5, updated_at) "
+            f"SELECT '{target_type}', {column}, COUNT(id), SUM(rating), {buckets}, CURRENT_TIMESTAMP "
+            f"FROM feedback WHERE target_type = '{target_type}' AND {column} IS NOT NULL "
+            f"AND rating BETWEEN 1 AND 5 GROUP BY {column}"
+        )
+
+
+def downgrade():
+    op.drop_table('rating_summaries')
+
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_feedback_user_lesson', type_='unique')
+        batch_op.drop_constraint('uq_feedback_user_course', type_='unique')
@@ -0,0 +1,28 @@
+"""report_type: zip for course certificate archives
+
+Revision ID: c3f5a7b9d1e2
+Revises: b2e4f6a8c0d1
+Create Date: 2026-10-21 13:26:09.774512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f5a7b9d1e2'
+down_revision = 'b2e4f6a8c0d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # в SQLite Enum — обычная строка без CHECK, менять нечего
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE report_type ADD VALUE IF NOT EXISTS 'zip'")
+
+
+def downgrade():
+    # значение из enum PostgreSQL не удаляется; архивы помечаем как docx, как было раньше
+    op.execute("UPDATE reports SET type = 'docx' WHERE type = 'zip'")
@@ -0,0 +1,26 @@
+"""add news published index
+
+Revision ID: c7d3a1f05e22
+Revises: b41c2e7d9a10
+Create Date: 2026-10-19 11:40:03.512874
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d3a1f05e22'
+down_revision = 'b41c2e7d9a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('news', schema=None) as batch_op:
+        batch_op.create_index('ix_news_published', ['is_published', 'published_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('news', schema=None) as batch_op:
+        batch_op.drop_index('ix_news_published')
@@ -0,0 +1,64 @@
+"""add excerpt columns for courses, lessons, news, contacts
+
+Revision ID: c8e2a4f6b1d3
+Revises: b7d1f5a3c920
+Create Date: 2026-10-19 19:32:08.514902
+
+"""
+import html
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2a4f6b1d3'
+down_revision = 'b7d1f5a3c920'
+branch_labels = None
+depends_on = None
+
+# таблица -> колонка с полным текстом
+SOURCES = {
+    'courses': 'description',
+    'lessons': 'content',
+    'news': 'body',
+    'contacts': 'message',
+}
+
+
+def _excerpt(text, length=300):
+    # копия app.excerpts.make_excerpt на момент миграции
+    if not text:
+        return None
+    plain = re.sub(r"\s+", " ", html.unescape(re.sub(r"<[^>]+>", " ", text))).strip()
+    if len(plain) <= length:
+        return plain or None
+    cut = plain[:length - 1]
+    space = cut.rfind(" ")
+    if space > length // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,.;:-—") + "…"
+
+
+def upgrade():
+    for table in SOURCES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('excerpt', sa.String(length=300), nullable=True))
+
+    conn = op.get_bind()
+    for table, source in SOURCES.items():
+        t = sa.table(table, sa.column('id'), sa.column(source), sa.column('excerpt'))
+        rows = conn.execute(sa.select(t.c.id, t.c[source]).where(t.c[source].isnot(None))).all()
+        params = [{'row_id': row_id, 'value': _excerpt(text)} for row_id, text in rows]
+        if params:
+            conn.execute(
+                t.update().where(t.c.id == sa.bindparam('row_id')).values(excerpt=sa.bindparam('value')),
+                params,
+            )
+
+
+def downgrade():
+    for table in SOURCES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('excerpt')
@@ -0,0 +1,30 @@
+"""add course catalog indexes
+
+Revision ID: d9f3b5c7e2a4
+Revises: c8e2a4f6b1d3
+Create Date: 2026-10-19 20:14:52.730641
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f3b5c7e2a4'
+down_revision = 'c8e2a4f6b1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.create_index('ix_courses_published_created', ['is_published', 'created_at'], unique=False)
+        batch_op.create_index('ix_courses_published_level_created', ['is_published', 'level', 'created_at'], unique=False)
+        batch_op.create_index('ix_courses_published_start', ['is_published', 'start_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_index('ix_courses_published_start')
+        batch_op.drop_index('ix_courses_published_level_created')
+        batch_op.drop_index('ix_courses_published_created')
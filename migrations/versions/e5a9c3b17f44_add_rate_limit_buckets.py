@@ -0,0 +1,34 @@
+"""add rate_limit_buckets
+
+Revision ID: e5a9c3b17f44
+Revises: d2e8f4a6b713
+Create Date: 2026-10-19 14:21:50.337921
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9c3b17f44'
+down_revision = 'd2e8f4a6b713'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rate_limit_buckets',
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('refilled_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    with op.batch_alter_table('rate_limit_buckets', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_rate_limit_buckets_refilled_at'), ['refilled_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('rate_limit_buckets', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_rate_limit_buckets_refilled_at'))
+
+    op.drop_table('rate_limit_buckets')
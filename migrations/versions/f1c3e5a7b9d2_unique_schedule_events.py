@@ -0,0 +1,31 @@
+"""unique schedule_events per teacher, start and title
+
+Revision ID: f1c3e5a7b9d2
+Revises: e4b6d8f0a2c5
+Create Date: 2026-10-20 10:14:32.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c3e5a7b9d2'
+down_revision = 'e4b6d8f0a2c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # дубли от повторных импортов (naive/aware при сверке): оставляем самое раннее событие
+    op.execute(
+        "DELETE FROM schedule_events WHERE id NOT IN "
+        "(SELECT MIN(id) FROM schedule_events GROUP BY teacher_id, starts_at, title)"
+    )
+    with op.batch_alter_table('schedule_events', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_schedule_events_teacher_starts_title', ['teacher_id', 'starts_at', 'title'])
+
+
+def downgrade():
+    with op.batch_alter_table('schedule_events', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_schedule_events_teacher_starts_title', type_='unique')
@@ -0,0 +1,63 @@
+"""add storage_usage and files.course_id
+
+Revision ID: f3b8d6c2a915
+Revises: e5a9c3b17f44
+Create Date: 2026-10-19 16:05:12.481230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d6c2a915'
+down_revision = 'e5a9c3b17f44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('course_id', sa.BigInteger(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_files_course_id'), ['course_id'], unique=False)
+        batch_op.create_foreign_key('files_course_id_fkey', 'courses', ['course_id'], ['id'], ondelete='SET NULL')
+
+    op.create_table('storage_usage',
+    sa.Column('scope', sa.String(length=16), nullable=False),
+    sa.Column('owner_id', sa.BigInteger(), nullable=False),
+    sa.Column('bytes_used', sa.BigInteger(), nullable=False),
+    sa.Column('files_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('scope', 'owner_id')
+    )
+    with op.batch_alter_table('storage_usage', schema=None) as batch_op:
+        batch_op.create_index('ix_storage_usage_scope_bytes', ['scope', 'bytes_used'], unique=False)
+
+    # курс для уже выпущенных сертификатов
+    op.execute(
+        "UPDATE files SET course_id = (SELECT c.course_id FROM certificates c WHERE c.file_id = files.id) "
+        "WHERE EXISTS (SELECT 1 FROM certificates c WHERE c.file_id = files.id)"
+    )
+    # начальные значения счётчиков
+    op.execute(
+        "INSERT INTO storage_usage (scope, owner_id, bytes_used, files_count, updated_at) "
+        "SELECT 'user', owner_user_id, COALESCE(SUM(size_bytes), 0), COUNT(id), CURRENT_TIMESTAMP "
+        "FROM files WHERE owner_user_id IS NOT NULL GROUP BY owner_user_id"
+    )
+    op.execute(
+        "INSERT INTO storage_usage (scope, owner_id, bytes_used, files_count, updated_at) "
+        "SELECT 'course', course_id, COALESCE(SUM(size_bytes), 0), COUNT(id), CURRENT_TIMESTAMP "
+        "FROM files WHERE course_id IS NOT NULL GROUP BY course_id"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('storage_usage', schema=None) as batch_op:
+        batch_op.drop_index('ix_storage_usage_scope_bytes')
+
+    op.drop_table('storage_usage')
+
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_constraint('files_course_id_fkey', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_files_course_id'))
+        batch_op.drop_column('course_id')
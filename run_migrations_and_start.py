@@ -2,7 +2,7 @@
 import os
 import sys
 from app import create_app
-from flask_migrate import upgrade
+from app.migrations_runner import apply_migrations
 
 # --------------------------------------------------------
 # CONFIG
@@ -20,12 +20,13 @@ app = create_app()
 # --------------------------------------------------------
 with app.app_context():
     if RUN_MIGRATIONS:
+        # без блокировки экземпляры не гоняются за схемой; при ошибке старт прерывается,
+        # чтобы не поднимать приложение на недомигрированной базе
         try:
-            print(">>> Running migrations...")
-            upgrade()
-            print(">>> MIGRATIONS APPLIED")
+            apply_migrations()
         except Exception as e:
-            print(">>> MIGRATIONS FAILED:", e)
+            print(">>> MIGRATIONS FAILED:", e, file=sys.stderr)
+            sys.exit(1)
 
     # ----------------------------------------------------
     # SEED (create roles, admin, sample news)
@@ -95,10 +96,12 @@ with app.app_context():
 # --------------------------------------------------------
 
 port = os.getenv("PORT", "10000")
+# воркеры, потоки, preload, max_requests, таймауты — см. gunicorn.conf.py (всё из env)
+gunicorn_conf = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
 
 print(f">>> Starting gunicorn with {APP_MODULE} on port {port}")
 
 os.execvp(
     "gunicorn",
-    ["gunicorn", APP_MODULE, "-b", f"0.0.0.0:{port}", "--workers", "2"]
+    ["gunicorn", "-c", gunicorn_conf, APP_MODULE]
 )
@@ -0,0 +1,69 @@
+# tests/conftest.py
+# Приложение на SQLite в памяти. Внешние сервисы (S3, SMTP) подменяются локальными
+# стендами прямо в тестах: moto и aiosmtpd; без них соответствующие тесты пропускаются.
+import os
+import sys
+
+import pytest
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # в SQLite автоинкремент есть только у INTEGER PRIMARY KEY
+    return "INTEGER"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    import config
+
+    monkeypatch.setattr(config.Config, "SQLALCHEMY_DATABASE_URI", "sqlite://")
+    monkeypatch.setattr(config.Config, "WTF_CSRF_ENABLED", False, raising=False)
+    monkeypatch.setattr(config.Config, "UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    monkeypatch.setattr(config.Config, "MATERIALS_INDEX_FILE", str(tmp_path / "materials.json"), raising=False)
+    monkeypatch.setattr(config.Config, "VIEW_TRACKING_ENABLED", False)
+    monkeypatch.setattr(config.Config, "MAIL_DISPATCHER_ENABLED", False)
+
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(app):
+    """Фабрика пользователей с ролями; пароль у всех — secret1."""
+    from app.extensions import db
+    from app.models import Role, User
+
+    def factory(username, *roles):
+        user = User(username=username, email=f"{username}@example.org")
+        user.set_password("secret1")
+        for name in roles:
+            user.roles.append(Role.query.filter_by(name=name).first() or Role(name=name))
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return factory
+
+
+@pytest.fixture
+def login(app):
+    """login(user) -> test client с выполненным входом."""
+    def do_login(user):
+        client = app.test_client()
+        response = client.post("/auth/login", data={"email": user.email, "password": "secret1"})
+        assert response.status_code == 302
+        return client
+
+    return do_login
@@ -0,0 +1,108 @@
+# tests/test_analytics.py
+import math
+import random
+from array import array
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import analytics
+from app.analytics import ProgressColumns, compute_course_stats
+from app.extensions import db
+from app.models import Course, Enrollment, Lesson, Progress, User
+
+STATUSES = ("not_started", "in_progress", "completed")
+
+
+def _random_columns(rng):
+    n_students, n_lessons = rng.randint(0, 40), rng.randint(0, 8)
+    base = datetime(2025, 9, 1).timestamp()
+    enrolled = array("d", (math.nan if rng.random() < 0.1 else base + rng.randint(0, 10 ** 6)
+                           for _ in range(n_students)))
+    cols = ProgressColumns([(j + 1, f"L{j}") for j in range(n_lessons)], enrolled)
+    for i in range(n_students):
+        for j in range(n_lessons):
+            if rng.random() < 0.3:
+                continue
+            status = rng.choice(STATUSES)
+            score = None if rng.random() < 0.4 else rng.choice([0, 100, 105, -5, rng.uniform(0, 100)])
+            completed_at = None
+            if status == "completed" and rng.random() < 0.9:
+                completed_at = datetime.fromtimestamp(base + rng.randint(0, 5 * 10 ** 6))
+            cols.append(i, j, status, score, completed_at)
+    return cols
+
+
+def test_numpy_and_stdlib_backends_agree():
+    np = pytest.importorskip("numpy")
+    rng = random.Random(42)
+    for _ in range(200):
+        cols = _random_columns(rng)
+        fast, slow = analytics._np_metrics(cols), analytics._py_metrics(cols)
+
+        assert fast.keys() == slow.keys()
+        for key in ("completed_per_lesson", "started_per_lesson", "score_cnt", "stop_at"):
+            assert list(fast[key]) == list(slow[key]), key
+        assert fast["finishers"] == slow["finishers"]
+        assert fast["not_started"] == slow["not_started"]
+        assert fast["score_sum"] == pytest.approx(slow["score_sum"])
+        assert fast["scores"].tolist() == pytest.approx(slow["scores"])
+        assert fast["ttc"].tolist() == pytest.approx(slow["ttc"])
+
+        for key in ("scores", "ttc"):
+            assert analytics._distribution(fast[key]) == analytics._distribution(slow[key])
+        assert analytics._histogram(fast["scores"]) == analytics._histogram(slow["scores"])
+        assert isinstance(fast["scores"], np.ndarray)
+
+
+def test_percentile_matches_numpy():
+    np = pytest.importorskip("numpy")
+    rng = random.Random(7)
+    for n in (1, 2, 3, 10, 101):
+        values = sorted(rng.uniform(0, 100) for _ in range(n))
+        for q in analytics.PERCENTILES:
+            assert analytics._percentile(values, q) == pytest.approx(float(np.percentile(values, q)))
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_course_stats(app, monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(analytics, "np", None)
+    course = Course(title="ML", slug="ml")
+    db.session.add(course)
+    db.session.commit()
+    lessons = [Lesson(course_id=course.id, title=f"L{i}", order_index=i) for i in range(3)]
+    users = [User(username=f"s{i}", email=f"s{i}@example.org", password_hash="x") for i in range(4)]
+    db.session.add_all(lessons + users)
+    db.session.commit()
+    start = datetime(2025, 9, 1)
+    for user in users:
+        db.session.add(Enrollment(user_id=user.id, course_id=course.id, enrolled_at=start))
+
+    def progress(user, lesson, status, score=None, days=None):
+        db.session.add(Progress(user_id=user.id, lesson_id=lesson.id, status=status, score=score,
+                                completed_at=start + timedelta(days=days) if days else None))
+
+    # s0 прошёл всё за 10 дней, s1 остановился после первого урока,
+    # s2 только начал первый урок, s3 не начинал
+    for lesson, score, days in zip(lessons, (80, 90, 100), (2, 5, 10)):
+        progress(users[0], lesson, "completed", score, days)
+    progress(users[1], lessons[0], "completed", 60, 3)
+    progress(users[2], lessons[0], "in_progress")
+    db.session.commit()
+
+    stats = compute_course_stats(course.id)
+
+    assert stats["backend"] == ("numpy" if use_numpy else "array")
+    assert (stats["students"], stats["finishers"], stats["completion_rate"]) == (4, 1, 25.0)
+    assert stats["not_started"] == 1
+    assert [lesson["completed"] for lesson in stats["lessons"]] == [2, 1, 1]
+    assert [lesson["started"] for lesson in stats["lessons"]] == [3, 1, 1]
+    assert [lesson["dropoff"] for lesson in stats["lessons"]] == [2, 1, 0]
+    assert stats["lessons"][0]["avg_score"] == 70.0
+    assert stats["scores"]["count"] == 4 and stats["scores"]["mean"] == 82.5
+    assert stats["scores"]["percentiles"]["p50"] == 85.0
+    assert stats["time_to_complete_days"]["count"] == 1
+    assert stats["time_to_complete_days"]["mean"] == 10.0
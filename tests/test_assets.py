@@ -0,0 +1,62 @@
+# tests/test_assets.py
+import pytest
+from flask import Flask
+
+from app.assets import build_assets, init_assets
+
+
+@pytest.fixture
+def static_root(tmp_path):
+    root = tmp_path / "static"
+    (root / "css").mkdir(parents=True)
+    (root / "css" / "style.css").write_text("body { color: black; }\n" * 50)
+    return root
+
+
+def test_build_prunes_outdated_copies(static_root):
+    first = build_assets(str(static_root), "dist")
+    old_copy = static_root / first["css/style.css"]
+    assert old_copy.exists() and (static_root / (first["css/style.css"] + ".gz")).exists()
+
+    (static_root / "css" / "style.css").write_text("body { color: white; }\n" * 50)
+    second = build_assets(str(static_root), "dist")
+
+    assert second["css/style.css"] != first["css/style.css"]
+    assert (static_root / second["css/style.css"]).exists()
+    assert not old_copy.exists()
+    assert not (static_root / (first["css/style.css"] + ".gz")).exists()
+    assert (static_root / "dist" / "manifest.json").exists()
+
+
+def test_build_removes_copies_of_deleted_files(static_root):
+    (static_root / "img").mkdir()
+    (static_root / "img" / "a.png").write_bytes(b"\x89PNG")
+    manifest = build_assets(str(static_root), "dist")
+    (static_root / "img" / "a.png").unlink()
+
+    build_assets(str(static_root), "dist")
+
+    assert not (static_root / manifest["img/a.png"]).exists()
+    assert not (static_root / "dist" / "img").exists()
+
+
+@pytest.mark.parametrize("accept_encoding, gzipped", [
+    ("gzip, deflate", True),
+    ("br, *;q=0.1", True),
+    ("gzip;q=0", False),
+    ("identity, x-gzip;q=0", False),
+    ("", False),
+])
+def test_gzip_follows_accept_encoding_q_values(static_root, accept_encoding, gzipped):
+    manifest = build_assets(str(static_root), "dist")
+    app = Flask(__name__, static_folder=str(static_root))
+    app.config.update(STATIC_DIST_DIR="dist", STATIC_USE_MANIFEST=True)
+    init_assets(app)
+
+    response = app.test_client().get(f"/static/{manifest['css/style.css']}",
+                                     headers={"Accept-Encoding": accept_encoding})
+
+    assert response.status_code == 200
+    assert (response.headers.get("Content-Encoding") == "gzip") is gzipped
+    assert "immutable" in response.headers["Cache-Control"]
+    response.close()
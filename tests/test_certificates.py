@@ -0,0 +1,108 @@
+# tests/test_certificates.py
+import hashlib
+import io
+import zipfile
+
+import pytest
+
+from app import certificates
+from app.certificates import certificate_values, get_render_pool, iter_rendered, shutdown_render_pool
+from app.extensions import db
+from app.models import Course, Enrollment, File, OutboxMessage, Report
+from app.storage import get_storage
+from app.storage_quota import usage_for
+
+
+@pytest.fixture
+def render_pool():
+    yield
+    shutdown_render_pool()
+
+
+def _document_text(docx_bytes):
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as zf:
+        return zf.read("word/document.xml").decode("utf-8")
+
+
+def test_pool_render_matches_in_thread(app, render_pool):
+    jobs = [(f"c{i}.docx", certificate_values(f"user{i}", f"u{i}@example.org", "Машинное обучение"))
+            for i in range(6)]
+
+    in_thread = dict(iter_rendered(iter(jobs), workers=1))
+    pooled = dict(iter_rendered(iter(jobs), workers=2))
+
+    assert set(pooled) == set(in_thread)
+    for key, data in pooled.items():
+        assert _document_text(data) == _document_text(in_thread[key])
+    assert "user3" in _document_text(pooled["c3.docx"])
+
+
+def test_pool_is_reused_and_uses_forkserver(app, render_pool):
+    jobs = [("a.docx", certificate_values("a", "a@example.org", "ML"))]
+    list(iter_rendered(iter(jobs), workers=2))
+    pool = certificates._render_pool
+    list(iter_rendered(iter(jobs), workers=2))
+
+    assert certificates._render_pool is pool
+    assert get_render_pool(2) is pool
+    assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+
+    shutdown_render_pool()
+    assert certificates._render_pool is None
+
+
+def test_course_archive_is_a_zip_report(app, make_user, login):
+    admin = make_user("boss", "admin")
+    course = Course(title="ML", slug="ml")
+    db.session.add(course)
+    db.session.commit()
+    for name in ("Иван", "Пётр"):
+        student = make_user(name, "student")
+        db.session.add(Enrollment(user_id=student.id, course_id=course.id, status="completed"))
+    db.session.commit()
+    app.config["CERTIFICATE_BATCH_WORKERS"] = 1
+
+    response = login(admin).get(f"/admin/export/certificates/course/{course.id}")
+
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+        assert len(zf.namelist()) == 2
+    report = Report.query.one()
+    assert (report.type, report.status) == ("zip", "ready")
+
+    # архив сохранён: отчёт можно скачать повторно, письмо о готовности не ведёт в 404
+    stored = db.session.get(File, report.file_id)
+    assert (stored.kind, stored.size_bytes, stored.course_id) == ("export", len(response.data), course.id)
+    assert stored.sha256 == hashlib.sha256(response.data).hexdigest()
+    download = login(admin).get(f"/admin/reports/{report.id}/download")
+    assert download.status_code == 200
+    assert download.data == response.data
+    assert OutboxMessage.query.filter_by(kind="report_ready", report_id=report.id).count() == 1
+    assert usage_for("user", admin.id) == (0, 0)
+    assert usage_for("course", course.id) == (len(response.data), 1)
+
+
+def test_failed_course_archive_is_not_stored(app, make_user, login, monkeypatch):
+    from app import admin
+
+    boss = make_user("boss", "admin")
+    course = Course(title="ML", slug="ml")
+    db.session.add(course)
+    db.session.commit()
+    student = make_user("ivan", "student")
+    db.session.add(Enrollment(user_id=student.id, course_id=course.id, status="completed"))
+    db.session.commit()
+
+    def broken(jobs, workers):
+        yield "first.docx", b"PK"
+        raise RuntimeError("render failed")
+
+    monkeypatch.setattr(admin, "iter_rendered", broken)
+    with pytest.raises(RuntimeError):
+        login(boss).get(f"/admin/export/certificates/course/{course.id}").get_data()
+
+    report = Report.query.one()
+    assert (report.status, report.file_id) == ("failed", None)
+    assert File.query.count() == 0
+    assert OutboxMessage.query.count() == 0
+    assert list(get_storage().iter_keys()) == []
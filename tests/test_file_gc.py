@@ -0,0 +1,54 @@
+# tests/test_file_gc.py
+import os
+import time
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.file_gc import reconcile
+from app.models import File
+from app.storage import get_storage
+
+
+def _file(path, age):
+    file = File(original_name=os.path.basename(path), path=path, size_bytes=1,
+                created_at=datetime.utcnow() - age)
+    db.session.add(file)
+    db.session.commit()
+    return file.id
+
+
+def _age_blob(storage, key, seconds):
+    path = os.path.join(storage.root, key)
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_reconcile_skips_young_rows_and_blobs(app):
+    storage = get_storage()
+    storage.save_bytes("kept.txt", b"1")
+    storage.save_bytes("old-orphan.txt", b"1")
+    storage.save_bytes("new-orphan.txt", b"1")
+    _age_blob(storage, "kept.txt", 7200)
+    _age_blob(storage, "old-orphan.txt", 7200)
+    kept = _file("kept.txt", timedelta(hours=2))
+    old_missing = _file("old-missing.txt", timedelta(hours=2))
+    _file("uploading.txt", timedelta(minutes=5))
+
+    result = reconcile(storage, grace_seconds=3600)
+
+    assert result.dangling_rows == [old_missing]
+    assert result.young_rows == 1
+    assert [key for key, _ in result.orphan_blobs] == ["old-orphan.txt"]
+    assert result.young_orphans == 1
+    assert kept not in result.dangling_rows
+
+
+def test_reconcile_delete_keeps_young_rows(app):
+    old_missing = _file("old-missing.txt", timedelta(hours=2))
+    young_missing = _file("uploading.txt", timedelta(minutes=5))
+
+    output = app.test_cli_runner().invoke(args=["files", "reconcile", "--delete"]).output
+
+    assert "свежих пропущено: 1" in output
+    assert db.session.get(File, old_missing) is None
+    assert db.session.get(File, young_missing) is not None
@@ -0,0 +1,124 @@
+# tests/test_gradebook.py
+import pytest
+
+from app import gradebook
+from app.extensions import db
+from app.gradebook import STATUS_CODES, get_gradebook
+from app.models import Course, Enrollment, Lesson, Profile, Progress, User
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    # кэш модульный, а id в каждой тестовой базе начинаются с 1
+    gradebook._cache.clear()
+    yield
+    gradebook._cache.clear()
+
+
+@pytest.fixture
+def course(app):
+    course = Course(title="ML", slug="ml")
+    db.session.add(course)
+    db.session.commit()
+    # порядок уроков — по order_index, а не по id
+    db.session.add_all([Lesson(course_id=course.id, title=title, order_index=index)
+                        for title, index in (("Второй", 2), ("Первый", 1), ("Третий", 3))])
+    students = [User(username=name, email=f"{name}@example.org", password_hash="x")
+                for name in ("vasya", "anna", "outsider")]
+    db.session.add_all(students)
+    db.session.commit()
+    db.session.add_all([Enrollment(user_id=user.id, course_id=course.id) for user in students[:2]])
+    db.session.add(Profile(user_id=students[0].id, last_name="Белов", first_name="Василий"))
+    db.session.commit()
+    return course
+
+
+def _lesson(title):
+    return Lesson.query.filter_by(title=title).one()
+
+
+def _user(username):
+    return User.query.filter_by(username=username).one()
+
+
+def test_matrix_cells(app, course):
+    db.session.add_all([
+        Progress(user_id=_user("anna").id, lesson_id=_lesson("Первый").id, status="completed", score=90),
+        Progress(user_id=_user("anna").id, lesson_id=_lesson("Третий").id, status="in_progress"),
+        Progress(user_id=_user("vasya").id, lesson_id=_lesson("Второй").id, status="completed", score=75.5),
+        # прогресс без записи на курс в журнал не попадает
+        Progress(user_id=_user("outsider").id, lesson_id=_lesson("Первый").id, status="completed", score=10),
+    ])
+    db.session.commit()
+
+    book = get_gradebook(course.id)
+
+    assert [title for _, title in book.lessons] == ["Первый", "Второй", "Третий"]
+    assert [name for _, name in book.students] == ["anna", "Белов Василий"]
+    assert book.row(0) == [(STATUS_CODES["completed"], 90.0), (0, None), (STATUS_CODES["in_progress"], None)]
+    assert book.status_at(1, 1) == "completed" and book.score_at(1, 1) == 75.5
+    assert book.status_at(1, 0) is None
+    assert [book.completed_count(i) for i in range(2)] == [1, 1]
+    data = book.to_json()
+    assert data["scores"] == [[90.0, None, None], [None, 75.5, None]]
+    assert data["status"][0] == [3, 0, 2]
+
+
+def test_orm_commit_invalidates_cache(app, course):
+    app.config["GRADEBOOK_CHECK_INTERVAL"] = 3600
+    book = get_gradebook(course.id)
+    assert get_gradebook(course.id) is book
+
+    db.session.add(Progress(user_id=_user("anna").id, lesson_id=_lesson("Второй").id, status="completed"))
+    db.session.commit()
+
+    fresh = get_gradebook(course.id)
+    assert fresh is not book
+    assert fresh.status_at(0, 1) == "completed"
+
+
+def test_rollback_keeps_cache(app, course):
+    app.config["GRADEBOOK_CHECK_INTERVAL"] = 3600
+    book = get_gradebook(course.id)
+
+    db.session.add(Progress(user_id=_user("anna").id, lesson_id=_lesson("Второй").id, status="completed"))
+    db.session.flush()
+    db.session.rollback()
+
+    assert get_gradebook(course.id) is book
+
+
+def test_changes_without_orm_events_are_found_by_version(app, course):
+    app.config["GRADEBOOK_CHECK_INTERVAL"] = 3600
+    book = get_gradebook(course.id)
+    # запись из другого воркера: событий маппера в этом процессе нет
+    db.session.execute(Progress.__table__.insert().values(
+        id=100, user_id=_user("vasya").id, lesson_id=_lesson("Третий").id, status="completed"))
+    db.session.commit()
+
+    assert get_gradebook(course.id) is book  # до истечения интервала — без запроса версии
+
+    app.config["GRADEBOOK_CHECK_INTERVAL"] = 0
+    fresh = get_gradebook(course.id)
+    assert fresh is not book
+    assert fresh.status_at(1, 2) == "completed"
+    # версия не менялась — тот же объект
+    assert get_gradebook(course.id) is fresh
+
+
+def test_other_courses_stay_cached(app, course):
+    app.config["GRADEBOOK_CHECK_INTERVAL"] = 3600
+    other = Course(title="Python", slug="py")
+    db.session.add(other)
+    db.session.commit()
+    lesson = Lesson(course_id=other.id, title="Intro", order_index=1)
+    db.session.add(lesson)
+    db.session.commit()
+    book = get_gradebook(course.id)
+    other_book = get_gradebook(other.id)
+
+    db.session.add(Progress(user_id=_user("anna").id, lesson_id=lesson.id, status="completed"))
+    db.session.commit()
+
+    assert get_gradebook(course.id) is book
+    assert get_gradebook(other.id) is not other_book
@@ -0,0 +1,166 @@
+# tests/test_mailer.py
+# Диспетчер outbox против настоящего SMTP-сервера (aiosmtpd на локальном порту).
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.mailer import SMTPPool, claim_batch, dispatch_once, enqueue_mail, record_results
+from app.models import OutboxMessage
+
+
+class Handler:
+    """bounce@ — 550 (постоянный отказ), later@ — 451 (временный), остальные принимаются."""
+
+    def __init__(self):
+        self.received = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bounce@"):
+            return "550 no such user"
+        if address.startswith("later@"):
+            return "451 try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.append(envelope.rcpt_tos[0])
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(app):
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    handler = Handler()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    app.config.update(
+        MAIL_SERVER="127.0.0.1", MAIL_PORT=controller.port, MAIL_POOL_SIZE=1, MAIL_BATCH_SIZE=10,
+        MAIL_MAX_ATTEMPTS=3, MAIL_RETRY_BASE=30, MAIL_RETRY_MAX=3600, MAIL_LEASE_SECONDS=300,
+    )
+    pool = SMTPPool.from_config(app.config)
+    yield handler, pool
+    pool.close()
+    controller.stop()
+
+
+def _enqueue(*addresses):
+    messages = [enqueue_mail(address, "Тема", "Текст письма") for address in addresses]
+    db.session.commit()
+    return [message.id for message in messages]
+
+
+def _rows():
+    db.session.expire_all()
+    return {row.to_addr: row for row in OutboxMessage.query}
+
+
+def test_dispatch_sends_fails_and_retries(app, smtp):
+    handler, pool = smtp
+    _enqueue("ok@example.com", "bounce@example.com", "later@example.com")
+
+    taken, counts = dispatch_once(pool)
+
+    assert taken == 3
+    assert counts == {"sent": 1, "retry": 1, "failed": 1}
+    assert handler.received == ["ok@example.com"]
+    rows = _rows()
+    assert rows["ok@example.com"].status == "sent"
+    assert rows["ok@example.com"].sent_at is not None
+    assert rows["bounce@example.com"].status == "failed"
+    assert "550" in rows["bounce@example.com"].last_error
+    later = rows["later@example.com"]
+    assert (later.status, later.attempts) == ("pending", 1)
+    # первая повторная попытка — через MAIL_RETRY_BASE ± 20%
+    assert later.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+    assert all(row.claim_token is None and row.locked_until is None for row in rows.values())
+
+    # до next_attempt_at письмо не берётся
+    assert dispatch_once(pool)[0] == 0
+
+
+def test_transient_error_fails_after_max_attempts(app, smtp):
+    _, pool = smtp
+    app.config["MAIL_MAX_ATTEMPTS"] = 2
+    (message_id,) = _enqueue("later@example.com")
+
+    assert dispatch_once(pool)[1] == {"sent": 0, "retry": 1, "failed": 0}
+    db.session.get(OutboxMessage, message_id).next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert dispatch_once(pool)[1] == {"sent": 0, "retry": 0, "failed": 1}
+
+    row = _rows()["later@example.com"]
+    assert (row.status, row.attempts) == ("failed", 2)
+
+
+def test_expired_lease_is_reclaimed(app, smtp):
+    handler, pool = smtp
+    (message_id,) = _enqueue("ok@example.com")
+
+    # процесс захватил письмо и упал, не записав результат
+    started = datetime.utcnow()
+    stale_token, claimed = claim_batch(10, 300, 3, now=started)
+    assert [message["id"] for message in claimed] == [message_id]
+    assert dispatch_once(pool)[0] == 0
+
+    # захват истёк — письмо берёт другой процесс, попытка считается второй
+    later = started + timedelta(seconds=301)
+    token, claimed = claim_batch(10, 300, 3, now=later)
+    assert token != stale_token
+    assert [(message["id"], message["attempts"]) for message in claimed] == [(message_id, 2)]
+
+    # опоздавший результат старого захвата строку не перезаписывает
+    record_results(stale_token, claimed, [(message_id, "SMTPServerDisconnected: gone", False)], app.config, now=later)
+    row = _rows()["ok@example.com"]
+    assert (row.status, row.claim_token) == ("sending", token)
+
+    record_results(token, claimed, [(message_id, None, False)], app.config, now=later)
+    assert _rows()["ok@example.com"].status == "sent"
+    assert handler.received == []
+
+
+def test_expired_lease_on_last_attempt_fails(app, smtp):
+    _, pool = smtp
+    (message_id,) = _enqueue("ok@example.com")
+    row = db.session.get(OutboxMessage, message_id)
+    row.status, row.attempts = "sending", 3
+    row.claim_token, row.locked_until = "crashed", datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    assert dispatch_once(pool)[0] == 0
+    row = _rows()["ok@example.com"]
+    assert (row.status, row.last_error, row.claim_token) == ("failed", "lease expired", None)
+
+
+def test_pool_reuses_connection_between_batches(app, smtp):
+    handler, pool = smtp
+    _enqueue("a@example.com", "b@example.com")
+    dispatch_once(pool)
+    _enqueue("c@example.com")
+    dispatch_once(pool)
+
+    assert handler.received == ["a@example.com", "b@example.com", "c@example.com"]
+    assert len(handler.sessions) == 1
+
+    # после постоянного отказа соединение остаётся в пуле
+    _enqueue("bounce@example.com", "d@example.com")
+    assert dispatch_once(pool)[1] == {"sent": 1, "retry": 0, "failed": 1}
+    assert len(handler.sessions) == 1
+
+
+def test_unreachable_server_is_retried(app):
+    app.config.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=_free_port(), MAIL_TIMEOUT=2)
+    _enqueue("a@example.com", "b@example.com")
+    pool = SMTPPool.from_config(app.config)
+
+    assert dispatch_once(pool) == (2, {"sent": 0, "retry": 2, "failed": 0})
+    assert {row.status for row in _rows().values()} == {"pending"}
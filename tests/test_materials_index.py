@@ -0,0 +1,42 @@
+# tests/test_materials_index.py
+import os
+
+from app.materials_index import MaterialsIndex
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+
+
+def test_items_are_precomputed_per_refresh(tmp_path):
+    root = str(tmp_path / "materials")
+    _write(os.path.join(root, "ml", "b.pdf"), "b")
+    _write(os.path.join(root, "ml", "a.pdf"), "a")
+    _write(os.path.join(root, "py", "c.txt"), "c")
+    index = MaterialsIndex(root, cache_file=str(tmp_path / "index.json"))
+    index.refresh()
+
+    assert index.course_slugs() == ["ml", "py"]
+    assert [(i["course_slug"], i["name"]) for i in index.items()] == [("ml", "a.pdf"), ("ml", "b.pdf"), ("py", "c.txt")]
+    assert [i["name"] for i in index.items("py")] == ["c.txt"]
+    assert index.items("missing") == ()
+    # без изменений на диске — тот же объект, без копирования
+    assert index.items() is index.items()
+    assert index.items("ml")[0] is index.items()[0]
+
+    _write(os.path.join(root, "py", "d.txt"), "d")
+    assert index.refresh()
+    assert [i["name"] for i in index.items("py")] == ["c.txt", "d.txt"]
+
+
+def test_index_is_restored_from_cache_file(tmp_path):
+    root = str(tmp_path / "materials")
+    _write(os.path.join(root, "ml", "a.pdf"), "a")
+    cache_file = str(tmp_path / "index.json")
+    MaterialsIndex(root, cache_file=cache_file).refresh()
+
+    restored = MaterialsIndex(root, cache_file=cache_file)
+    assert [(i["course_slug"], i["name"]) for i in restored.items()] == [("ml", "a.pdf")]
+    assert not restored.refresh()
@@ -0,0 +1,35 @@
+# tests/test_news_feed.py
+from datetime import datetime
+
+from app import news_feed
+from app.extensions import db
+from app.models import News
+
+
+def test_feed_orders_by_displayed_date(app):
+    db.session.add_all([
+        News(title="Старая", slug="old", is_published=True, published_at=datetime(2025, 1, 1)),
+        News(title="Без даты", slug="undated", is_published=True, published_at=None,
+             created_at=datetime(2025, 6, 1)),
+        News(title="Новая", slug="new", is_published=True, published_at=datetime(2025, 9, 1)),
+        News(title="Черновик", slug="draft", is_published=False, published_at=datetime(2026, 1, 1)),
+    ])
+    db.session.commit()
+
+    cards = news_feed.published_cards_query().all()
+
+    assert [card.slug for card in cards] == ["new", "undated", "old"]
+    assert cards[1].published_at == datetime(2025, 6, 1)
+
+
+def test_atom_updated_is_newest_entry(app):
+    db.session.add_all([
+        News(title="Без даты", slug="undated", is_published=True, created_at=datetime(2024, 1, 1)),
+        News(title="Новая", slug="new", is_published=True, published_at=datetime(2025, 9, 1)),
+    ])
+    db.session.commit()
+
+    with app.test_request_context("/news/atom.xml"):
+        body = news_feed.build_atom(20).decode("utf-8")
+
+    assert "<updated>2025-09-01T00:00:00Z</updated>" in body.split("<entry>")[0]
@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import ratings
+from app.extensions import db
+from app.models import Course, Feedback, Lesson, User
+from app.ratings import submit_feedback, summary_for
+
+
+def _user(name):
+    user = User(username=name, email=f"{name}@example.com", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def test_deleting_user_subtracts_their_ratings(app):
+    course = Course(title="ML", slug="ml")
+    db.session.add(course)
+    db.session.commit()
+    alice, bob = _user("alice"), _user("bob")
+    submit_feedback(alice.id, "course", course.id, 5)
+    submit_feedback(bob.id, "course", course.id, 2)
+
+    db.session.delete(bob)
+    db.session.commit()
+
+    summary = summary_for("course", course.id)
+    assert (summary.ratings_count, summary.ratings_sum, summary.r2, summary.r5) == (1, 5, 0, 1)
+
+
+def _course(published=True):
+    course = Course(title="ML", slug="ml", is_published=published)
+    db.session.add(course)
+    db.session.commit()
+    return course
+
+
+def test_concurrent_first_rating_updates_the_winner(app, monkeypatch):
+    course = _course()
+    alice = _user("alice")
+    submit_feedback(alice.id, "course", course.id, 2)
+
+    # гонка: SELECT не увидел строку, которую параллельный запрос уже вставил
+    lookup = ratings._own_feedback
+    calls = []
+
+    def racing_lookup(*args):
+        calls.append(args)
+        return None if len(calls) == 1 else lookup(*args)
+
+    monkeypatch.setattr(ratings, "_own_feedback", racing_lookup)
+    feedback, created = submit_feedback(alice.id, "course", course.id, 5, "отлично")
+
+    assert (created, feedback.rating, feedback.comment) == (False, 5, "отлично")
+    assert len(calls) == 2
+    assert Feedback.query.count() == 1
+    summary = summary_for("course", course.id)
+    assert (summary.ratings_count, summary.ratings_sum) == (1, 5)
+
+
+def test_other_integrity_errors_are_not_retried(app):
+    course = _course()
+    alice = _user("alice")
+
+    with pytest.raises(IntegrityError):
+        submit_feedback(alice.id, "course", course.id, None)
+    db.session.rollback()
+    assert Feedback.query.count() == 0
+
+
+def test_feedback_pages_require_published_target(app, make_user, login):
+    draft = _course(published=False)
+    lesson = Lesson(course_id=draft.id, title="L1", order_index=1, is_published=True)
+    db.session.add(lesson)
+    db.session.commit()
+    client = login(make_user("alice"))
+
+    assert client.get(f"/courses/{draft.id}/feedback").status_code == 404
+    assert client.post(f"/courses/{draft.id}/feedback", data={"rating": 5}).status_code == 404
+    assert client.post(f"/lessons/{lesson.id}/feedback", data={"rating": 5}).status_code == 404
+    assert Feedback.query.count() == 0
+
+    draft.is_published = True
+    db.session.commit()
+    assert client.get(f"/lessons/{lesson.id}/feedback").status_code == 200
+    assert client.post(f"/courses/{draft.id}/feedback", data={"rating": 4}).status_code == 302
+    assert summary_for("course", draft.id).ratings_sum == 4
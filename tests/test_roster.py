@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+
+from app.roster import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    enrolled = datetime(2025, 9, 1, 10, 30)
+    assert decode_cursor(encode_cursor([enrolled, 7]), "enrolled_key") == [enrolled, 7]
+    assert decode_cursor(encode_cursor([3, 7]), "completed") == [3, 7]
+    assert decode_cursor(encode_cursor([-1, 7]), "avg_score_key") == [-1, 7]
+    assert decode_cursor(encode_cursor(["иванов", 7]), "sort_name") == ["иванов", 7]
+
+
+@pytest.mark.parametrize("column, values", [
+    ("enrolled_key", ["not a date", 1]),
+    ("enrolled_key", [5, 1]),
+    ("completed", ["5", 1]),
+    ("completed", [True, 1]),
+    ("avg_score_key", [float("nan"), 1]),
+    ("avg_score_key", [None, 1]),
+    ("sort_name", [{"a": 1}, 1]),
+    ("completed", [5, "1"]),
+    ("completed", [5, 1.5]),
+])
+def test_tampered_cursor_is_ignored(column, values):
+    assert decode_cursor(encode_cursor(values), column) is None
+
+
+def test_garbage_cursor_is_ignored():
+    assert decode_cursor("garbage!", "completed") is None
+    assert decode_cursor(encode_cursor([1, 2, 3]), "completed") is None
+
+
+@pytest.mark.parametrize("sort", ["progress", "name", "score", "enrolled"])
+def test_pages_cover_every_student_once(app, sort):
+    from app.extensions import db
+    from app.models import Course, Enrollment, Lesson, Progress, User
+    from app.roster import roster_page
+
+    course = Course(title="ML", slug="ml")
+    db.session.add(course)
+    db.session.commit()
+    lessons = [Lesson(course_id=course.id, title=f"L{i}", order_index=i) for i in range(3)]
+    db.session.add_all(lessons)
+    db.session.commit()
+    for i in range(23):
+        user = User(username=f"s{i:02d}", email=f"s{i}@example.org", password_hash="x")
+        db.session.add(user)
+        db.session.flush()
+        # у части записей дата зачисления неизвестна
+        enrolled = None if i % 4 == 0 else datetime(2025, 9, 1 + i % 5)
+        db.session.add(Enrollment(user_id=user.id, course_id=course.id, enrolled_at=enrolled))
+        for lesson in lessons[:i % 4]:
+            db.session.add(Progress(user_id=user.id, lesson_id=lesson.id, status="completed", score=i % 7 * 10))
+    db.session.commit()
+
+    seen, cursor, pages = [], None, []
+    while True:
+        page = roster_page(course.id, sort=sort, after=cursor, per_page=5)
+        pages.append(page)
+        seen += [row.user_id for row in page.rows]
+        if not page.next_cursor:
+            break
+        cursor = page.next_cursor
+    assert len(seen) == len(set(seen)) == 23
+
+    # назад от последней страницы — те же строки
+    back, cursor = [], pages[-1].prev_cursor
+    while cursor:
+        page = roster_page(course.id, sort=sort, before=cursor, per_page=5)
+        back = [row.user_id for row in page.rows] + back
+        cursor = page.prev_cursor
+    assert back + [row.user_id for row in pages[-1].rows] == seen
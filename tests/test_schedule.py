@@ -0,0 +1,58 @@
+# tests/test_schedule.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.extensions import db
+from app.models import ScheduleEvent
+from app.schedule import build_ics, load_feed_token, make_feed_token, reset_feed_token
+
+
+@pytest.mark.parametrize("start", ["9999-12-31", "0001-01-01", "9000-06-01"])
+def test_schedule_window_near_date_limits(make_user, login, start):
+    client = login(make_user("teacher", "teacher"))
+    response = client.get(f"/dashboard/instructor/schedule?start={start}&days=92")
+    assert response.status_code == 200
+
+
+def test_dtstamp_is_utc(app, make_user):
+    teacher = make_user("teacher", "teacher")
+    moscow = timezone(timedelta(hours=3))
+    event = ScheduleEvent(teacher_id=teacher.id, title="Лекция", starts_at=datetime(2026, 3, 2, 10, 0),
+                          updated_at=datetime(2026, 3, 1, 12, 0, tzinfo=moscow))
+    body = build_ics(teacher, [event]).decode("utf-8")
+    assert "DTSTAMP:20260301T090000Z" in body
+
+
+def test_feed_token_can_be_revoked(app, make_user):
+    teacher = make_user("teacher", "teacher")
+    db.session.add(ScheduleEvent(teacher_id=teacher.id, title="Лекция", starts_at=datetime(2026, 3, 2, 10, 0)))
+    db.session.commit()
+    client = app.test_client()
+    old = make_feed_token(teacher)
+    assert client.get(f"/dashboard/schedule/{old}.ics").status_code == 200
+
+    new = reset_feed_token(teacher)
+
+    assert load_feed_token(old) is None
+    assert client.get(f"/dashboard/schedule/{old}.ics").status_code == 404
+    response = client.get(f"/dashboard/schedule/{new}.ics")
+    assert response.status_code == 200
+    assert b"SUMMARY:\xd0\x9b\xd0\xb5\xd0\xba\xd1\x86\xd0\xb8\xd1\x8f" in response.data
+
+
+def test_feed_requires_teacher_role(app, make_user):
+    teacher = make_user("teacher", "teacher")
+    token = make_feed_token(teacher)
+    teacher.roles = []
+    db.session.commit()
+    assert app.test_client().get(f"/dashboard/schedule/{token}.ics").status_code == 404
+    assert load_feed_token("garbage") is None
+
+
+def test_reset_route(make_user, login):
+    teacher = make_user("teacher", "teacher")
+    old = make_feed_token(teacher)
+    client = login(teacher)
+    assert client.post("/dashboard/instructor/schedule/feed/reset").status_code == 302
+    assert load_feed_token(old) is None
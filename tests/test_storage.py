@@ -0,0 +1,90 @@
+# tests/test_storage.py
+import io
+
+import pytest
+
+from app.storage import LocalStorage, S3Storage
+
+
+@pytest.fixture
+def s3():
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1",
+                              aws_access_key_id="test", aws_secret_access_key="test")
+        client.create_bucket(Bucket="vkrsite-test")
+        yield S3Storage("vkrsite-test", prefix="uploads", client=client, presign_ttl=60)
+
+
+def test_s3_save_open_delete(s3):
+    assert s3.save("a/report.docx", io.BytesIO(b"docx-bytes"), "application/octet-stream") == 10
+    assert s3.save_bytes("b.txt", "привет".encode("utf-8"), "text/plain") == 12
+
+    assert s3.exists("a/report.docx")
+    assert s3.size("a/report.docx") == 10
+    assert s3.open("b.txt").read().decode("utf-8") == "привет"
+    # объект лежит под префиксом
+    assert s3.client.head_object(Bucket="vkrsite-test", Key="uploads/b.txt")["ContentLength"] == 12
+
+    s3.delete("a/report.docx")
+    assert not s3.exists("a/report.docx")
+    with pytest.raises(FileNotFoundError):
+        s3.size("a/report.docx")
+    # удаление отсутствующего объекта — не ошибка
+    s3.delete("a/report.docx")
+
+
+def test_s3_iter_keys_sorted_without_prefix(s3):
+    for key in ("z.bin", "a/2.bin", "a/1.bin", "m.bin"):
+        s3.save_bytes(key, b"x" * len(key))
+    s3.client.put_object(Bucket="vkrsite-test", Key="other/skip.bin", Body=b"-")
+
+    keys = [(key, size) for key, size, _ in s3.iter_keys()]
+    assert keys == [("a/1.bin", 7), ("a/2.bin", 7), ("m.bin", 5), ("z.bin", 5)]
+
+
+def test_s3_presigned_url(s3):
+    url = s3.presigned_url("a/отчёт.docx", "отчёт.docx", "application/pdf")
+    assert "uploads/a/" in url
+    assert "response-content-disposition" in url
+
+
+def test_local_invalid_key_is_missing(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.save_bytes("ok.txt", b"1")
+    legacy = str(tmp_path.parent / "old-uploads" / "file.pdf")
+
+    assert storage.exists("ok.txt")
+    assert not storage.exists(legacy)
+    assert not storage.exists("../escape.txt")
+    with pytest.raises(FileNotFoundError):
+        storage.open(legacy)
+    storage.delete(legacy)
+    with pytest.raises(ValueError):
+        storage.save_bytes("../escape.txt", b"1")
+
+
+def test_legacy_file_path_download_is_404(app):
+    from app.extensions import db
+    from app.models import File, Report, Role, User
+
+    user = User(username="owner", email="owner@example.org")
+    user.set_password("secret1")
+    user.roles.append(Role(name="admin"))
+    db.session.add(user)
+    db.session.flush()
+    file = File(owner_user_id=user.id, path="/var/old-uploads/report.docx", original_name="report.docx")
+    db.session.add(file)
+    db.session.flush()
+    report = Report(user_id=user.id, type="docx", status="ready", file_id=file.id)
+    db.session.add(report)
+    db.session.commit()
+
+    client = app.test_client()
+    assert client.post("/auth/login", data={"email": "owner@example.org", "password": "secret1"}).status_code == 302
+    assert client.get(f"/files/{file.id}/download").status_code == 404
+    assert client.get(f"/admin/reports/{report.id}/download").status_code == 404
+    # удаление строки с таким путём не падает на объекте в хранилище
+    assert client.post(f"/admin/files/{file.id}/delete").status_code == 302
+    assert db.session.get(File, file.id) is None
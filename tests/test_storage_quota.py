@@ -0,0 +1,104 @@
+# tests/test_storage_quota.py
+import io
+
+from app.certificate_registry import issue_certificate
+from app.extensions import db
+from app.models import Course, File, StorageUsage
+from app.storage_quota import check_quota_after_flush, recount_usage, release_usage, usage_for
+
+
+def _counters():
+    return {(row.scope, row.owner_id): (row.bytes_used, row.files_count) for row in StorageUsage.query}
+
+
+def test_uploads_are_counted_for_user_and_course(app, make_user):
+    user = make_user("student")
+    course = Course(title="ML", slug="ml")
+    db.session.add(course)
+    db.session.commit()
+    file = File(owner_user_id=user.id, course_id=course.id, original_name="a.pdf", path="a.pdf", size_bytes=300)
+    db.session.add(file)
+    db.session.commit()
+    assert usage_for("user", user.id) == (300, 1)
+    assert usage_for("course", course.id) == (300, 1)
+
+    # атрибуты истекли после commit — перенос учёта всё равно видит старые значения
+    file.size_bytes = 500
+    db.session.commit()
+    assert usage_for("user", user.id) == (500, 1)
+    other = make_user("other")
+    file.owner_user_id = other.id
+    db.session.commit()
+    assert usage_for("user", user.id) == (0, 0)
+    assert usage_for("user", other.id) == (500, 1)
+    assert usage_for("course", course.id) == (500, 1)
+
+    db.session.delete(file)
+    db.session.commit()
+    assert usage_for("user", other.id) == (0, 0)
+    assert usage_for("course", course.id) == (0, 0)
+
+
+def test_bulk_delete_with_release_usage(app, make_user):
+    user = make_user("student")
+    ids = []
+    for i in range(3):
+        file = File(owner_user_id=user.id, original_name=f"{i}.pdf", path=f"{i}.pdf", size_bytes=100)
+        db.session.add(file)
+        db.session.flush()
+        ids.append(file.id)
+    db.session.commit()
+
+    release_usage(ids[:2])
+    File.query.filter(File.id.in_(ids[:2])).delete(synchronize_session=False)
+    db.session.commit()
+
+    assert usage_for("user", user.id) == (100, 1)
+    counters = _counters()
+    recount_usage()
+    assert _counters() == counters
+
+
+def test_upload_quota(app, make_user, login):
+    app.config["STORAGE_QUOTA_USER_BYTES"] = 64 * 1024
+    student = make_user("student", "student")
+    client = login(student)
+
+    def upload(size):
+        data = {"file": (io.BytesIO(b"x" * size), "report.pdf")}
+        return client.post("/files/upload", data=data, content_type="multipart/form-data")
+
+    assert upload(40 * 1024).status_code == 302
+    assert usage_for("user", student.id) == (40 * 1024, 1)
+    # проходит проверку Content-Length (с запасом на multipart), но не точную после flush
+    assert upload(30 * 1024).status_code == 302
+    assert usage_for("user", student.id) == (40 * 1024, 1)
+    assert File.query.count() == 1
+    # заведомо больше остатка — 413 до чтения тела
+    assert upload(200 * 1024).status_code == 413
+
+
+def test_certificates_do_not_use_student_quota(app, make_user):
+    app.config["STORAGE_QUOTA_USER_BYTES"] = 1024
+    student = make_user("student", "student")
+    course = Course(title="ML", slug="ml")
+    db.session.add(course)
+    db.session.commit()
+
+    file, created = issue_certificate(student, course)
+
+    assert created and file.kind == "certificate" and file.size_bytes > 1024
+    assert usage_for("user", student.id) == (0, 0)
+    assert usage_for("course", course.id) == (file.size_bytes, 1)
+    assert check_quota_after_flush(student)[0]
+
+    # перевыпуск (другое имя) — счётчик владельца по-прежнему пуст
+    student.username = "student-renamed"
+    db.session.commit()
+    file, created = issue_certificate(student, course)
+    assert created
+    assert usage_for("user", student.id) == (0, 0)
+
+    counters = _counters()
+    recount_usage()
+    assert _counters() == counters
@@ -0,0 +1,138 @@
+# tests/test_view_tracking.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import view_tracking
+from app.extensions import db
+from app.models import Course, Lesson, Progress, User
+from app.view_tracking import ViewBuffer, write_views
+
+T0 = datetime(2026, 3, 1, 12, 0)
+
+
+@pytest.fixture(params=["upsert", "fallback"])
+def backend(request, monkeypatch):
+    # fallback — ветка для СУБД без ON CONFLICT (UPDATE, затем INSERT)
+    if request.param == "fallback":
+        monkeypatch.setattr(view_tracking, "dialect_insert", lambda name: None)
+    return request.param
+
+
+@pytest.fixture
+def data(app):
+    course = Course(title="ML", slug="ml")
+    db.session.add(course)
+    db.session.commit()
+    lessons = [Lesson(course_id=course.id, title=f"L{i}", order_index=i) for i in range(3)]
+    users = [User(username=f"s{i}", email=f"s{i}@example.org", password_hash="x") for i in range(2)]
+    db.session.add_all(lessons + users)
+    db.session.commit()
+    return users, lessons
+
+
+def _progress(user, lesson):
+    db.session.expire_all()
+    return Progress.query.filter_by(user_id=user.id, lesson_id=lesson.id).one_or_none()
+
+
+def test_new_view_creates_in_progress_row(app, data, backend):
+    (user, _), (lesson, _, _) = data
+
+    assert write_views({(user.id, lesson.id): T0}) == 1
+
+    row = _progress(user, lesson)
+    assert (row.status, row.last_viewed_at, row.updated_at) == ("in_progress", T0, T0)
+
+
+def test_not_started_moves_to_in_progress(app, data, backend):
+    (user, _), (lesson, _, _) = data
+    db.session.add(Progress(user_id=user.id, lesson_id=lesson.id, status="not_started",
+                            created_at=T0 - timedelta(days=1), updated_at=T0 - timedelta(days=1)))
+    db.session.commit()
+
+    write_views({(user.id, lesson.id): T0})
+
+    row = _progress(user, lesson)
+    assert (row.status, row.last_viewed_at, row.updated_at) == ("in_progress", T0, T0)
+
+
+def test_other_statuses_and_updated_at_are_untouched(app, data, backend):
+    (user, other), (lesson, second, _) = data
+    earlier = T0 - timedelta(days=1)
+    db.session.add_all([
+        Progress(user_id=user.id, lesson_id=lesson.id, status="completed", score=90,
+                 last_viewed_at=earlier, updated_at=earlier),
+        Progress(user_id=other.id, lesson_id=second.id, status="in_progress",
+                 last_viewed_at=earlier, updated_at=earlier),
+    ])
+    db.session.commit()
+
+    write_views({(user.id, lesson.id): T0, (other.id, second.id): T0})
+
+    done = _progress(user, lesson)
+    assert (done.status, done.last_viewed_at, done.updated_at) == ("completed", T0, earlier)
+    started = _progress(other, second)
+    assert (started.status, started.last_viewed_at, started.updated_at) == ("in_progress", T0, earlier)
+
+
+def test_last_viewed_at_only_moves_forward(app, data, backend):
+    (user, _), (lesson, _, _) = data
+    write_views({(user.id, lesson.id): T0})
+
+    # запоздавший сброс другого воркера со старым временем
+    write_views({(user.id, lesson.id): T0 - timedelta(minutes=5)})
+    assert _progress(user, lesson).last_viewed_at == T0
+
+    write_views({(user.id, lesson.id): T0 + timedelta(minutes=5)})
+    assert _progress(user, lesson).last_viewed_at == T0 + timedelta(minutes=5)
+    assert Progress.query.count() == 1
+
+
+def test_views_of_deleted_users_and_lessons_are_dropped(app, data, backend):
+    (user, _), (lesson, _, _) = data
+
+    written = write_views({(user.id, lesson.id): T0, (999, lesson.id): T0, (user.id, 999): T0})
+
+    assert written == 1
+    assert Progress.query.count() == 1
+
+
+def test_buffer_collapses_repeated_views(app, data):
+    (user, other), (lesson, second, _) = data
+    buffer = ViewBuffer(app, interval=3600, max_size=100)
+    buffer.record(user.id, lesson.id, T0 + timedelta(minutes=1))
+    buffer.record(user.id, lesson.id, T0)
+    buffer.record(other.id, second.id, T0)
+    assert buffer.pending() == 2
+
+    assert buffer.close() == 2
+    assert buffer.pending() == 0
+    assert _progress(user, lesson).last_viewed_at == T0 + timedelta(minutes=1)
+
+
+def test_buffer_flushes_when_full(app, data):
+    (user, other), (lesson, _, _) = data
+    buffer = ViewBuffer(app, interval=3600, max_size=2)
+    buffer.record(user.id, lesson.id, T0)
+    assert buffer.pending() == 1
+    buffer.record(other.id, lesson.id, T0)
+    assert buffer.pending() == 0
+    assert Progress.query.count() == 2
+    buffer.close()
+
+
+def test_failed_flush_keeps_views(app, data, monkeypatch):
+    (user, _), (lesson, _, _) = data
+    buffer = ViewBuffer(app, interval=3600, max_size=100)
+    buffer.record(user.id, lesson.id, T0)
+
+    def broken(views):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(view_tracking, "write_views", broken)
+    assert buffer.flush() == 0
+    assert buffer.pending() == 1
+
+    monkeypatch.undo()
+    assert buffer.close() == 1